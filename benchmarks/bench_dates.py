@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+pubDate の解析と日本語表記への整形のベンチマーク。
+
+従来の parsedate_to_datetime + strftime('%Y年%-m月%-d日 %H:%M') と、
+article_dates モジュールの高速パスを同じ入力で比較する。
+
+    python3 benchmarks/bench_dates.py --items 10000
+"""
+
+import os
+import sys
+import random
+import argparse
+import timeit
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from article_dates import format_japanese_datetime, parse_rfc822_date
+
+def make_pub_dates(count: int, unique_ratio: float, seed: int = 0):
+    """WXR の pubDate と同じ書式の日時文字列を作る"""
+    rng = random.Random(seed)
+    jst = timezone(timedelta(hours=9))
+    start = datetime(2015, 1, 1, tzinfo=jst)
+    unique_count = max(1, int(count * unique_ratio))
+    unique = [
+        format_datetime(start + timedelta(seconds=rng.randrange(10 * 365 * 86400)))
+        for _ in range(unique_count)
+    ]
+    return [unique[i % unique_count] for i in range(count)]
+
+def baseline(pub_dates):
+    return [parsedate_to_datetime(text).strftime('%Y年%-m月%-d日 %H:%M') for text in pub_dates]
+
+def fast_path(pub_dates):
+    return [format_japanese_datetime(parse_rfc822_date(text)) for text in pub_dates]
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Benchmark pubDate parsing and Japanese date formatting.")
+    parser.add_argument("--items", type=int, default=10000, help="Number of pubDate values (default: 10000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs; the best is reported (default: 5)")
+    return parser
+
+def main():
+    parser = setup_argument_parser()
+    args = parser.parse_args()
+
+    for label, unique_ratio in (("unique", 1.0), ("10% unique", 0.1)):
+        pub_dates = make_pub_dates(args.items, unique_ratio)
+        if baseline(pub_dates) != fast_path(pub_dates):
+            print(f"Error: results differ ({label})")
+            sys.exit(1)
+
+        def run_fast_path():
+            # 毎回キャッシュを空にして、実行1回分のメモ化だけを計測する
+            parse_rfc822_date.cache_clear()
+            fast_path(pub_dates)
+
+        baseline_time = min(timeit.repeat(lambda: baseline(pub_dates), number=1, repeat=args.repeat))
+        fast_time = min(timeit.repeat(run_fast_path, number=1, repeat=args.repeat))
+        print(f"{label:>11}: {args.items} items  "
+              f"baseline {baseline_time * 1000:8.2f} ms  "
+              f"article_dates {fast_time * 1000:8.2f} ms  "
+              f"({baseline_time / fast_time:.1f}x)")
+
+if __name__ == "__main__":
+    main()
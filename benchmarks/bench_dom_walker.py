@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+wxr_to_md.py の HTML → Markdown 変換 (bs_node_to_md) のベンチマーク。
+
+通常の記事に近い HTML、深いネスト (div > p > span の繰り返し)、リストと引用のネスト
+(blockquote > ul > li の繰り返し。出力がネストの深さの2乗で増えるので浅めにする) を変換して時間を計る。
+--baseline に以前の wxr_to_md.py (再帰版) を渡すと、同じ入力で結果と時間を比較する。
+
+    git show <commit>:src/wxr_to_md.py > /tmp/wxr_to_md_recursive.py
+    python3 benchmarks/bench_dom_walker.py --baseline /tmp/wxr_to_md_recursive.py
+"""
+
+import io
+import os
+import sys
+import random
+import argparse
+import timeit
+import contextlib
+import importlib.util
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import wxr_to_md
+
+def make_article_html(paragraphs: int, seed: int = 0) -> str:
+    """見出し・段落・リスト・コードブロック・画像を含む、記事本文に近い HTML を作る"""
+    rng = random.Random(seed)
+    parts = []
+    for i in range(paragraphs):
+        kind = rng.randrange(6)
+        if kind == 0:
+            parts.append(f"<h2>見出し {i}</h2>")
+        elif kind == 1:
+            items = "".join(f"<li>項目 <strong>{j}</strong> の説明</li>" for j in range(rng.randint(2, 6)))
+            parts.append(f"<ul>{items}</ul>")
+        elif kind == 2:
+            code = "\n".join(f"print({j})" for j in range(rng.randint(3, 20)))
+            parts.append(f"<pre><code>{code}</code></pre>")
+        elif kind == 3:
+            parts.append(f'<figure><img src="/assets/img{i}.png" alt="図{i}"><figcaption>図 {i}</figcaption></figure>')
+        else:
+            parts.append(f'<p>本文の段落 {i}。<a href="https://example.com/{i}">リンク</a>と<em>強調</em>を含む。</p>')
+    return "".join(parts)
+
+def make_nested_html(depth: int) -> str:
+    """div > p > span を depth 回入れ子にした HTML"""
+    opening = "<div><p><span>段落" * depth
+    closing = "</span></p></div>" * depth
+    return opening + "最深部" + closing
+
+def make_nested_list_html(depth: int) -> str:
+    """blockquote > ul > li を depth 回入れ子にした HTML"""
+    opening = "<blockquote><ul><li>項目" * depth
+    closing = "</li></ul></blockquote>" * depth
+    return opening + "最深部" + closing
+
+def load_baseline(path: str):
+    spec = importlib.util.spec_from_file_location("wxr_to_md_baseline", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def convert(module, html: str):
+    """変換結果を返す (再帰上限に達した場合は RecursionError を返す)"""
+    # 未対応タグの print は計測に含めない
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            return module.html_to_markdown_bs(html)
+        except RecursionError as e:
+            return e
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the HTML to Markdown DOM walker in wxr_to_md.py.")
+    parser.add_argument("--baseline", type=str, default=None, help="Path to an older wxr_to_md.py to compare against")
+    parser.add_argument("--paragraphs", type=int, default=2000, help="Number of blocks in the article-like input (default: 2000)")
+    parser.add_argument("--depths", type=int, nargs="+", default=[100, 1000, 5000],
+                        help="Nesting depths for the div/p/span input (default: 100 1000 5000)")
+    parser.add_argument("--list-depths", type=int, nargs="+", default=[50, 200, 400],
+                        help="Nesting depths for the blockquote/ul/li input (default: 50 200 400)")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs; the best is reported (default: 3)")
+    return parser
+
+def main():
+    parser = setup_argument_parser()
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline) if args.baseline else None
+
+    cases = [(f"article ({args.paragraphs} blocks)", make_article_html(args.paragraphs))]
+    cases += [(f"nested depth {depth}", make_nested_html(depth)) for depth in args.depths]
+    cases += [(f"nested list depth {depth}", make_nested_list_html(depth)) for depth in args.list_depths]
+
+    for label, html in cases:
+        result = convert(wxr_to_md, html)
+        if isinstance(result, RecursionError):
+            print(f"Error: RecursionError ({label})")
+            sys.exit(1)
+        walker_time = min(timeit.repeat(lambda: convert(wxr_to_md, html), number=1, repeat=args.repeat))
+        line = f"{label:>24}: walker {walker_time * 1000:9.2f} ms"
+
+        if baseline:
+            baseline_result = convert(baseline, html)
+            if isinstance(baseline_result, RecursionError):
+                line += "  baseline RecursionError"
+            elif baseline_result != result:
+                print(f"Error: results differ ({label})")
+                sys.exit(1)
+            else:
+                baseline_time = min(timeit.repeat(lambda: convert(baseline, html), number=1, repeat=args.repeat))
+                line += f"  baseline {baseline_time * 1000:9.2f} ms  ({baseline_time / walker_time:.2f}x)"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+パイプラインの各ステージのメモリ使用量の回帰テスト。
+
+記事数を増やした合成データ (WXR・記事ディレクトリ・目次を抽出できる PDF) で
+parse_wxr_to_markdown・merge_md_files・extract_toc_from_pdf を1回ずつ別プロセスで実行し、
+tracemalloc のピークと RSS (/proc/self/statm を定期的に読む) の増分を測る。
+
+記事数に対するピークの増え方を直線 (1記事あたりのバイト数) と両対数の傾き (1 なら線形) で当てはめる。
+memory_budgets.json に記録した想定と比べ、次のどれかに当たるステージがあれば終了コード 1 で終了する。
+
+- constant のステージが、記事数に比例して増えている (1記事あたりの増分が許容量を超える)
+- linear のステージが、線形より速く増えているか、1記事あたりの増分が記録より大きい
+- 記録した記事数でのピークが上限を超えている
+
+    python3 benchmarks/memory_harness.py
+    python3 benchmarks/memory_harness.py --sizes 100 200 400 800 --update-budgets
+"""
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, Tuple
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+DEFAULT_BUDGETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "memory_budgets.json")
+
+STAGES = ("parse_wxr_to_markdown", "merge_md_files", "extract_toc_from_pdf")
+
+# constant のステージに許す1記事あたりの増分 (ファイル名の一覧などの管理用データ)
+CONSTANT_BYTES_PER_ITEM = 1024
+
+# 両対数の傾きがこれを超えたら線形より速く増えているとみなす
+SUPERLINEAR_EXPONENT = 1.25
+
+# RSS を読む間隔 (秒)
+RSS_SAMPLE_INTERVAL = 0.005
+
+################################################################################
+# 合成データ
+################################################################################
+
+def make_wxr(path: str, count: int) -> None:
+    """見出し・段落・リスト・コードブロック・画像を含む記事を count 件持つ WXR"""
+    items = []
+    for i in range(1, count + 1):
+        code = "\n".join(f"print({j})" for j in range(i % 25 + 5))
+        body = (
+            f"<h2>見出し{i}</h2><p>記事{i}の本文です。<strong>太字</strong>と<em>斜体</em>。</p>"
+            f"<ul><li>項目A<ul><li>入れ子<a href=\"https://example.com/{i}\">リンク</a></li></ul></li><li>項目B</li></ul>"
+            f"<pre><code>{code}</code></pre>"
+            f"<figure><img src=\"/assets/img{i}.png\" alt=\"図\"><figcaption>図{i}</figcaption></figure>"
+            + "".join(f"<p>段落{j}。" + "本文" * 40 + "</p>" for j in range(8))
+        )
+        items.append(
+            f"<item><title>記事{i}</title><link>https://example.com/n/{i}</link>"
+            f"<pubDate>Mon, {i % 28 + 1:02d} Jan 2024 10:00:00 +0900</pubDate>"
+            f"<wp:status>publish</wp:status><wp:post_type>post</wp:post_type><wp:post_id>{i}</wp:post_id>"
+            f"<content:encoded><![CDATA[{body}]]></content:encoded></item>"
+        )
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/" '
+            'xmlns:wp="http://wordpress.org/export/1.2/"><channel>'
+            "<title>合成データ</title><link>https://example.com</link><pubDate>Mon, 01 Jan 2024 00:00:00 +0900</pubDate>"
+            + "".join(items) + "</channel></rss>\n"
+        )
+
+def make_toc_pdf(path: str, count: int) -> None:
+    """記事ごとに1ページ、generate_toc.py が読める「[番号] タイトル / 公開日」のテキストを持つ PDF"""
+    pages = [["はじめに"]]
+    pages += [[f"[{i:04d}] 記事{i}", f"公開日: 2024年1月{i % 28 + 1}日"] for i in range(1, count + 1)]
+    pages.append(["あとがき"])
+
+    # 日本語はフォントの ToUnicode で 0x80 以降のコードに割り当てる
+    characters = sorted({ch for lines in pages for line in lines for ch in line if ord(ch) >= 0x80})
+    codes = {ch: 0x80 + i for i, ch in enumerate(characters)}
+
+    def encode(text: str) -> str:
+        return "".join(f"\\{codes[ch]:03o}" if ch in codes else ch for ch in text)
+
+    cmap = (
+        "/CIDInit /ProcSet findresource begin 12 dict begin begincmap /CMapName /Synthetic def\n"
+        "1 begincodespacerange <00> <FF> endcodespacerange\n"
+        f"{len(codes)} beginbfchar\n"
+        + "".join(f"<{code:02X}> <{ord(ch):04X}>\n" for ch, code in codes.items())
+        + "endbfchar\nendcmap CMapName currentdict /CMap defineresource pop end end"
+    )
+    contents = [
+        "BT /F1 12 Tf 50 700 Td 14 TL " + " ".join(f"({encode(line)}) Tj T*" for line in lines) + " ET"
+        for lines in pages
+    ]
+
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [" + " ".join(f"{5 + 2 * i} 0 R" for i in range(len(contents)))
+        + f"] /Count {len(contents)} >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /ToUnicode 4 0 R >>",
+        f"<< /Length {len(cmap)} >>\nstream\n{cmap}\nendstream",
+    ]
+    for i, content in enumerate(contents):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 420 595] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {6 + 2 * i} 0 R >>")
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{obj}\nendobj\n".encode("ascii")
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("ascii")
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii")
+    with open(path, "wb") as f:
+        f.write(data)
+
+def prepare_inputs(work_dir: str, size: int) -> Dict[str, str]:
+    """記事数 size の入力を作る (記事ディレクトリは計測しない wxr_to_md の実行で作る)"""
+    import progress
+    from wxr_to_md import parse_wxr_to_markdown
+
+    progress.configure(quiet=True)
+    size_dir = os.path.join(work_dir, str(size))
+    os.makedirs(size_dir, exist_ok=True)
+    paths = {
+        "wxr": os.path.join(size_dir, "input.xml"),
+        "articles": os.path.join(size_dir, "articles"),
+        "pdf": os.path.join(size_dir, "mainmatter.pdf"),
+        "separator": os.path.join(size_dir, "separator.md"),
+        "output": os.path.join(size_dir, "out"),
+    }
+    make_wxr(paths["wxr"], size)
+    with contextlib.redirect_stdout(io.StringIO()):
+        parse_wxr_to_markdown(paths["wxr"], paths["articles"], {"publish"}, search_index=False)
+    make_toc_pdf(paths["pdf"], size)
+    with open(paths["separator"], "w", encoding="utf-8") as f:
+        f.write("\n---\n")
+    return paths
+
+################################################################################
+# 計測 (子プロセス)
+################################################################################
+
+def read_rss() -> int:
+    """現在の RSS (バイト)。/proc がなければ getrusage の最大 RSS"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class RssSampler(threading.Thread):
+    """別スレッドで RSS を定期的に読み、最大値を記録する"""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = read_rss()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(RSS_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, read_rss())
+
+    def stop(self) -> int:
+        self.stopped.set()
+        self.join()
+        self.peak = max(self.peak, read_rss())
+        return self.peak
+
+def run_stage(stage: str, paths: Dict[str, str]) -> None:
+    if stage == "parse_wxr_to_markdown":
+        from wxr_to_md import parse_wxr_to_markdown
+        parse_wxr_to_markdown(paths["wxr"], paths["output"], {"publish"}, search_index=False)
+    elif stage == "merge_md_files":
+        from merge_md_files import merge_md_files
+        os.makedirs(paths["output"], exist_ok=True)
+        merge_md_files(output_file=os.path.join(paths["output"], "mainmatter.md"),
+                       articles_dir=paths["articles"], separator=paths["separator"])
+    elif stage == "extract_toc_from_pdf":
+        from generate_toc import extract_toc_from_pdf
+        toc = extract_toc_from_pdf(paths["pdf"])
+        if not toc:
+            raise RuntimeError("目次を抽出できませんでした")
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+def measure(stage: str, paths: Dict[str, str]) -> Dict[str, float]:
+    """1ステージを実行し、tracemalloc のピーク・RSS の増分・実行時間を返す (子プロセスで呼ぶ)"""
+    # モジュールの読み込みは計測に含めない
+    import wxr_to_md, merge_md_files, generate_toc  # noqa: F401
+    import progress
+    progress.configure(quiet=True)
+
+    sampler = RssSampler()
+    rss_before = sampler.peak
+    sampler.start()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_stage(stage, paths)
+    seconds = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_peak = sampler.stop()
+    return {"traced_peak": traced_peak, "rss_delta": max(0, rss_peak - rss_before), "seconds": seconds}
+
+################################################################################
+# 増え方の判定
+################################################################################
+
+def growth_exponent(sizes: List[int], peaks: List[float]) -> float:
+    """log(peak) = a + k log(size) の最小二乗の k"""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(peak, 1.0)) for peak in peaks]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    denominator = sum((x - mean_x) ** 2 for x in xs)
+    if denominator == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / denominator
+
+def bytes_per_item(sizes: List[int], peaks: List[float]) -> float:
+    """peak = a + b size の最小二乗の b (1記事あたりの増分)"""
+    mean_x = sum(sizes) / len(sizes)
+    mean_y = sum(peaks) / len(peaks)
+    denominator = sum((x - mean_x) ** 2 for x in sizes)
+    if denominator == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(sizes, peaks)) / denominator
+
+def classify(exponent: float, per_item: float) -> str:
+    if per_item <= CONSTANT_BYTES_PER_ITEM:
+        return "constant"
+    return "linear" if exponent <= SUPERLINEAR_EXPONENT else "superlinear"
+
+def load_budgets(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {"stages": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def check_stage(stage: str, sizes: List[int], results: List[Dict[str, float]], budget: Dict) -> Tuple[Dict, List[str]]:
+    """計測結果の要約と、想定・上限を超えた項目を返す"""
+    peaks = [result["traced_peak"] for result in results]
+    exponent = growth_exponent(sizes, peaks)
+    per_item = bytes_per_item(sizes, peaks)
+    report = {
+        "exponent": exponent,
+        "growth": classify(exponent, per_item),
+        "bytes_per_item": per_item,
+        "peak_mb": peaks[-1] / 2 ** 20,
+        "rss_mb": results[-1]["rss_delta"] / 2 ** 20,
+        "seconds": results[-1]["seconds"],
+    }
+
+    failures = []
+    expected = budget.get("growth")
+    if expected == "constant":
+        allowance = budget.get("max_bytes_per_item", CONSTANT_BYTES_PER_ITEM)
+        if per_item > allowance:
+            failures.append(f"{stage}: constant を想定していますが、ピークが1記事あたり {per_item:.0f} バイト "
+                            f"(許容 {allowance:.0f} バイト) で増えています")
+    elif expected == "linear":
+        if exponent > SUPERLINEAR_EXPONENT:
+            failures.append(f"{stage}: linear を想定していますが、ピークが記事数の {exponent:.2f} 乗で増えています")
+        allowance = budget.get("max_bytes_per_item")
+        if allowance is not None and per_item > allowance:
+            failures.append(f"{stage}: ピークが1記事あたり {per_item:.0f} バイトで増えています (上限 {allowance:.0f} バイト)")
+
+    limit_mb = budget.get("max_peak_mb")
+    if limit_mb is not None:
+        budget_size = budget.get("size")
+        if budget_size in sizes:
+            peak_mb = peaks[sizes.index(budget_size)] / 2 ** 20
+            if peak_mb > limit_mb:
+                failures.append(f"{stage}: 記事数 {budget_size} のピーク {peak_mb:.1f} MB が上限 {limit_mb:.1f} MB を超えています")
+        else:
+            print(f"Warning: {stage} の上限は記事数 {budget_size} で記録されているため、ピークの確認をスキップします。")
+    return report, failures
+
+def update_budgets(budgets: Dict, stage: str, sizes: List[int], report: Dict, headroom: float) -> None:
+    budget = budgets["stages"].setdefault(stage, {})
+    # 想定する増え方は一度決めたら変えない (悪化を記録し直さないように)
+    budget.setdefault("growth", report["growth"])
+    if budget["growth"] == "constant":
+        budget.setdefault("max_bytes_per_item", CONSTANT_BYTES_PER_ITEM)
+    else:
+        budget["max_bytes_per_item"] = round(report["bytes_per_item"] * (1 + headroom))
+    budget["size"] = sizes[-1]
+    budget["max_peak_mb"] = round(report["peak_mb"] * (1 + headroom), 1)
+
+################################################################################
+# main
+################################################################################
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Measure per-stage peak memory on growing synthetic inputs and check it against recorded budgets.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 400, 800],
+                        help="Numbers of articles in the synthetic inputs (default: 100 200 400 800)")
+    parser.add_argument("--stages", type=str, nargs="+", default=list(STAGES), choices=STAGES,
+                        help="Stages to measure (default: all)")
+    parser.add_argument("--budgets", type=str, default=DEFAULT_BUDGETS,
+                        help="Budget file (default: benchmarks/memory_budgets.json)")
+    parser.add_argument("--update-budgets", action="store_true",
+                        help="Record the measured peaks (plus headroom) as the new budgets")
+    parser.add_argument("--headroom", type=float, default=0.25,
+                        help="Headroom added to measured peaks with --update-budgets (default: 0.25)")
+    parser.add_argument("--work-dir", type=str, default=None,
+                        help="Directory for the synthetic inputs (default: a temporary directory)")
+    return parser
+
+def main():
+    parser = setup_argument_parser()
+    args = parser.parse_args()
+
+    sizes = sorted(set(args.sizes))
+    if len(sizes) < 2:
+        parser.error("at least two sizes are needed to fit the growth curve")
+
+    budgets = load_budgets(args.budgets)
+    failures = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = args.work_dir or tmp_dir
+        inputs = {size: prepare_inputs(work_dir, size) for size in sizes}
+
+        print(f"{'stage':<24} {'growth':<10} {'exponent':>8} {'B/article':>10} "
+              f"{'peak MB':>8} {'RSS MB':>7} {'time s':>7}  (peak/RSS/time: {sizes[-1]} articles)")
+        for stage in args.stages:
+            results = []
+            for size in sizes:
+                # ステージごと・サイズごとに新しいプロセスで測る (前の計測の確保が残らないように)
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                    results.append(executor.submit(measure, stage, inputs[size]).result())
+
+            report, stage_failures = check_stage(stage, sizes, results, budgets["stages"].get(stage, {}))
+            failures.extend(stage_failures)
+            print(f"{stage:<24} {report['growth']:<10} {report['exponent']:8.2f} {report['bytes_per_item']:10.0f} "
+                  f"{report['peak_mb']:8.1f} {report['rss_mb']:7.1f} {report['seconds']:7.2f}")
+
+            if args.update_budgets:
+                update_budgets(budgets, stage, sizes, report, args.headroom)
+
+    if args.update_budgets:
+        with open(args.budgets, "w", encoding="utf-8") as f:
+            json.dump(budgets, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved: {args.budgets}")
+        return
+
+    for failure in failures:
+        print(f"Error: {failure}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+prefetch_images.py のネットワークなしでの動作確認。
+
+一時ディレクトリを http.server で配信し、約400KBの画像3枚を参照する記事を用意して
+容量上限 1MB のキャッシュ (入れ子のディレクトリ cache/img) に2回取得する。次のどれかに当たれば終了コード 1 で終了する。
+
+- 記事のリンクが ./cache/img/<ハッシュ>.png に書き換わっていないか、そのファイルがない
+- 2回目の実行で画像を取得し直したか、記事が参照している画像を削除した
+- 参照されていない古いキャッシュが容量上限を超えても削除されない
+- merge_md_files.py (--asset-dir cache/img) の出力から画像のリンクを辿れない
+
+    python3 benchmarks/prefetch_check.py
+"""
+
+import io
+import os
+import re
+import sys
+import tempfile
+import threading
+import contextlib
+import http.server
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from merge_md_files import merge_md_files
+from prefetch_images import prefetch_images
+
+IMAGE_COUNT = 3
+IMAGE_BYTES = 400 * 1024
+MAX_CACHE_BYTES = 1024 * 1024
+CACHE_DIR = os.path.join("cache", "img")
+
+IMAGE_LINK_PATTERN = re.compile(r'!\[[^\]]*\]\(([^)\s]+)\)')
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    """アクセスログを出さず、リクエストされたパスを記録する"""
+    requests = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        QuietHandler.requests.append(self.path)
+        super().do_GET()
+
+def start_server(root: str) -> http.server.ThreadingHTTPServer:
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=root))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def make_fixtures(work_dir: str, base_url: str) -> None:
+    """配信する画像・記事・参照されていない古いキャッシュを作る"""
+    os.makedirs(os.path.join(work_dir, "www"))
+    for i in range(IMAGE_COUNT):
+        with open(os.path.join(work_dir, "www", f"img{i}.png"), "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n" + bytes([i]) * IMAGE_BYTES)
+
+    os.makedirs(os.path.join(work_dir, "articles"))
+    for i in range(IMAGE_COUNT):
+        with open(os.path.join(work_dir, "articles", f"{i + 1:04d}_記事{i + 1}.md"), "w", encoding="utf-8") as f:
+            f.write(f"# 記事{i + 1}\n\n**公開日**: 2024年1月{i + 1}日\n\n![図]({base_url}/img{i}.png)\n")
+
+    os.makedirs(os.path.join(work_dir, CACHE_DIR))
+    with open(os.path.join(work_dir, CACHE_DIR, "0" * 32 + ".png"), "wb") as f:
+        f.write(b"\0" * IMAGE_BYTES)
+    os.utime(os.path.join(work_dir, CACHE_DIR, "0" * 32 + ".png"), (0, 0))
+
+def article_links(articles_dir: str):
+    links = []
+    for name in sorted(os.listdir(articles_dir)):
+        with open(os.path.join(articles_dir, name), encoding="utf-8") as f:
+            links += IMAGE_LINK_PATTERN.findall(f.read())
+    return links
+
+def check() -> list:
+    errors = []
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return prefetch_images("articles", cache_dir=CACHE_DIR, max_cache_bytes=MAX_CACHE_BYTES,
+                                   jobs=IMAGE_COUNT, project_root=".")
+
+    fetched = run()
+    if len(fetched) != IMAGE_COUNT:
+        errors.append(f"1回目: {len(fetched)}/{IMAGE_COUNT} 枚しか取得できませんでした")
+    links = article_links("articles")
+    for link in links:
+        if not link.startswith("./cache/img/"):
+            errors.append(f"リンクが ./cache/img/ を指していません: {link}")
+        elif not os.path.isfile(link):
+            errors.append(f"リンク先がありません: {link}")
+    if os.path.exists(os.path.join(CACHE_DIR, "0" * 32 + ".png")):
+        errors.append("参照されていない古いキャッシュが削除されていません")
+
+    requests_before = len(QuietHandler.requests)
+    run()
+    if len(QuietHandler.requests) != requests_before:
+        errors.append(f"2回目: {len(QuietHandler.requests) - requests_before} 件を取得し直しました")
+    if article_links("articles") != links:
+        errors.append("2回目: 記事のリンクが変わりました")
+    for link in links:
+        if not os.path.isfile(link):
+            errors.append(f"2回目: 参照されている画像が削除されました: {link}")
+
+    output = os.path.join("output", "md", "mainmatter.md")
+    os.makedirs(os.path.dirname(output))
+    with contextlib.redirect_stdout(io.StringIO()):
+        merge_md_files(output, articles_dir="articles", asset_dirs=[CACHE_DIR])
+    with open(output, encoding="utf-8") as f:
+        merged_links = IMAGE_LINK_PATTERN.findall(f.read())
+    if len(merged_links) != IMAGE_COUNT:
+        errors.append(f"結合後の画像リンクが {len(merged_links)} 件です")
+    for link in merged_links:
+        if not os.path.isfile(os.path.join(os.path.dirname(output), link)):
+            errors.append(f"結合後のリンクを出力先から辿れません: {link}")
+    return errors
+
+def main():
+    with tempfile.TemporaryDirectory() as work_dir:
+        server = start_server(os.path.join(work_dir, "www"))
+        cwd = os.getcwd()
+        try:
+            make_fixtures(work_dir, f"http://127.0.0.1:{server.server_address[1]}")
+            os.chdir(work_dir)
+            errors = check()
+        finally:
+            os.chdir(cwd)
+            server.shutdown()
+
+    for error in errors:
+        print(f"Error: {error}")
+    if errors:
+        sys.exit(1)
+    print(f"OK: {IMAGE_COUNT} 枚を取得し、リンクの書き換え・キャッシュの保持と削除・結合後のパスを確認しました。")
+
+if __name__ == "__main__":
+    main()
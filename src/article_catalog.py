@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ステージ間で受け渡す記事一覧 (カタログ)。
+
+wxr_to_md.py が articles.catalog (列ごとにまとめた JSON) と、人が読むための articles.csv を出力し、
+後続のステージは load_articles() で Article のリストとして読み込む。
+load_articles() は従来の articles.csv もそのまま読める。
+
+wxr_to_md.py の選択条件で変換しなかった記事も、番号とメタデータはカタログに残す
+(filename が空になる。make select で改めて選び直せるように)。
+
+読み込んだ記事一覧はプロセス内にキャッシュし、ファイルが変わっていなければ再利用する
+(build_daemon.py のように同じプロセスで何度もビルドする場合に効く)。
+"""
+
+import os
+import csv
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from article_dates import format_japanese_datetime, parse_japanese_datetime
+
+# 先頭のマジックの後ろに、列名 → 全記事分の値のリスト を持つ JSON を置く
+# (pickle と違い、共有ディレクトリのファイルを読み込んでもコードは実行されず、Python のバージョンにもよらない)
+CATALOG_MAGIC = b"NBGCAT2\n"
+CATALOG_VERSION = 3
+
+CSV_FIELDNAMES = ['number', 'link', 'pub_date', 'status', 'title', 'filename',
+                  'post_type', 'post_id', 'guid', 'categories', 'tags', 'attachment_urls', 'postmeta']
+
+# CSV で複数の値 (カテゴリ・タグ・添付URL) を1列に入れるときの区切り
+CSV_LIST_SEPARATOR = "|"
+
+# 日時なし / タイムゾーンなしを表す列の番兵値
+NO_TIMESTAMP = -(2 ** 63)
+NO_UTC_OFFSET = -(2 ** 31)
+
+class Article:
+    """1記事分のメタデータ"""
+
+    __slots__ = ('number', 'title', 'filename', 'pub_date', 'link', 'status',
+                 'post_type', 'post_id', 'guid', 'categories', 'tags', 'attachment_urls', 'postmeta',
+                 'raw_pub_date')
+
+    def __init__(
+        self,
+        number: int,
+        title: str,
+        filename: str,
+        pub_date: Optional[datetime] = None,
+        link: str = "No Link",
+        status: str = "publish",
+        post_type: str = "post",
+        post_id: str = "",
+        guid: str = "",
+        categories: Optional[List[str]] = None,
+        tags: Optional[List[str]] = None,
+        attachment_urls: Optional[List[str]] = None,
+        postmeta: Optional[Dict[str, str]] = None,
+        raw_pub_date: str = "",
+    ):
+        self.number = number
+        self.title = title
+        self.filename = filename
+        self.pub_date = pub_date
+        self.link = link
+        self.status = status
+        self.post_type = post_type
+        self.post_id = post_id
+        self.guid = guid
+        self.categories = categories or []
+        self.tags = tags or []
+        self.attachment_urls = attachment_urls or []
+        self.postmeta = postmeta or {}
+        # 日時として解釈できなかった元の文字列 (解釈できた場合は空)
+        self.raw_pub_date = raw_pub_date
+
+    @property
+    def converted(self) -> bool:
+        """Markdown に変換済みか (選択条件で除外した記事は filename が空)"""
+        return bool(self.filename)
+
+    @property
+    def number_str(self) -> str:
+        """ファイル名などで使う4桁の記事番号"""
+        return f"{self.number:04d}"
+
+    @property
+    def pub_date_text(self) -> str:
+        if self.pub_date is None:
+            return self.raw_pub_date or "No Date"
+        return format_japanese_datetime(self.pub_date)
+
+    def to_row(self) -> Dict[str, str]:
+        """articles.csv の1行"""
+        return {
+            'number': self.number_str,
+            'link': self.link,
+            'pub_date': self.pub_date_text,
+            'status': self.status,
+            'title': self.title,
+            'filename': self.filename,
+            'post_type': self.post_type,
+            'post_id': self.post_id,
+            'guid': self.guid,
+            'categories': CSV_LIST_SEPARATOR.join(self.categories),
+            'tags': CSV_LIST_SEPARATOR.join(self.tags),
+            'attachment_urls': CSV_LIST_SEPARATOR.join(self.attachment_urls),
+            'postmeta': json.dumps(self.postmeta, ensure_ascii=False) if self.postmeta else "",
+        }
+
+    def __repr__(self) -> str:
+        return f"Article(number={self.number_str}, title={self.title!r})"
+
+# 読み込んだ記事一覧のキャッシュ: 絶対パス → ((更新時刻, サイズ), 記事一覧)
+_loaded_articles: Dict[str, Tuple[Tuple[int, int], List[Article]]] = {}
+
+def write_articles_csv(articles: Iterable[Article], csv_path: str) -> None:
+    """人が読むための articles.csv を出力する"""
+    with open(csv_path, 'w', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(article.to_row() for article in articles)
+
+def _split_csv_list(value: Optional[str]) -> List[str]:
+    return value.split(CSV_LIST_SEPARATOR) if value else []
+
+def read_articles_csv(csv_path: str) -> List[Article]:
+    articles = []
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        missing = [name for name in ('number', 'title', 'filename') if name not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{csv_path} に {', '.join(missing)} のカラムがありません。")
+        for row in reader:
+            pub_date_text = (row.get('pub_date') or "").strip()
+            pub_date = parse_japanese_datetime(pub_date_text)
+            articles.append(Article(
+                number=int(row['number']),
+                title=row['title'],
+                filename=row['filename'],
+                pub_date=pub_date,
+                link=row.get('link') or "No Link",
+                status=row.get('status') or "",
+                post_type=row.get('post_type') or "post",
+                post_id=row.get('post_id') or "",
+                guid=row.get('guid') or "",
+                categories=_split_csv_list(row.get('categories')),
+                tags=_split_csv_list(row.get('tags')),
+                attachment_urls=_split_csv_list(row.get('attachment_urls')),
+                postmeta=json.loads(row['postmeta']) if row.get('postmeta') else {},
+                raw_pub_date=pub_date_text if pub_date is None and pub_date_text != "No Date" else "",
+            ))
+    return articles
+
+def save_catalog(articles: List[Article], catalog_path: str) -> None:
+    """記事一覧を列ごとにまとめて保存する (CATALOG_MAGIC + JSON)"""
+    timestamps = []
+    utc_offsets = []
+    for article in articles:
+        dt = article.pub_date
+        if dt is None:
+            timestamps.append(NO_TIMESTAMP)
+            utc_offsets.append(NO_UTC_OFFSET)
+        elif dt.utcoffset() is None:
+            timestamps.append(int(dt.replace(tzinfo=timezone.utc).timestamp()))
+            utc_offsets.append(NO_UTC_OFFSET)
+        else:
+            timestamps.append(int(dt.timestamp()))
+            utc_offsets.append(int(dt.utcoffset().total_seconds()))
+
+    columns = {
+        'number': [article.number for article in articles],
+        'title': [article.title for article in articles],
+        'filename': [article.filename for article in articles],
+        'link': [article.link for article in articles],
+        'status': [article.status for article in articles],
+        'pub_timestamp': timestamps,
+        'pub_utc_offset': utc_offsets,
+        'raw_pub_date': [article.raw_pub_date for article in articles],
+        'post_type': [article.post_type for article in articles],
+        'post_id': [article.post_id for article in articles],
+        'guid': [article.guid for article in articles],
+        'categories': [article.categories for article in articles],
+        'tags': [article.tags for article in articles],
+        'attachment_urls': [article.attachment_urls for article in articles],
+        'postmeta': [article.postmeta for article in articles],
+    }
+
+    tmp_path = f"{catalog_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(CATALOG_MAGIC)
+        f.write(json.dumps({'version': CATALOG_VERSION, 'count': len(articles), 'columns': columns},
+                           ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    os.replace(tmp_path, catalog_path)
+
+def _pub_date(timestamp: int, utc_offset: int) -> Optional[datetime]:
+    if timestamp == NO_TIMESTAMP:
+        return None
+    if utc_offset == NO_UTC_OFFSET:
+        return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+    return datetime.fromtimestamp(timestamp, timezone(timedelta(seconds=utc_offset)))
+
+def load_catalog(catalog_path: str) -> List[Article]:
+    with open(catalog_path, 'rb') as f:
+        if f.read(len(CATALOG_MAGIC)) != CATALOG_MAGIC:
+            raise ValueError(f"{catalog_path} は記事カタログではありません (古い形式なら make articles で作り直してください)。")
+        payload = json.loads(f.read().decode('utf-8'))
+    if payload.get('version') != CATALOG_VERSION:
+        raise ValueError(f"Unsupported article catalog version: {payload.get('version')}")
+
+    columns = payload['columns']
+    return [
+        Article(number, title, filename, _pub_date(timestamp, utc_offset), link, status,
+                post_type, post_id, guid, categories, tags, attachment_urls, postmeta, raw_pub_date)
+        for (number, title, filename, link, status, timestamp, utc_offset, raw_pub_date,
+             post_type, post_id, guid, categories, tags, attachment_urls, postmeta) in zip(
+            columns['number'], columns['title'], columns['filename'], columns['link'],
+            columns['status'], columns['pub_timestamp'], columns['pub_utc_offset'], columns['raw_pub_date'],
+            columns['post_type'], columns['post_id'], columns['guid'], columns['categories'],
+            columns['tags'], columns['attachment_urls'], columns['postmeta']
+        )
+    ]
+
+def load_articles(path: str) -> List[Article]:
+    """
+    articles.catalog または articles.csv を読み込む (形式は内容から判定する)。
+
+    更新時刻とサイズが前回と同じならキャッシュした記事を返す。
+    記事オブジェクトは呼び出し元の間で共有されるので、変更しないこと。
+    """
+    key = os.path.abspath(path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _loaded_articles.get(key)
+    if cached is not None and cached[0] == signature:
+        return list(cached[1])
+
+    with open(path, 'rb') as f:
+        # 古い形式のカタログも CSV としてではなく load_catalog で読み、作り直すよう案内する
+        is_catalog = f.read(len(CATALOG_MAGIC)).startswith(CATALOG_MAGIC[:6])
+    articles = load_catalog(path) if is_catalog else read_articles_csv(path)
+    _loaded_articles[key] = (signature, articles)
+    return list(articles)
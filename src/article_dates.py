@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+記事の日付の解析と日本語表記への整形。
+
+WXR の pubDate (RFC 822 形式) は典型的な書式をコンパイル済みの正規表現で直接解析し、
+それ以外の書式だけ email.utils.parsedate_to_datetime に任せる。
+整形はロケールや glibc 固有の strftime フラグ (%-m など) に依存しない。
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Optional
+
+# 例: "Mon, 05 Feb 2024 09:15:00 +0900" (曜日と秒は省略可)
+RFC822_PATTERN = re.compile(
+    r"^\s*(?:[A-Za-z]{3},\s*)?(\d{1,2})\s+([A-Za-z]{3})\s+(\d{4})\s+"
+    r"(\d{1,2}):(\d{2})(?::(\d{2}))?\s+([+-])(\d{2})(\d{2})\s*$"
+)
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+# 日本語表記の日付 (例: 2024年2月2日 01:15)
+JAPANESE_DATE_PATTERN = re.compile(r"^(\d{4})年(\d{1,2})月(\d{1,2})日(?: (\d{1,2}):(\d{2}))?$")
+
+@lru_cache(maxsize=None)
+def _fixed_timezone(offset_minutes: int) -> timezone:
+    return timezone(timedelta(minutes=offset_minutes))
+
+@lru_cache(maxsize=65536)
+def parse_rfc822_date(text: str) -> datetime:
+    """
+    RFC 822 形式の日時を datetime に変換する。
+
+    結果は parsedate_to_datetime と同じ (タイムゾーン -0000 は naive な datetime)。
+    同じ文字列の解析結果はキャッシュされる。
+
+    Raises:
+        ValueError: 日時として解釈できない場合
+    """
+    match = RFC822_PATTERN.match(text)
+    if match:
+        day, month_name, year, hour, minute, second, sign, tz_hour, tz_minute = match.groups()
+        month = MONTHS.get(month_name.lower())
+        if month is not None:
+            offset = int(tz_hour) * 60 + int(tz_minute)
+            if sign == "-" and offset == 0:
+                tzinfo = None
+            else:
+                tzinfo = _fixed_timezone(-offset if sign == "-" else offset)
+            return datetime(int(year), month, int(day), int(hour), int(minute), int(second or 0), tzinfo=tzinfo)
+
+    try:
+        return parsedate_to_datetime(text)
+    except TypeError:
+        # Python 3.9 以前は解釈できない場合に TypeError になる
+        raise ValueError(f"Invalid date value or format: {text!r}")
+
+def parse_rfc822_date_or_none(text: Optional[str]) -> Optional[datetime]:
+    """parse_rfc822_date と同じだが、空や解釈できない場合は None を返す"""
+    if not text or not text.strip():
+        return None
+    try:
+        return parse_rfc822_date(text.strip())
+    except ValueError:
+        return None
+
+def format_japanese_date(dt: datetime) -> str:
+    """例: 2024年2月2日"""
+    return f"{dt.year}年{dt.month}月{dt.day}日"
+
+def format_japanese_datetime(dt: datetime) -> str:
+    """例: 2024年2月2日 01:15"""
+    return f"{dt.year}年{dt.month}月{dt.day}日 {dt.hour:02d}:{dt.minute:02d}"
+
+def parse_japanese_datetime(text: str) -> Optional[datetime]:
+    """format_japanese_datetime / format_japanese_date の出力を naive な datetime に戻す"""
+    match = JAPANESE_DATE_PATTERN.match(text.strip())
+    if not match:
+        return None
+    year, month, day, hour, minute = match.groups()
+    return datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0))
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+複数の WXR エクスポートから複数の書籍をまとめてビルドする。
+
+マニフェスト (YAML) に書籍ごとの入力・設定・テンプレート・スタイルを書いておくと、
+各書籍のステージ (Makefile の book と同じ依存関係) をジョブに分け、全書籍で共有する
+上限付きのワーカープールで実行する。実行可能になったジョブは書籍を順番に巡って取り出すので、
+ある書籍の md-to-pdf を待つ間にも別の書籍の変換や結合が進む。最後に書籍ごとの所要時間を表示する。
+
+マニフェストの例:
+    jobs: 4                      # 同時に実行するジョブ数 (省略時は CPU 数)
+    defaults:
+      config_dir: config
+      templates_dir: templates
+      styles_dir: styles
+    books:
+      - name: account-a
+        input: input/account-a.xml
+        config_dir: config/account-a      # pdf_options.yaml, include/exclude_articles.txt
+      - name: account-b
+        input: input/account-b.xml
+        reflections: true
+        optimize: true
+
+相対パスはマニフェストのあるディレクトリからのパス。出力は既定で batch/<name>/ に書き出す。
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import yaml
+
+from progress import EVENTS_ENV
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 書籍ごとに指定できる項目と既定値 (パスはマニフェストからの相対パス)
+BOOK_DEFAULTS = {
+    "output_dir": None,
+    "config_dir": "config",
+    "templates_dir": "templates",
+    "styles_dir": "styles",
+    "status": "publish",
+    "reflections": False,
+    "qrcodes": False,
+    "lint": True,
+    "optimize": False,
+    "code_max_lines": 0,
+    "code_page_lines": 0,
+}
+
+# 失敗したジョブのログを表示する行数
+LOG_TAIL_LINES = 20
+
+def script(name: str) -> List[str]:
+    return [sys.executable, os.path.join(SRC_DIR, name)]
+
+class Job:
+    """1つのステージ: コマンドを順に実行し、生成されたファイルを移動する"""
+
+    def __init__(self, book: "Book", name: str, commands: List[List[str]],
+                 depends: Sequence[str] = (), moves: Sequence[Tuple[str, str]] = ()):
+        self.book = book
+        self.name = name
+        self.commands = commands
+        self.depends = list(depends)
+        self.moves = list(moves)
+        self.status = "pending"
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.log_path = os.path.join(book.output_dir, "logs", f"{name}.log")
+
+    @property
+    def duration(self) -> float:
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    def run(self) -> int:
+        """ワーカースレッドで実行する。終了コードを返す"""
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        # 各ステージの進捗イベント (progress.py) は書籍ごとに logs/progress.jsonl に追記する
+        env = dict(os.environ)
+        env.setdefault(EVENTS_ENV, os.path.join(self.book.output_dir, "logs", "progress.jsonl"))
+        self.started = time.perf_counter()
+        try:
+            with open(self.log_path, "w", encoding="utf-8") as log:
+                for command in self.commands:
+                    log.write(f"$ {' '.join(command)}\n")
+                    log.flush()
+                    try:
+                        result = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT, env=env)
+                    except FileNotFoundError:
+                        log.write(f"Error: {command[0]} が見つかりません。\n")
+                        return 127
+                    if result.returncode != 0:
+                        return result.returncode
+                for src, dst in self.moves:
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    shutil.move(src, dst)
+            return 0
+        finally:
+            self.finished = time.perf_counter()
+
+class Book:
+    """マニフェストの1冊分の設定と、そこから作るジョブ"""
+
+    def __init__(self, name: str, input_xml: str, base_dir: str, settings: Dict):
+        # wxr_to_md.py は WXR のディレクトリから画像のパスを作るので、Makefile と同じく
+        # カレントディレクトリからの相対パスで渡す
+        def resolve(path: str) -> str:
+            return os.path.relpath(os.path.join(base_dir, path))
+
+        self.name = name
+        self.input_xml = resolve(input_xml)
+        self.settings = settings
+        self.output_dir = resolve(settings["output_dir"] or os.path.join("batch", name))
+        self.config_dir = resolve(settings["config_dir"])
+        self.templates_dir = resolve(settings["templates_dir"])
+        self.styles_dir = resolve(settings["styles_dir"])
+
+    def config(self, filename: str) -> str:
+        return os.path.join(self.config_dir, filename)
+
+    def template(self, filename: str) -> str:
+        return os.path.join(self.templates_dir, filename)
+
+    def style(self, filename: str) -> str:
+        return os.path.join(self.styles_dir, filename)
+
+    def output(self, *parts: str) -> str:
+        return os.path.join(self.output_dir, *parts)
+
+    def missing_inputs(self) -> List[str]:
+        required = [
+            self.input_xml, self.config("pdf_options.yaml"),
+            self.template("cover.md"), self.template("back_cover.md"), self.template("separator.md"),
+            self.template("introduction.md"), self.template("conclusion.md"),
+            self.style("style-base.css"), self.style("cover-style.css"),
+            self.style("frontmatter-style.css"), self.style("mainmatter-style.css"),
+        ]
+        if self.settings["reflections"]:
+            required.append(self.template("reflection.md.template"))
+        return [path for path in required if not os.path.exists(path)]
+
+    def selection_args(self) -> List[str]:
+        args = []
+        if os.path.exists(self.config("exclude_articles.txt")):
+            args += ["--exclude-file", self.config("exclude_articles.txt")]
+        if os.path.exists(self.config("include_articles.txt")):
+            args += ["--include-file", self.config("include_articles.txt")]
+        return args
+
+    def render_job(self, name: str, md_path: str, stylesheet: str, depends: Sequence[str], md_to_pdf: str) -> Job:
+        """md-to-pdf は Markdown と同じ場所に PDF を書き出すので、pdf/ に移動する"""
+        pdf_name = os.path.splitext(os.path.basename(md_path))[0] + ".pdf"
+        return Job(self, name, [
+            [md_to_pdf, "--stylesheet", self.style("style-base.css"), "--stylesheet", self.style(stylesheet), md_path],
+        ], depends=depends, moves=[(os.path.splitext(md_path)[0] + ".pdf", self.output("pdf", pdf_name))])
+
+    def jobs(self, md_to_pdf: str) -> List[Job]:
+        """Makefile の book ターゲットと同じ依存関係のジョブ (依存する順に並ぶ)"""
+        articles_dir = self.output("articles")
+        catalog = os.path.join(articles_dir, "articles.catalog")
+        pdf_options = self.config("pdf_options.yaml")
+        md_dir = self.output("md")
+        os.makedirs(md_dir, exist_ok=True)
+
+        jobs = [Job(self, "articles", [
+            script("wxr_to_md.py") + [
+                self.input_xml, articles_dir, "--status", self.settings["status"],
+                "--code-max-lines", str(self.settings["code_max_lines"]),
+                "--code-page-lines", str(self.settings["code_page_lines"]),
+            ],
+        ])]
+
+        mainmatter_depends = ["articles"]
+        # 記事中の画像は WXR と同じディレクトリの assets/ を指すので、出力先からの相対パスに置き換えさせる
+        extra_merge_args = ["--asset-dir", os.path.join(os.path.dirname(self.input_xml), "assets")]
+        if self.settings["reflections"]:
+            reflections_dir = self.output("reflections")
+            jobs.append(Job(self, "reflections", [
+                script("generate_reflections.py") + [
+                    catalog, "--template", self.template("reflection.md.template"),
+                    "--output-dir", reflections_dir,
+                ] + self.selection_args(),
+            ], depends=["articles"]))
+            mainmatter_depends.append("reflections")
+            extra_merge_args += ["--reflections-dir", reflections_dir]
+        if self.settings["qrcodes"]:
+            qr_dir = self.output("qrcodes")
+            jobs.append(Job(self, "qrcodes", [
+                script("generate_qr_codes.py") + ["--articles", catalog, "--output-dir", qr_dir],
+            ], depends=["articles"]))
+            mainmatter_depends.append("qrcodes")
+            extra_merge_args += ["--qr-dir", qr_dir]
+
+        mainmatter_md = os.path.join(md_dir, "mainmatter.md")
+        mainmatter_commands = [
+            script("merge_md_files.py") + [
+                "--pdf-options", pdf_options,
+            ] + self.selection_args() + extra_merge_args + [
+                "--separator", self.template("separator.md"),
+                "--introduction", self.template("introduction.md"),
+                "--articles-dir", articles_dir,
+                "--conclusion", self.template("conclusion.md"),
+                "--output", mainmatter_md,
+            ],
+        ]
+        if self.settings["lint"]:
+            mainmatter_commands.append(script("lint_md.py") + [mainmatter_md])
+        jobs.append(Job(self, "mainmatter.md", mainmatter_commands, depends=mainmatter_depends))
+        jobs.append(self.render_job("mainmatter.pdf", mainmatter_md, "mainmatter-style.css", ["mainmatter.md"], md_to_pdf))
+
+        toc_md = os.path.join(md_dir, "toc.md")
+        frontmatter_md = os.path.join(md_dir, "frontmatter.md")
+        jobs.append(Job(self, "frontmatter.md", [
+            script("generate_toc.py") + ["--pdf-file", self.output("pdf", "mainmatter.pdf"), "--output", toc_md],
+            script("merge_md_files.py") + [
+                "--pdf-options", pdf_options,
+                "--separator", self.template("separator.md"),
+                "--toc", toc_md,
+                "--output", frontmatter_md,
+            ],
+        ], depends=["mainmatter.pdf"]))
+        jobs.append(self.render_job("frontmatter.pdf", frontmatter_md, "frontmatter-style.css", ["frontmatter.md"], md_to_pdf))
+
+        # 表紙と裏表紙は記事に依存しないので、最初から実行できる
+        for part, option, template in (("cover", "--cover-design", "cover.md"), ("back_cover", "--back-cover", "back_cover.md")):
+            part_md = os.path.join(md_dir, f"{part}.md")
+            jobs.append(Job(self, f"{part}.md", [
+                script("merge_md_files.py") + ["--pdf-options", pdf_options, option, self.template(template), "--output", part_md],
+            ]))
+            jobs.append(self.render_job(f"{part}.pdf", part_md, "cover-style.css", [f"{part}.md"], md_to_pdf))
+
+        book_pdf = self.output(f"{self.name}.pdf")
+        book_commands = [
+            script("merge_pdf_files.py") + [
+                "--cover-design", self.output("pdf", "cover.pdf"),
+                "--frontmatter", self.output("pdf", "frontmatter.pdf"),
+                "--mainmatter", self.output("pdf", "mainmatter.pdf"),
+                "--back-cover-design", self.output("pdf", "back_cover.pdf"),
+                "--output", book_pdf,
+            ],
+        ]
+        if self.settings["optimize"]:
+            book_commands.append(script("optimize_pdf.py") + [book_pdf])
+        book_commands.append(script("page_index.py") + [
+            "build",
+            "--toc", toc_md,
+            "--articles-dir", self.output("articles"),
+        ] + self.selection_args() + [
+            "--cover", self.output("pdf", "cover.pdf"),
+            "--frontmatter", self.output("pdf", "frontmatter.pdf"),
+            "--mainmatter", self.output("pdf", "mainmatter.pdf"),
+            "--back-cover", self.output("pdf", "back_cover.pdf"),
+            "--output", self.output("page_index.json"),
+        ])
+        jobs.append(Job(self, "book", book_commands,
+                        depends=["cover.pdf", "frontmatter.pdf", "mainmatter.pdf", "back_cover.pdf"]))
+        return jobs
+
+def load_manifest(manifest_path: str) -> Tuple[List[Book], Optional[int]]:
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = yaml.safe_load(f) or {}
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    defaults = dict(BOOK_DEFAULTS)
+    defaults.update(manifest.get("defaults") or {})
+
+    books = []
+    names = set()
+    for entry in manifest.get("books") or []:
+        name = entry.get("name")
+        if not name or not entry.get("input"):
+            raise ValueError(f"{manifest_path}: 書籍には name と input が必要です: {entry}")
+        if name in names:
+            raise ValueError(f"{manifest_path}: 書籍名 {name} が重複しています。")
+        names.add(name)
+        unknown = set(entry) - set(BOOK_DEFAULTS) - {"name", "input"}
+        if unknown:
+            raise ValueError(f"{manifest_path}: {name} に不明な項目があります: {', '.join(sorted(unknown))}")
+        settings = dict(defaults)
+        settings.update({key: value for key, value in entry.items() if key in BOOK_DEFAULTS})
+        books.append(Book(name, entry["input"], base_dir, settings))
+    return books, manifest.get("jobs")
+
+class Scheduler:
+    """全書籍のジョブを1つのワーカープールで実行する"""
+
+    def __init__(self, books: List[Book], md_to_pdf: str, jobs: Optional[int] = None):
+        self.books = books
+        self.max_workers = jobs or os.cpu_count() or 1
+        self.jobs: Dict[str, Dict[str, Job]] = {
+            book.name: {job.name: job for job in book.jobs(md_to_pdf)} for book in books
+        }
+        self.ready: Dict[str, Deque[Job]] = {book.name: deque() for book in books}
+        self.failed_books: Dict[str, Job] = {}
+
+    def _release(self, book_name: str) -> None:
+        """依存するジョブがすべて終わったジョブを実行待ちに入れる"""
+        jobs = self.jobs[book_name]
+        for job in jobs.values():
+            if job.status == "pending" and all(jobs[name].status == "done" for name in job.depends):
+                job.status = "ready"
+                self.ready[book_name].append(job)
+
+    def _next_job(self, cursor: int) -> Tuple[Optional[Job], int]:
+        """書籍を順番に巡り、実行待ちのジョブを1つ取り出す"""
+        for offset in range(len(self.books)):
+            index = (cursor + offset) % len(self.books)
+            queue = self.ready[self.books[index].name]
+            if queue:
+                return queue.popleft(), index + 1
+        return None, cursor
+
+    def _fail(self, job: Job, code: int) -> None:
+        job.status = "failed"
+        self.failed_books[job.book.name] = job
+        self.ready[job.book.name].clear()
+        for other in self.jobs[job.book.name].values():
+            if other.status in ("pending", "ready"):
+                other.status = "skipped"
+        print(f"Error: {job.book.name} の {job.name} が失敗しました (終了コード {code})。ログ: {job.log_path}")
+        if os.path.exists(job.log_path):
+            with open(job.log_path, "r", encoding="utf-8", errors="replace") as f:
+                for line in deque(f, maxlen=LOG_TAIL_LINES):
+                    print(f"    {line.rstrip()}")
+
+    def run(self) -> bool:
+        """すべてのジョブを実行する。失敗した書籍がなければ True"""
+        for book in self.books:
+            self._release(book.name)
+
+        cursor = 0
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                while len(running) < self.max_workers:
+                    job, cursor = self._next_job(cursor)
+                    if job is None:
+                        break
+                    job.status = "running"
+                    print(f"[{job.book.name}] {job.name} を開始")
+                    running[executor.submit(job.run)] = job
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        code = future.result()
+                    except Exception as e:
+                        print(f"Error: {job.book.name} の {job.name} を実行できません: {e}")
+                        code = 1
+                    if code != 0:
+                        self._fail(job, code)
+                        continue
+                    job.status = "done"
+                    print(f"[{job.book.name}] {job.name} が完了 ({job.duration:.1f} 秒)")
+                    self._release(job.book.name)
+        return not self.failed_books
+
+    def summary(self, wall_time: float) -> Dict:
+        books = {}
+        busy_total = 0.0
+        for book in self.books:
+            jobs = list(self.jobs[book.name].values())
+            finished = [job for job in jobs if job.started is not None]
+            busy = sum(job.duration for job in finished)
+            busy_total += busy
+            books[book.name] = {
+                "status": "failed" if book.name in self.failed_books else "ok",
+                "wall_seconds": (max(job.finished for job in finished) - min(job.started for job in finished)) if finished else 0.0,
+                "busy_seconds": busy,
+                "output": book.output(f"{book.name}.pdf"),
+                "jobs": {job.name: {"status": job.status, "seconds": job.duration} for job in jobs},
+            }
+        return {
+            "wall_seconds": wall_time,
+            "busy_seconds": busy_total,
+            "workers": self.max_workers,
+            "utilization": busy_total / (wall_time * self.max_workers) if wall_time else 0.0,
+            "books": books,
+        }
+
+def print_summary(summary: Dict) -> None:
+    print()
+    print(f"{'book':<24} {'status':<7} {'wall':>8} {'busy':>8}  slowest")
+    for name, book in summary["books"].items():
+        timed = [(info["seconds"], job) for job, info in book["jobs"].items() if info["seconds"]]
+        slowest = max(timed) if timed else None
+        slowest_text = f"{slowest[1]} ({slowest[0]:.1f} 秒)" if slowest else "-"
+        print(f"{name:<24} {book['status']:<7} {book['wall_seconds']:7.1f}s {book['busy_seconds']:7.1f}s  {slowest_text}")
+    print(f"合計 {summary['wall_seconds']:.1f} 秒 (ジョブの実行時間の合計 {summary['busy_seconds']:.1f} 秒、"
+          f"ワーカー {summary['workers']} 個の使用率 {summary['utilization']:.0%})")
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Build several books from several WXR exports on one shared worker pool.")
+
+    parser.add_argument(
+        "manifest", type=str,
+        help="YAML manifest listing the books to build"
+    )
+    parser.add_argument(
+        "--jobs", type=int,
+        default=None,
+        help="Maximum number of concurrent jobs across all books (default: manifest 'jobs' or number of CPUs)"
+    )
+    parser.add_argument(
+        "--books", type=str, nargs="+",
+        default=None,
+        help="Build only these books from the manifest"
+    )
+    parser.add_argument(
+        "--md-to-pdf", type=str,
+        default="md-to-pdf",
+        help="md-to-pdf command (default: md-to-pdf)"
+    )
+    parser.add_argument(
+        "--summary-json", type=str,
+        default=None,
+        help="Write per-book and per-job timings to this JSON file"
+    )
+
+    return parser
+
+def main(argv=None):
+    parser = setup_argument_parser()
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.manifest):
+        print(f"Error: {args.manifest} が見つかりません。")
+        sys.exit(1)
+
+    try:
+        books, manifest_jobs = load_manifest(args.manifest)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.books:
+        unknown = set(args.books) - {book.name for book in books}
+        if unknown:
+            print(f"Error: マニフェストにない書籍です: {', '.join(sorted(unknown))}")
+            sys.exit(1)
+        books = [book for book in books if book.name in args.books]
+
+    for book in books:
+        missing = book.missing_inputs()
+        if missing:
+            for path in missing:
+                print(f"Error: {book.name}: {path} が見つかりません。")
+            sys.exit(1)
+
+    scheduler = Scheduler(books, args.md_to_pdf, jobs=args.jobs or manifest_jobs)
+    start = time.perf_counter()
+    succeeded = scheduler.run()
+    summary = scheduler.summary(time.perf_counter() - start)
+
+    print_summary(summary)
+    if args.summary_json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.summary_json)), exist_ok=True)
+        with open(args.summary_json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    if not succeeded:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+再現可能ビルドとビルド成果物のキャッシュ。
+
+- SOURCE_DATE_EPOCH が設定されている場合、各ステージが埋め込む日時をその値に固定する。
+- 各ステージの入力・出力のハッシュをビルドマニフェスト (manifest.json) に記録し、
+  入力が一致するステージはスキップするか、ローカルの成果物ストアから出力を復元する。
+
+使い方:
+    build_cache.py --stage mainmatter --inputs a.md b.css --outputs a.pdf -- md-to-pdf a.md
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import subprocess
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+MANIFEST_VERSION = 1
+
+def get_build_datetime() -> datetime:
+    """
+    成果物に埋め込む日時を返す。
+
+    SOURCE_DATE_EPOCH (UNIX時刻) が設定されていればその時刻を、なければ現在時刻を返す。
+    どちらもタイムゾーン付きの UTC なので、PDF の日付などは設定の有無によらず UTC で書かれる。
+    リフレクションの日付のように読者に見せる日付は、呼び出し側で astimezone() してローカル時刻にする。
+    """
+    source_date_epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    if source_date_epoch:
+        return datetime.fromtimestamp(int(source_date_epoch), tz=timezone.utc)
+    return datetime.now(timezone.utc)
+
+def hash_file(path: str) -> str:
+    """ファイルの SHA-256 を返す"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_path(path: str) -> str:
+    """ファイルまたはディレクトリ (配下の全ファイルの相対パスと内容) のハッシュを返す"""
+    if not os.path.isdir(path):
+        return hash_file(path)
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            file_path = os.path.join(dirpath, filename)
+            digest.update(os.path.relpath(file_path, path).encode("utf-8"))
+            digest.update(b"\0")
+            digest.update(hash_file(file_path).encode("ascii"))
+    return digest.hexdigest()
+
+def action_key(stage: str, command: List[str], input_hashes: Dict[str, str]) -> str:
+    """ステージ名・コマンド・入力ハッシュ・固定日時から成果物のキーを作る"""
+    payload = json.dumps({
+        "stage": stage,
+        "command": command,
+        "inputs": input_hashes,
+        "source_date_epoch": os.environ.get("SOURCE_DATE_EPOCH", ""),
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def write_json_atomic(path: str, data) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+def load_manifest(cache_dir: str) -> Dict:
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return {"version": MANIFEST_VERSION, "stages": {}}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "stages": {}}
+    return manifest
+
+def outputs_match(output_hashes: Dict[str, str]) -> bool:
+    return all(os.path.isfile(path) and hash_file(path) == digest for path, digest in output_hashes.items())
+
+def store_object(cache_dir: str, path: str, digest: str) -> None:
+    """出力ファイルを内容アドレス (SHA-256) で成果物ストアに保存する"""
+    object_path = os.path.join(cache_dir, "objects", digest[:2], digest)
+    if os.path.exists(object_path):
+        return
+    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+    tmp_path = f"{object_path}.tmp"
+    shutil.copyfile(path, tmp_path)
+    os.replace(tmp_path, object_path)
+
+def restore_outputs(cache_dir: str, output_hashes: Dict[str, str]) -> bool:
+    """成果物ストアから出力を復元する。揃っていなければ何もせず False を返す"""
+    object_paths = {
+        path: os.path.join(cache_dir, "objects", digest[:2], digest)
+        for path, digest in output_hashes.items()
+    }
+    if not all(os.path.exists(object_path) for object_path in object_paths.values()):
+        return False
+    for path, object_path in object_paths.items():
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        shutil.copyfile(object_path, path)
+    return True
+
+def run_stage(
+    stage: str,
+    inputs: List[str],
+    outputs: List[str],
+    command: List[str],
+    cache_dir: str = ".build-cache",
+) -> int:
+    """
+    入力が前回と同じならスキップ、成果物ストアにあれば復元、どちらでもなければ実行する。
+
+    Returns:
+        int: コマンドの終了コード (スキップ・復元時は 0)
+    """
+    input_hashes = {path: hash_path(path) for path in inputs}
+    key = action_key(stage, command, input_hashes)
+    manifest = load_manifest(cache_dir)
+    entry = manifest["stages"].get(stage)
+
+    if entry and entry["key"] == key and outputs_match(entry["outputs"]):
+        print(f"[build_cache] {stage}: up to date")
+        return 0
+
+    action_path = os.path.join(cache_dir, "actions", f"{key}.json")
+    output_hashes: Optional[Dict[str, str]] = None
+    if os.path.exists(action_path):
+        with open(action_path, "r", encoding="utf-8") as f:
+            cached_outputs = json.load(f)["outputs"]
+        if sorted(cached_outputs) == sorted(outputs) and restore_outputs(cache_dir, cached_outputs):
+            print(f"[build_cache] {stage}: restored from {cache_dir}")
+            output_hashes = cached_outputs
+
+    if output_hashes is None:
+        result = subprocess.run(command)
+        if result.returncode != 0:
+            return result.returncode
+        missing = [path for path in outputs if not os.path.isfile(path)]
+        if missing:
+            print(f"Error: {stage} did not produce: {', '.join(missing)}")
+            return 1
+        output_hashes = {path: hash_file(path) for path in outputs}
+        for path, digest in output_hashes.items():
+            store_object(cache_dir, path, digest)
+        write_json_atomic(action_path, {"stage": stage, "outputs": output_hashes})
+
+    manifest["stages"][stage] = {
+        "key": key,
+        "command": command,
+        "inputs": input_hashes,
+        "outputs": output_hashes,
+    }
+    write_json_atomic(os.path.join(cache_dir, "manifest.json"), manifest)
+    return 0
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Run a build stage through the content-addressed build cache.")
+
+    parser.add_argument(
+        "--stage", type=str, required=True,
+        help="Stage name recorded in the build manifest"
+    )
+    parser.add_argument(
+        "--inputs", type=str, nargs="+", default=[],
+        help="Input files or directories whose contents determine the outputs"
+    )
+    parser.add_argument(
+        "--outputs", type=str, nargs="+", required=True,
+        help="Output files produced by the command"
+    )
+    parser.add_argument(
+        "--cache-dir", type=str,
+        default=".build-cache",
+        help="Directory holding manifest.json and the artifact store (default: .build-cache)"
+    )
+    parser.add_argument(
+        "command", nargs=argparse.REMAINDER,
+        help="Command to run, after '--'"
+    )
+
+    return parser
+
+def main(argv=None):
+    parser = setup_argument_parser()
+    args = parser.parse_args(argv)
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        parser.error("a command to run is required after '--'")
+
+    sys.exit(run_stage(args.stage, args.inputs, args.outputs, command, args.cache_dir))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ビルドデーモン (build_daemon.py) にスクリプトの実行を依頼するクライアント。
+
+標準ライブラリだけで動くので起動が速い。スクリプトの出力と終了コードはデーモンから受け取って
+そのまま返す。デーモンが動いていなければ、通常どおり python3 でスクリプトを実行する。
+
+使い方:
+    build_client.py --socket .build-daemon.sock -- src/wxr_to_md.py input.xml articles
+    build_client.py --socket .build-daemon.sock --status
+    build_client.py --socket .build-daemon.sock --shutdown
+"""
+
+import os
+import sys
+import json
+import socket
+import argparse
+from typing import Dict, Optional
+
+def request_daemon(socket_path: str, request: Dict) -> Optional[int]:
+    """
+    要求を送り、出力を標準出力・標準エラーに書き出して終了コードを返す。
+    デーモンに接続できなければ None を返す。
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return None
+
+    with client, client.makefile("rb") as responses:
+        client.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+        for line in responses:
+            message = json.loads(line)
+            if "exit" in message:
+                return message["exit"]
+            stream = sys.stderr if message.get("stream") == "stderr" else sys.stdout
+            stream.write(message.get("data", ""))
+            stream.flush()
+
+    print("Error: ビルドデーモンとの接続が途中で切れました。", file=sys.stderr)
+    return 1
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Run a build script through the build daemon, falling back to a normal run.")
+
+    parser.add_argument(
+        "--socket", type=str,
+        default=".build-daemon.sock",
+        help="Path of the daemon's Unix socket (default: .build-daemon.sock)"
+    )
+    parser.add_argument(
+        "--status", action="store_true",
+        help="Show the daemon's status"
+    )
+    parser.add_argument(
+        "--shutdown", action="store_true",
+        help="Stop the daemon"
+    )
+    parser.add_argument(
+        "--no-fallback", action="store_true",
+        help="Fail instead of running the script directly when the daemon is not running"
+    )
+    parser.add_argument(
+        "command", nargs=argparse.REMAINDER,
+        help="Script and its arguments, after '--'"
+    )
+
+    return parser
+
+def main(argv=None):
+    parser = setup_argument_parser()
+    args = parser.parse_args(argv)
+
+    if args.status or args.shutdown:
+        code = request_daemon(args.socket, {"command": "status" if args.status else "shutdown"})
+        if code is None:
+            print(f"ビルドデーモンは動いていません ({args.socket})。")
+            code = 1 if args.status else 0
+        sys.exit(code)
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        parser.error("a script to run is required after '--'")
+
+    script, script_args = command[0], command[1:]
+    code = request_daemon(args.socket, {
+        "command": "run",
+        "script": script,
+        "argv": script_args,
+        "cwd": os.getcwd(),
+        "env": dict(os.environ),
+    })
+    if code is not None:
+        sys.exit(code)
+
+    if args.no_fallback:
+        print(f"Error: ビルドデーモンに接続できません ({args.socket})。", file=sys.stderr)
+        sys.exit(1)
+    # デーモンがなければ、このプロセスをスクリプトの通常の実行に置き換える
+    os.execv(sys.executable, [sys.executable, script] + script_args)
+
+if __name__ == "__main__":
+    main()
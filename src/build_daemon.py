@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ビルドデーモン。
+
+src/ のスクリプトを読み込んだままのプロセスを常駐させ、Unix ソケットで受け付けたビルド要求を
+同じプロセス内の main(argv) で実行する。Python の起動と bs4・PyPDF2・yaml などの読み込みは
+最初の1回だけで済み、記事カタログ (article_catalog) と変換済みの Markdown (wxr_to_md。
+デーモンでだけ有効にする) はプロセス内のキャッシュに残るので、2回目以降のビルドは変わった部分の処理だけになる。
+
+- 要求は1つずつ順に処理する (標準出力・カレントディレクトリ・環境変数を要求ごとに切り替えるため)
+- スクリプトの出力はクライアント (build_client.py) にそのまま転送し、終了コードも返す
+- src/ の .py が更新されていたら、次の要求の前にモジュールを読み込み直す
+- md-to-pdf や qpdf などの外部コマンドの出力はクライアントではなくデーモンのログに出る
+
+プロトコル (1行1つの JSON):
+    要求: {"command": "run", "script": "src/wxr_to_md.py", "argv": [...], "cwd": "...", "env": {...}}
+          {"command": "status"} / {"command": "shutdown"}
+    応答: {"stream": "stdout", "data": "..."} を0個以上、最後に {"exit": 0}
+
+使い方:
+    build_daemon.py --socket .build-daemon.sock
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import importlib
+import traceback
+import socketserver
+from typing import Dict, List, Optional
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# デーモン経由で実行しないスクリプト (自分自身とクライアント)
+EXCLUDED_SCRIPTS = ("build_daemon", "build_client")
+
+class StreamForwarder:
+    """print の出力を行単位で JSON にしてソケットへ送るファイル風オブジェクト"""
+
+    def __init__(self, wfile, stream: str):
+        self.wfile = wfile
+        self.stream = stream
+        self.buffer = []
+        self.closed = False
+
+    def write(self, text: str) -> int:
+        self.buffer.append(text)
+        if "\n" in text:
+            self.flush()
+        return len(text)
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        data = "".join(self.buffer)
+        self.buffer = []
+        send_message(self, {"stream": self.stream, "data": data})
+
+    def isatty(self) -> bool:
+        return False
+
+def send_message(forwarder, message: Dict) -> None:
+    """クライアントに1行送る (切断されていたら以降は捨てる)"""
+    if forwarder.closed:
+        return
+    try:
+        forwarder.wfile.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+        forwarder.wfile.flush()
+    except (BrokenPipeError, ConnectionResetError):
+        forwarder.closed = True
+
+def script_names() -> List[str]:
+    return sorted(
+        name[:-3] for name in os.listdir(SRC_DIR)
+        if name.endswith(".py") and name[:-3] not in EXCLUDED_SCRIPTS
+    )
+
+def source_mtimes() -> Dict[str, int]:
+    mtimes = {}
+    with os.scandir(SRC_DIR) as entries:
+        for entry in entries:
+            if entry.name.endswith(".py"):
+                mtimes[entry.name] = entry.stat().st_mtime_ns
+    return mtimes
+
+def unload_modules() -> None:
+    """src/ から読み込んだモジュールを捨てる (次の import で読み込み直される)"""
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if name != "__main__" and path and os.path.dirname(os.path.abspath(path)) == SRC_DIR:
+            del sys.modules[name]
+
+def enable_caches() -> None:
+    """常駐するプロセスでだけ意味のあるキャッシュを有効にする (モジュールを読み込み直すたびに呼ぶ)"""
+    try:
+        importlib.import_module("wxr_to_md").enable_conversion_cache()
+    except Exception as e:
+        print(f"Warning: wxr_to_md の変換キャッシュを有効にできませんでした: {e}")
+
+def preload_modules() -> None:
+    for name in script_names():
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"Warning: {name} を読み込めませんでした: {e}")
+
+class BuildDaemon(socketserver.UnixStreamServer):
+    """要求を1つずつ処理する Unix ソケットのサーバ"""
+
+    def __init__(self, socket_path: str, preload: bool = True):
+        super().__init__(socket_path, BuildRequestHandler)
+        os.chmod(socket_path, 0o600)
+        self.socket_path = socket_path
+        self.stopping = False
+        self.started_at = time.time()
+        self.request_count = 0
+        self.preload = preload
+        if preload:
+            preload_modules()
+        enable_caches()
+        self.mtimes = source_mtimes()
+
+    def reload_if_changed(self) -> None:
+        mtimes = source_mtimes()
+        if mtimes != self.mtimes:
+            print("src/ が更新されたため、モジュールを読み込み直します。")
+            unload_modules()
+            if self.preload:
+                preload_modules()
+            enable_caches()
+            self.mtimes = mtimes
+
+    def resolve_script(self, script: str, cwd: str) -> Optional[str]:
+        """要求されたスクリプトのモジュール名 (src/ のスクリプトでなければ None)"""
+        name = os.path.splitext(os.path.basename(script))[0]
+        if name in EXCLUDED_SCRIPTS:
+            return None
+        expected = os.path.join(SRC_DIR, f"{name}.py")
+        if not os.path.isfile(expected):
+            return None
+        if os.path.realpath(os.path.join(cwd, script)) != os.path.realpath(expected):
+            return None
+        return name
+
+    def run_script(self, request: Dict, stdout: StreamForwarder, stderr: StreamForwarder) -> int:
+        """スクリプトの main(argv) を、要求元のカレントディレクトリ・環境変数・sys.argv で実行する"""
+        script = request["script"]
+        argv = request.get("argv", [])
+        cwd = request.get("cwd") or os.getcwd()
+        name = self.resolve_script(script, cwd)
+        if name is None:
+            stderr.write(f"Error: {script} は {SRC_DIR} のスクリプトではありません。\n")
+            stderr.flush()
+            return 1
+
+        saved_cwd = os.getcwd()
+        saved_env = dict(os.environ)
+        saved_argv = sys.argv
+        saved_streams = (sys.stdout, sys.stderr)
+        try:
+            os.chdir(cwd)
+            if "env" in request:
+                os.environ.clear()
+                os.environ.update(request["env"])
+            sys.argv = [script] + list(argv)
+            sys.stdout, sys.stderr = stdout, stderr
+            try:
+                importlib.import_module(name).main(list(argv))
+                return 0
+            except SystemExit as e:
+                if e.code is None:
+                    return 0
+                if isinstance(e.code, int):
+                    return e.code
+                print(e.code, file=sys.stderr)
+                return 1
+            except Exception:
+                traceback.print_exc()
+                return 1
+        finally:
+            stdout.flush()
+            stderr.flush()
+            sys.stdout, sys.stderr = saved_streams
+            sys.argv = saved_argv
+            os.environ.clear()
+            os.environ.update(saved_env)
+            os.chdir(saved_cwd)
+
+class BuildRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        stdout = StreamForwarder(self.wfile, "stdout")
+        stderr = StreamForwarder(self.wfile, "stderr")
+        try:
+            request = json.loads(line)
+        except ValueError:
+            send_message(stdout, {"stream": "stderr", "data": "Error: 要求を解釈できません。\n"})
+            send_message(stdout, {"exit": 2})
+            return
+
+        server: BuildDaemon = self.server
+        command = request.get("command")
+        if command == "status":
+            status = (f"pid {os.getpid()}, 起動から {time.time() - server.started_at:.0f} 秒, "
+                      f"要求 {server.request_count} 件, 読み込み済みモジュール "
+                      f"{sum(1 for name in script_names() if name in sys.modules)} 件\n")
+            send_message(stdout, {"stream": "stdout", "data": status})
+            send_message(stdout, {"exit": 0})
+        elif command == "shutdown":
+            server.stopping = True
+            send_message(stdout, {"stream": "stdout", "data": "ビルドデーモンを終了します。\n"})
+            send_message(stdout, {"exit": 0})
+        elif command == "run":
+            server.reload_if_changed()
+            server.request_count += 1
+            start = time.perf_counter()
+            code = server.run_script(request, stdout, stderr)
+            send_message(stdout, {"exit": code})
+            print(f"{request['script']} {' '.join(request.get('argv', []))} "
+                  f"({time.perf_counter() - start:.2f} 秒, 終了コード {code})", flush=True)
+        else:
+            send_message(stdout, {"stream": "stderr", "data": f"Error: 不明なコマンド {command}\n"})
+            send_message(stdout, {"exit": 2})
+
+def socket_in_use(socket_path: str) -> bool:
+    """別のデーモンがそのソケットで待ち受けているか"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+            return True
+        except OSError:
+            return False
+
+def serve(socket_path: str, preload: bool = True) -> None:
+    if os.path.exists(socket_path):
+        if socket_in_use(socket_path):
+            print(f"Error: {socket_path} ではすでにビルドデーモンが動いています。")
+            sys.exit(1)
+        # 前回異常終了したときのソケットファイル
+        os.remove(socket_path)
+
+    # SIGTERM でもソケットファイルを片付けて終了する
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    daemon = BuildDaemon(socket_path, preload=preload)
+    print(f"ビルドデーモンを起動しました: {socket_path} (pid {os.getpid()})", flush=True)
+    try:
+        while not daemon.stopping:
+            daemon.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Keep the build scripts loaded and run build requests received over a Unix socket.")
+
+    parser.add_argument(
+        "--socket", type=str,
+        default=".build-daemon.sock",
+        help="Path of the Unix socket to listen on (default: .build-daemon.sock)"
+    )
+    parser.add_argument(
+        "--no-preload", action="store_true",
+        help="Import scripts on first use instead of at startup"
+    )
+
+    return parser
+
+def main(argv=None):
+    parser = setup_argument_parser()
+    args = parser.parse_args(argv)
+
+    serve(args.socket, preload=not args.no_preload)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+md-to-pdf を使わずに、記事ごとの章ファイルからなる静的HTML / EPUB を生成する。
+
+merge_md_files.py と同じ記事一覧・リフレクション・QRコード・テンプレートを入力とし、
+章ごとの Markdown→HTML 変換と書き出しをプロセスプールで並行に行う。
+"""
+
+import os
+import re
+import html
+import shutil
+import zipfile
+import argparse
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from markdown_it import MarkdownIt
+
+from build_cache import get_build_datetime
+from merge_md_files import get_relative_path, index_article_files, read_title, relative_path_targets, select_article_files
+from progress import Progress, add_progress_arguments, configure as configure_progress
+from select_articles import load_article_numbers
+
+# 章ファイルの雛形 (EPUB にもそのまま格納できるよう XHTML として出力する)
+CHAPTER_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="ja" xml:lang="ja">
+<head>
+<meta charset="utf-8" />
+<title>{title}</title>
+{stylesheets}
+</head>
+<body class="markdown-body">
+<section class="{kind}">
+{body}
+</section>
+<nav class="chapter-nav">{nav}</nav>
+</body>
+</html>
+"""
+
+IMAGE_SRC_PATTERN = re.compile(r'(<img\b[^>]*?\bsrc=")([^"]+)(")')
+
+_markdown = None
+
+def get_markdown() -> MarkdownIt:
+    """md-to-pdf (marked) と同様に HTML ブロックを解釈する CommonMark レンダラ"""
+    global _markdown
+    if _markdown is None:
+        _markdown = MarkdownIt("commonmark", {"html": True, "xhtmlOut": True})
+        _markdown.enable("table").enable("strikethrough")
+    return _markdown
+
+def read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def build_article_markdown(chapter: Dict[str, str]) -> str:
+    """merge_md_files と同じ規則で記事・QRコード・リフレクションを組み立てる"""
+    content = f'<div id="article-{chapter["number"]}"></div>\n\n'
+    article_md = read_text(chapter["source"])
+
+    qr_path = chapter.get("qr_path")
+    if qr_path and os.path.exists(qr_path):
+        qr_code_md = f"\n![]({get_relative_path(chapter['output'], qr_path)})\n"
+        article_md = article_md.replace("**公開日**:", qr_code_md + "**公開日**:", 1)
+    content += article_md
+
+    reflection_path = chapter.get("reflection")
+    if reflection_path and os.path.exists(reflection_path):
+        content += "\n\n"
+        content += read_text(reflection_path)
+    return content
+
+def render_chapter(chapter: Dict[str, str]) -> str:
+    """1章分の Markdown を HTML に変換して書き出す (プロセスプールから呼ばれる)"""
+    if chapter["kind"] == "article":
+        content = build_article_markdown(chapter)
+    else:
+        content = read_text(chapter["source"])
+
+    # 画像などの相対パスを章ファイルの位置から解決できるように置換
+    for target_path in chapter["rewrite_targets"]:
+        content = content.replace("(" + target_path, "(" + get_relative_path(chapter["output"], target_path) + "/")
+
+    body = get_markdown().render(content)
+    with open(chapter["output"], "w", encoding="utf-8") as f:
+        f.write(CHAPTER_TEMPLATE.format(
+            title=html.escape(chapter["title"]),
+            stylesheets=chapter["stylesheets"],
+            kind=chapter["kind"],
+            body=body,
+            nav=chapter["nav"],
+        ))
+    return chapter["output"]
+
+def build_html(
+    output_dir: str,
+    articles_dir: Optional[str] = None,
+    qr_dir: Optional[str] = None,
+    include_numbers: Optional[List[str]] = None,
+    exclude_numbers: Optional[List[str]] = None,
+    cover_design: Optional[str] = None,
+    back_cover_design: Optional[str] = None,
+    introduction: Optional[str] = None,
+    conclusion: Optional[str] = None,
+    reflections_dir: Optional[str] = None,
+    stylesheets: Optional[List[str]] = None,
+    book_title: str = "note-book",
+    epub: Optional[str] = None,
+    jobs: Optional[int] = None,
+    asset_dirs: Optional[List[str]] = None,
+) -> List[Dict[str, str]]:
+    exclude_set = set(f"{int(num):04}" for num in (exclude_numbers or []))
+    include_set = set(f"{int(num):04}" for num in (include_numbers or []))
+
+    chapters_dir = os.path.join(output_dir, "chapters")
+    styles_dir = os.path.join(output_dir, "styles")
+    os.makedirs(chapters_dir, exist_ok=True)
+    os.makedirs(styles_dir, exist_ok=True)
+
+    # 共通CSSをコピー
+    css_files = []
+    for stylesheet in stylesheets or []:
+        if os.path.exists(stylesheet):
+            shutil.copyfile(stylesheet, os.path.join(styles_dir, os.path.basename(stylesheet)))
+            css_files.append(os.path.basename(stylesheet))
+        else:
+            print(f"Warning: Stylesheet '{stylesheet}' not found. Skipping.\n")
+    stylesheet_links = "\n".join(
+        f'<link rel="stylesheet" type="text/css" href="../styles/{name}" />' for name in css_files
+    )
+
+    chapters = []
+
+    def add_special(kind, path, title, label):
+        if not path:
+            return
+        if not os.path.exists(path):
+            print(f"Warning: {label} file '{path}' not found. Skipping {label.lower()}.\n")
+            return
+        chapters.append({"kind": kind, "source": path, "title": title, "id": kind})
+
+    add_special("cover", cover_design, "表紙", "Cover")
+    add_special("introduction", introduction, "はじめに", "Introduction")
+
+    if articles_dir:
+        selected = select_article_files(index_article_files(articles_dir), include_set, exclude_set)
+        for article_number, source in selected:
+            md_file = os.path.basename(source)
+            chapters.append({
+                "kind": "article",
+                "id": f"article-{article_number}",
+                "number": article_number,
+                "source": source,
+                "title": read_title(source),
+                "qr_path": os.path.join(qr_dir, md_file.replace(".md", ".png")) if qr_dir else "",
+                "reflection": os.path.join(reflections_dir, f"{article_number}_reflection.md") if reflections_dir else "",
+            })
+
+    add_special("conclusion", conclusion, "あとがき", "Conclusion")
+    add_special("back-cover", back_cover_design, "裏表紙", "Back cover")
+
+    # 章ごとの出力先と前後リンク
+    rewrite_targets = relative_path_targets(asset_dirs)
+    for idx, chapter in enumerate(chapters):
+        chapter["filename"] = f"{idx:04d}-{chapter['id']}.xhtml"
+        chapter["output"] = os.path.join(chapters_dir, chapter["filename"])
+        chapter["stylesheets"] = stylesheet_links
+        chapter["rewrite_targets"] = rewrite_targets
+    for idx, chapter in enumerate(chapters):
+        nav = []
+        if idx > 0:
+            nav.append(f'<a rel="prev" href="{chapters[idx - 1]["filename"]}">前へ</a>')
+        nav.append('<a href="../index.html">目次</a>')
+        if idx < len(chapters) - 1:
+            nav.append(f'<a rel="next" href="{chapters[idx + 1]["filename"]}">次へ</a>')
+        chapter["nav"] = " | ".join(nav)
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor, \
+            Progress("build_html", total=len(chapters), unit="章") as progress:
+        for output_path in executor.map(render_chapter, chapters, chunksize=16):
+            progress.advance(item=output_path)
+
+    write_index(output_dir, chapters, book_title, css_files)
+
+    if epub:
+        write_epub(epub, output_dir, chapters, book_title, css_files)
+        print(f"Saved: {epub}")
+
+    return chapters
+
+def write_index(output_dir: str, chapters: List[Dict[str, str]], book_title: str, css_files: List[str]) -> None:
+    """章一覧 (目次) の index.html を出力する"""
+    items = "\n".join(
+        f'<li><a href="chapters/{chapter["filename"]}">{html.escape(chapter["title"])}</a></li>'
+        for chapter in chapters
+    )
+    links = "\n".join(f'<link rel="stylesheet" type="text/css" href="styles/{name}" />' for name in css_files)
+    with open(os.path.join(output_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(
+            '<!DOCTYPE html>\n<html lang="ja">\n<head>\n<meta charset="utf-8" />\n'
+            f"<title>{html.escape(book_title)}</title>\n{links}\n</head>\n"
+            f'<body class="markdown-body">\n<h1>{html.escape(book_title)}</h1>\n'
+            f'<nav class="toc"><ol>\n{items}\n</ol></nav>\n</body>\n</html>\n'
+        )
+
+def write_epub(epub_path: str, output_dir: str, chapters: List[Dict[str, str]], book_title: str, css_files: List[str]) -> None:
+    """生成済みの章ファイルを EPUB3 としてまとめる"""
+    manifest = []
+    images: Dict[str, str] = {}
+
+    # ZIP エントリの日時も固定し、同じ入力から同じ EPUB が得られるようにする
+    build_datetime = get_build_datetime()
+    zip_date_time = max(build_datetime.timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+
+    with zipfile.ZipFile(epub_path, "w", zipfile.ZIP_DEFLATED) as epub:
+        def add_entry(name, data, compress_type=zipfile.ZIP_DEFLATED):
+            info = zipfile.ZipInfo(name, date_time=zip_date_time)
+            info.external_attr = 0o644 << 16
+            epub.writestr(info, data, compress_type=compress_type)
+
+        def add_file(path, name):
+            with open(path, "rb") as f:
+                add_entry(name, f.read())
+
+        # mimetype は先頭に無圧縮で格納する必要がある
+        add_entry("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        add_entry(
+            "META-INF/container.xml",
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">\n'
+            '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>\n'
+            '</container>\n'
+        )
+
+        for name in css_files:
+            add_file(os.path.join(output_dir, "styles", name), f"OEBPS/styles/{name}")
+            manifest.append((f"css-{len(manifest)}", f"styles/{name}", "text/css"))
+
+        def package_image(match, chapter_dir):
+            src = match.group(2)
+            if re.match(r"^[a-z][a-z0-9+.-]*:", src, re.IGNORECASE):
+                return match.group(0)
+            image_path = os.path.normpath(os.path.join(chapter_dir, src))
+            if not os.path.exists(image_path):
+                return match.group(0)
+            if image_path not in images:
+                images[image_path] = f"images/{len(images):04d}-{os.path.basename(image_path)}"
+                add_file(image_path, f"OEBPS/{images[image_path]}")
+            return f"{match.group(1)}../{images[image_path]}{match.group(3)}"
+
+        for chapter in chapters:
+            chapter_dir = os.path.dirname(chapter["output"])
+            xhtml = IMAGE_SRC_PATTERN.sub(lambda m: package_image(m, chapter_dir), read_text(chapter["output"]))
+            xhtml = xhtml.replace('href="../index.html"', 'href="../nav.xhtml"')
+            add_entry(f"OEBPS/chapters/{chapter['filename']}", xhtml)
+
+        for image_path, href in images.items():
+            ext = os.path.splitext(href)[1].lower().lstrip(".")
+            media_type = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "svg": "image/svg+xml"}.get(ext, f"image/{ext}")
+            manifest.append((f"img-{len(manifest)}", href, media_type))
+
+        nav_items = "\n".join(
+            f'<li><a href="chapters/{chapter["filename"]}">{html.escape(chapter["title"])}</a></li>'
+            for chapter in chapters
+        )
+        add_entry(
+            "OEBPS/nav.xhtml",
+            '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="ja" xml:lang="ja">\n'
+            f'<head><meta charset="utf-8" /><title>{html.escape(book_title)}</title></head>\n'
+            f'<body><nav epub:type="toc" id="toc"><h1>目次</h1><ol>\n{nav_items}\n</ol></nav></body>\n</html>\n'
+        )
+
+        manifest_items = "\n".join(
+            f'<item id="{item_id}" href="{href}" media-type="{media_type}"/>' for item_id, href, media_type in manifest
+        )
+        chapter_items = "\n".join(
+            f'<item id="ch-{idx}" href="chapters/{chapter["filename"]}" media-type="application/xhtml+xml"/>'
+            for idx, chapter in enumerate(chapters)
+        )
+        spine = "\n".join(f'<itemref idref="ch-{idx}"/>' for idx in range(len(chapters)))
+        book_id = uuid.uuid5(uuid.NAMESPACE_URL, book_title)
+        modified = build_datetime.strftime("%Y-%m-%dT%H:%M:%SZ")
+        add_entry(
+            "OEBPS/content.opf",
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id" xml:lang="ja">\n'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">\n'
+            f'<dc:identifier id="book-id">urn:uuid:{book_id}</dc:identifier>\n'
+            f'<dc:title>{html.escape(book_title)}</dc:title>\n'
+            '<dc:language>ja</dc:language>\n'
+            f'<meta property="dcterms:modified">{modified}</meta>\n'
+            '</metadata>\n'
+            '<manifest>\n'
+            '<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>\n'
+            f'{manifest_items}\n{chapter_items}\n'
+            '</manifest>\n'
+            f'<spine>\n{spine}\n</spine>\n'
+            '</package>\n'
+        )
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Build a static HTML site (and optionally an EPUB) with one chapter per article.")
+
+    # Output configuration
+    output_group = parser.add_argument_group('output configuration')
+    output_group.add_argument(
+        "--output-dir", type=str,
+        default="output/html",
+        help="Directory for the generated HTML chapters. Default is 'output/html'."
+    )
+    output_group.add_argument(
+        "--epub", type=str,
+        default=None,
+        help="Also package the chapters into this EPUB file (optional)."
+    )
+    output_group.add_argument(
+        "--title", type=str,
+        default="note-book",
+        help="Book title used in the index and EPUB metadata."
+    )
+    output_group.add_argument(
+        "--stylesheet", type=str,
+        action="append",
+        default=[],
+        help="CSS file to copy and link from every chapter (repeatable)."
+    )
+    output_group.add_argument(
+        "--jobs", type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)."
+    )
+
+    # Article filtering
+    filter_group = parser.add_argument_group('article filtering')
+    filter_group.add_argument(
+        "--include-file", type=str,
+        default=None,
+        help="Path to file containing article numbers to include (one per line)"
+    )
+    filter_group.add_argument(
+        "--exclude-file", type=str,
+        default=None,
+        help="Path to file containing article numbers to exclude (one per line)"
+    )
+
+    # Document structure
+    structure_group = parser.add_argument_group('document structure')
+    structure_group.add_argument(
+        "--cover-design", type=str,
+        default=None,
+        help="Path to the cover file (optional)."
+    )
+    structure_group.add_argument(
+        "--back-cover-design", type=str,
+        default=None,
+        help="Path to the back cover file (optional)."
+    )
+    structure_group.add_argument(
+        "--introduction", type=str,
+        default=None,
+        help="Path to introduction markdown file"
+    )
+    structure_group.add_argument(
+        "--articles-dir", type=str,
+        default=None,
+        help="Directory containing article markdown files"
+    )
+    structure_group.add_argument(
+        "--conclusion", type=str,
+        default=None,
+        help="Path to conclusion markdown file"
+    )
+    structure_group.add_argument(
+        "--reflections-dir", type=str,
+        default=None,
+        help="Directory containing reflection markdown files for each article"
+    )
+    structure_group.add_argument(
+        "--qr-dir", type=str,
+        default=None,
+        help="Directory containing QR code images"
+    )
+    parser.add_argument(
+        "--asset-dir", type=str, action="append",
+        default=None,
+        help="Extra directory whose ./<dir>/ links are rewritten relative to the output (repeatable)"
+    )
+    add_progress_arguments(parser)
+
+    return parser
+
+def main(argv=None):
+    parser = setup_argument_parser()
+    args = parser.parse_args(argv)
+    configure_progress(args.quiet, args.progress_events)
+
+    exclude_numbers = sorted(load_article_numbers(args.exclude_file)) if args.exclude_file else None
+    include_numbers = sorted(load_article_numbers(args.include_file)) if args.include_file else None
+
+    build_html(
+        output_dir=args.output_dir,
+        articles_dir=args.articles_dir,
+        qr_dir=args.qr_dir,
+        include_numbers=include_numbers,
+        exclude_numbers=exclude_numbers,
+        cover_design=args.cover_design,
+        back_cover_design=args.back_cover_design,
+        introduction=args.introduction,
+        conclusion=args.conclusion,
+        reflections_dir=args.reflections_dir,
+        stylesheets=args.stylesheet,
+        book_title=args.title,
+        epub=args.epub,
+        jobs=args.jobs,
+        asset_dirs=args.asset_dir,
+    )
+
+if __name__ == "__main__":
+    main()
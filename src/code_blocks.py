@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+コードブロック (<pre>/<pre><code>) の Markdown 出力。
+
+行番号はジェネレータで1行ずつ付与し、桁数は行数に合わせて広げる (最低3桁)。
+長いブロックは設定に応じて途中で折りたたみ (元記事へのリンクを添える)、
+ページに収まる行数ごとに別のフェンスへ分割して、ブラウザのレイアウト負荷を抑える。
+"""
+
+from itertools import islice
+from typing import Iterator, NamedTuple, Optional
+
+# 行番号の最小桁数 (従来の f"{i:03d}" と同じ)
+MIN_LINE_NUMBER_WIDTH = 3
+
+class CodeBlockOptions(NamedTuple):
+    """コードブロックの出力設定 (0 は無制限)"""
+    max_lines: int = 0
+    page_lines: int = 0
+    source_url: Optional[str] = None
+
+def iter_lines(text: str) -> Iterator[str]:
+    """text.split('\\n') と同じ行を、リストを作らずに順に返す"""
+    start = 0
+    while True:
+        end = text.find("\n", start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+def line_number_width(total_lines: int) -> int:
+    return max(MIN_LINE_NUMBER_WIDTH, len(str(total_lines)))
+
+def number_lines(lines: Iterator[str], total_lines: int) -> Iterator[str]:
+    """各行の先頭にゼロ埋めの行番号を付ける"""
+    width = line_number_width(total_lines)
+    for i, line in enumerate(lines, 1):
+        yield f"{i:0{width}d} {line}"
+
+def iter_pages(lines: Iterator[str], page_lines: int) -> Iterator[str]:
+    """page_lines 行ごとにまとめた文字列を返す (0 なら全体を1つにまとめる)"""
+    if page_lines <= 0:
+        yield "\n".join(lines)
+        return
+    while True:
+        page = list(islice(lines, page_lines))
+        if not page:
+            return
+        yield "\n".join(page)
+
+def render_code_block(raw_code: str, lang: str, options: Optional[CodeBlockOptions] = None, numbered: bool = True) -> str:
+    """
+    コードを Markdown のフェンス (````lang ... ````) に変換する。
+
+    Args:
+        raw_code (str): コードの本文
+        lang (str): フェンスに付ける言語名
+        options (CodeBlockOptions): 折りたたみ・分割の設定
+        numbered (bool): 行番号を付けるかどうか
+
+    Returns:
+        str: Markdown 文字列
+    """
+    options = options or CodeBlockOptions()
+    total_lines = raw_code.count("\n") + 1
+    shown_lines = total_lines
+    if options.max_lines and total_lines > options.max_lines:
+        shown_lines = options.max_lines
+
+    lines = islice(iter_lines(raw_code), shown_lines)
+    if numbered:
+        lines = number_lines(lines, total_lines)
+
+    fences = [f"\n````{lang}\n{page}\n````\n" for page in iter_pages(lines, options.page_lines)]
+
+    if shown_lines < total_lines:
+        omitted = total_lines - shown_lines
+        if options.source_url:
+            fences.append(f"\n*（以降の {omitted} 行は省略しています。全文は[元の記事]({options.source_url})を参照してください）*\n")
+        else:
+            fences.append(f"\n*（以降の {omitted} 行は省略しています）*\n")
+
+    return "".join(fences)
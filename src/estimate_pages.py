@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+記事の Markdown から、md-to-pdf でレンダリングしたときのページ数を見積もる。
+
+本文の文字数 (全角・半角別)、コードの行数、画像の寸法、見出しの数を pdf_options.yaml の
+用紙サイズ・余白から求めた縦方向の長さに換算し、線形モデルで記事ごとのページ数を予測する。
+以前のレンダリング結果の目次 (toc.md) があれば、その実際のページ数に最小二乗で合わせ込む。
+
+見積もりを使って、ページ数の上限に収まる include リストの作成や、分冊ができる。
+
+    python3 src/estimate_pages.py --max-pages 200 --output config/include_articles.txt
+"""
+
+import os
+import re
+import json
+import math
+import argparse
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import yaml
+from PIL import Image
+
+from generate_toc import match_toc_articles, parse_toc_markdown
+from merge_md_files import index_article_files, read_title, select_article_files
+from select_articles import load_article_numbers
+
+MM_PER_INCH = 25.4
+MM_PER_PT = MM_PER_INCH / 72
+MM_PER_PX = MM_PER_INCH / 96
+
+# Puppeteer の用紙サイズ (インチ)
+PAPER_FORMATS = {
+    "letter": (8.5, 11), "legal": (8.5, 14), "tabloid": (11, 17), "ledger": (17, 11),
+    "a0": (33.1, 46.8), "a1": (23.4, 33.1), "a2": (16.54, 23.4), "a3": (11.7, 16.54),
+    "a4": (8.27, 11.7), "a5": (5.83, 8.27), "a6": (4.13, 5.83),
+}
+
+# md-to-pdf の既定の余白
+DEFAULT_MARGIN = {"top": "30mm", "right": "40mm", "bottom": "30mm", "left": "20mm"}
+
+# 半角文字の平均的な幅 (全角文字を 1em とする)
+NARROW_CHAR_EM = 0.55
+
+UNIT_PATTERN = re.compile(r"^\s*([\d.]+)\s*(mm|cm|in|px)?\s*$")
+
+FENCE_PATTERN = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+HEADING_PATTERN = re.compile(r"^ {0,3}(#{1,6})\s+(.*)$")
+IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\(\s*<?([^)\s>]+)>?[^)]*\)|<img\b[^>]*?\bsrc\s*=\s*[\"']([^\"']+)[\"']", re.IGNORECASE)
+LINK_PATTERN = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+MARKUP_PATTERN = re.compile(r"<[^>]+>|\*\*|__|~~|[*`]|^\s*(?:[-+*]|\d+\.|>)\s+")
+
+# モデルの特徴量 (いずれも記事1つ分)
+FEATURE_NAMES = ("text_mm", "code_mm", "headings", "image_mm", "blocks", "article")
+
+class PageGeometry(NamedTuple):
+    """1ページの本文領域と文字の大きさ (mm)"""
+    text_width: float
+    text_height: float
+    font_size: float
+    line_height: float
+    code_line_height: float
+
+    @property
+    def code_columns(self) -> int:
+        # 等幅フォントは本文の 85%、1文字の幅は 0.6em
+        return max(1, int(self.text_width / (self.font_size * 0.85 * 0.6)))
+
+class ArticleFeatures(NamedTuple):
+    """ページ数の見積もりに使う記事の特徴"""
+    wide_chars: int
+    narrow_chars: int
+    text_lines: int
+    code_lines: int
+    headings: int
+    image_mm: float
+    blocks: int
+
+    def vector(self, geometry: PageGeometry) -> List[float]:
+        return [
+            self.text_lines * geometry.line_height,
+            self.code_lines * geometry.code_line_height,
+            float(self.headings),
+            self.image_mm,
+            float(self.blocks),
+            1.0,
+        ]
+
+def parse_length(value, default_mm: float) -> float:
+    """"20mm" / "1in" / "2cm" / "96px" / 数値 (px) を mm に変換する"""
+    if value is None:
+        return default_mm
+    if isinstance(value, (int, float)):
+        return value * MM_PER_PX
+    match = UNIT_PATTERN.match(str(value))
+    if not match:
+        print(f"Warning: 長さ '{value}' を解釈できません。{default_mm}mm とみなします。")
+        return default_mm
+    number, unit = float(match.group(1)), match.group(2) or "px"
+    return number * {"mm": 1.0, "cm": 10.0, "in": MM_PER_INCH, "px": MM_PER_PX}[unit]
+
+def load_page_geometry(pdf_options: Optional[str], font_size_pt: float = 10.0, line_height: float = 1.5) -> PageGeometry:
+    """pdf_options.yaml (md-to-pdf の pdf_options) から本文領域の大きさを求める"""
+    options = {}
+    if pdf_options and os.path.exists(pdf_options):
+        with open(pdf_options, "r", encoding="utf-8") as f:
+            options = yaml.safe_load(f) or {}
+
+    paper = PAPER_FORMATS.get(str(options.get("format", "A4")).lower())
+    if paper is None:
+        print(f"Warning: 用紙サイズ '{options.get('format')}' は未対応です。A4 とみなします。")
+        paper = PAPER_FORMATS["a4"]
+    width = parse_length(options.get("width"), paper[0] * MM_PER_INCH)
+    height = parse_length(options.get("height"), paper[1] * MM_PER_INCH)
+    if options.get("landscape"):
+        width, height = height, width
+
+    margin = options.get("margin") or DEFAULT_MARGIN
+    if not isinstance(margin, dict):
+        margin = dict.fromkeys(DEFAULT_MARGIN, margin)
+    margins = {side: parse_length(margin.get(side, DEFAULT_MARGIN[side]), parse_length(DEFAULT_MARGIN[side], 0))
+               for side in DEFAULT_MARGIN}
+
+    font_size = font_size_pt * MM_PER_PT
+    return PageGeometry(
+        text_width=width - margins["left"] - margins["right"],
+        text_height=height - margins["top"] - margins["bottom"],
+        font_size=font_size,
+        line_height=font_size * line_height,
+        code_line_height=font_size * 0.85 * 1.45,
+    )
+
+def default_weights(geometry: PageGeometry) -> List[float]:
+    """校正前の重み: 縦方向の長さ (mm) を本文領域の高さで割ったもの"""
+    height = geometry.text_height
+    return [
+        1 / height,                          # 本文
+        1 / height,                          # コード
+        geometry.font_size * 3 / height,     # 見出し (文字の大きさと前後の余白)
+        1 / height,                          # 画像
+        geometry.font_size / height,         # 段落・リスト項目間の余白
+        0.5,                                 # 記事は改ページで始まるため、最後のページは平均して半分空く
+    ]
+
+class ImageSizer:
+    """画像ファイルのヘッダから寸法を読み、本文幅に収めたときの高さ (mm) を返す"""
+
+    def __init__(self, geometry: PageGeometry, search_dirs: Sequence[str]):
+        self.geometry = geometry
+        self.search_dirs = search_dirs
+        self._cache: Dict[str, float] = {}
+
+    def height_mm(self, src: str, article_dir: str) -> float:
+        if src not in self._cache:
+            self._cache[src] = self._measure(src, article_dir)
+        return self._cache[src]
+
+    def _measure(self, src: str, article_dir: str) -> float:
+        width = self.geometry.text_width
+        # 寸法が分からない画像 (リモート画像など) は 5:3 とみなす
+        fallback = width * 0.6
+        if re.match(r"^[a-z][a-z0-9+.-]*:", src, re.IGNORECASE):
+            return fallback
+        for base in (article_dir, *self.search_dirs):
+            path = os.path.join(base, src)
+            if os.path.exists(path):
+                break
+        else:
+            return fallback
+        try:
+            with Image.open(path) as image:
+                px_width, px_height = image.size
+        except (OSError, ValueError):
+            return fallback
+        if px_width <= 0:
+            return fallback
+        height = px_height * MM_PER_PX
+        if px_width * MM_PER_PX > width:
+            height *= width / (px_width * MM_PER_PX)
+        return min(height, self.geometry.text_height)
+
+def measure_markdown(md_path: str, geometry: PageGeometry, sizer: ImageSizer) -> ArticleFeatures:
+    with open(md_path, "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+
+    wide = narrow = text_lines = code_lines = headings = blocks = 0
+    image_mm = 0.0
+    article_dir = os.path.dirname(md_path)
+    columns_em = geometry.text_width / geometry.font_size
+    code_columns = geometry.code_columns
+
+    fence = None
+    previous_blank = True
+    for line in lines:
+        match = FENCE_PATTERN.match(line)
+        if fence:
+            if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+                fence = None
+            else:
+                code_lines += max(1, math.ceil(len(line) / code_columns))
+            continue
+        if match:
+            fence = match.group(1)
+            blocks += 1
+            previous_blank = True
+            continue
+
+        if not line.strip():
+            previous_blank = True
+            continue
+        if previous_blank:
+            blocks += 1
+        previous_blank = False
+
+        heading = HEADING_PATTERN.match(line)
+        if heading:
+            headings += 1
+            continue
+
+        for markdown_src, html_src in IMAGE_PATTERN.findall(line):
+            image_mm += sizer.height_mm(markdown_src or html_src, article_dir)
+        text = MARKUP_PATTERN.sub("", LINK_PATTERN.sub(r"\1", IMAGE_PATTERN.sub("", line))).strip()
+        if not text:
+            continue
+        line_wide = sum(1 for ch in text if unicodedata.east_asian_width(ch) in "WF")
+        line_narrow = len(text) - line_wide
+        wide += line_wide
+        narrow += line_narrow
+        text_lines += max(1, math.ceil((line_wide + line_narrow * NARROW_CHAR_EM) / columns_em))
+
+    return ArticleFeatures(wide, narrow, text_lines, code_lines, headings, image_mm, blocks)
+
+def add_features(a: ArticleFeatures, b: ArticleFeatures) -> ArticleFeatures:
+    return ArticleFeatures(*(x + y for x, y in zip(a, b)))
+
+def solve_linear_system(matrix: List[List[float]], rhs: List[float]) -> List[float]:
+    """部分ピボット付きのガウスの消去法で matrix x = rhs を解く"""
+    n = len(rhs)
+    rows = [row[:] + [value] for row, value in zip(matrix, rhs)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < 1e-12:
+            raise ValueError("連立方程式が解けません (特徴量が一次従属です)。")
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(n):
+            if r != col:
+                factor = rows[r][col] / rows[col][col]
+                for c in range(col, n + 1):
+                    rows[r][c] -= factor * rows[col][c]
+    return [rows[i][n] / rows[i][i] for i in range(n)]
+
+def fit_factors(samples: List[Tuple[List[float], int]], weights: List[float], regularization: float = 0.1) -> List[float]:
+    """
+    実際のページ数に合うよう、既定の重みに掛ける係数を最小二乗で求める。
+
+    記事数が少なくても係数が極端にならないよう、係数 1 (既定の重み) に向けて正則化する
+    (リッジ回帰: |Zf - y|^2 + λ Σ diag(ZᵀZ) (f - 1)^2)。
+    """
+    rows = [[x * w for x, w in zip(vector, weights)] for vector, _ in samples]
+    targets = [float(pages) for _, pages in samples]
+    n = len(weights)
+    gram = [[sum(row[i] * row[j] for row in rows) for j in range(n)] for i in range(n)]
+    rhs = [sum(row[i] * y for row, y in zip(rows, targets)) for i in range(n)]
+    for i in range(n):
+        penalty = regularization * max(gram[i][i], 1e-6)
+        gram[i][i] += penalty
+        rhs[i] += penalty
+    # 負の係数は物理的に意味がないので 0 に切り詰める
+    return [max(0.0, factor) for factor in solve_linear_system(gram, rhs)]
+
+def toc_page_spans(toc_path: str, articles: Sequence[Tuple[str, str]]) -> Dict[str, int]:
+    """
+    目次の開始ページの差から、記事番号 (4桁) → 実際のページ数 を求める。
+
+    articles はその目次をレンダリングしたときの結合順の (記事番号, タイトル)
+    (目次の [N] は結合順の位置なので、match_toc_articles で記事番号に直す)。
+    """
+    toc = match_toc_articles(parse_toc_markdown(toc_path), articles)
+    spans = {}
+    for (key, _, page), (_, _, next_page) in zip(toc, toc[1:]):
+        if key in ("intro", "conclusion") or next_page <= page:
+            continue
+        spans[key] = next_page - page
+    return spans
+
+class PageEstimator:
+    """記事ごとのページ数を見積もる"""
+
+    def __init__(self, geometry: PageGeometry, factors: Optional[List[float]] = None):
+        self.geometry = geometry
+        self.weights = default_weights(geometry)
+        self.factors = factors or [1.0] * len(self.weights)
+
+    def estimate(self, features: ArticleFeatures) -> float:
+        vector = features.vector(self.geometry)
+        return sum(x * w * f for x, w, f in zip(vector, self.weights, self.factors))
+
+    def pages(self, features: ArticleFeatures) -> int:
+        """改ページで始まるので、記事は少なくとも1ページを使う"""
+        return max(1, round(self.estimate(features)))
+
+    def calibrate(self, samples: List[Tuple[ArticleFeatures, int]]) -> float:
+        """実際のページ数に合わせて係数を更新し、校正後の平均二乗誤差の平方根を返す"""
+        vectors = [(features.vector(self.geometry), pages) for features, pages in samples]
+        self.factors = fit_factors(vectors, self.weights)
+        return math.sqrt(sum((self.estimate(features) - pages) ** 2 for features, pages in samples) / len(samples))
+
+    def save(self, model_path: str, sample_count: int, rmse: float) -> None:
+        with open(model_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "features": list(FEATURE_NAMES),
+                "factors": self.factors,
+                "samples": sample_count,
+                "rmse": rmse,
+            }, f, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def load_factors(model_path: str) -> List[float]:
+        with open(model_path, "r", encoding="utf-8") as f:
+            model = json.load(f)
+        if model.get("features") != list(FEATURE_NAMES):
+            raise ValueError(f"{model_path} の特徴量が現在のモデルと一致しません。校正し直してください。")
+        return model["factors"]
+
+def split_volumes(estimates: List[Tuple[str, int]], max_pages: int, reserved_pages: int = 0) -> List[List[str]]:
+    """記事番号順のまま、各巻が max_pages に収まるように分ける"""
+    volumes: List[List[str]] = []
+    current: List[str] = []
+    total = reserved_pages
+    for number, pages in estimates:
+        if current and total + pages > max_pages:
+            volumes.append(current)
+            current, total = [], reserved_pages
+        if reserved_pages + pages > max_pages:
+            print(f"Warning: 記事 {number} だけで {pages} ページあり、上限 {max_pages} ページを超えます。")
+        current.append(number)
+        total += pages
+    if current:
+        volumes.append(current)
+    return volumes
+
+def write_number_list(numbers: List[str], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(f"{number}\n" for number in numbers)
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Estimate rendered page counts of articles and budget the include list without rendering.")
+
+    # Input
+    input_group = parser.add_argument_group('input')
+    input_group.add_argument(
+        "--articles-dir", type=str,
+        default="articles",
+        help="Directory containing article markdown files (default: articles)"
+    )
+    input_group.add_argument(
+        "--pdf-options", type=str,
+        default="config/pdf_options.yaml",
+        help="YAML file with PDF options for md-to-pdf (default: config/pdf_options.yaml)"
+    )
+    input_group.add_argument(
+        "--include-file", type=str,
+        default=None,
+        help="Path to file containing article numbers to include (one per line)"
+    )
+    input_group.add_argument(
+        "--exclude-file", type=str,
+        default=None,
+        help="Path to file containing article numbers to exclude (one per line)"
+    )
+    input_group.add_argument(
+        "--reflections-dir", type=str,
+        default=None,
+        help="Directory containing reflection markdown files appended to articles"
+    )
+    input_group.add_argument(
+        "--introduction", type=str,
+        default=None,
+        help="Introduction markdown; its pages are counted in every volume"
+    )
+    input_group.add_argument(
+        "--conclusion", type=str,
+        default=None,
+        help="Conclusion markdown; its pages are counted in every volume"
+    )
+    input_group.add_argument(
+        "--font-size", type=float,
+        default=10.0,
+        help="Body font size in pt (default: 10, as in style-base.css)"
+    )
+
+    # Model
+    model_group = parser.add_argument_group('model')
+    model_group.add_argument(
+        "--model", type=str,
+        default=None,
+        help="Calibrated model JSON to use"
+    )
+    model_group.add_argument(
+        "--calibrate", type=str,
+        default=None,
+        help="TOC markdown (output/md/toc.md) of a previous render to calibrate against"
+    )
+    model_group.add_argument(
+        "--save-model", type=str,
+        default=None,
+        help="Write the calibrated model to this JSON file"
+    )
+
+    # Budget
+    budget_group = parser.add_argument_group('budget')
+    budget_group.add_argument(
+        "--max-pages", type=int,
+        default=None,
+        help="Page limit for the main matter"
+    )
+    budget_group.add_argument(
+        "--output", type=str,
+        default=None,
+        help="Write the articles that fit in --max-pages to this include file"
+    )
+    budget_group.add_argument(
+        "--split", type=str, metavar="PREFIX",
+        default=None,
+        help="Split all articles into volumes of at most --max-pages and write PREFIX01.txt, PREFIX02.txt, ..."
+    )
+
+    return parser
+
+def main(argv=None):
+    parser = setup_argument_parser()
+    args = parser.parse_args(argv)
+
+    if (args.output or args.split) and not args.max_pages:
+        parser.error("--output and --split require --max-pages")
+    if not os.path.isdir(args.articles_dir):
+        print(f"Error: {args.articles_dir} が見つかりません。")
+        return
+
+    geometry = load_page_geometry(args.pdf_options, font_size_pt=args.font_size)
+    estimator = PageEstimator(geometry, PageEstimator.load_factors(args.model) if args.model else None)
+    sizer = ImageSizer(geometry, search_dirs=[os.getcwd()])
+
+    def measure(number: str, path: str) -> ArticleFeatures:
+        features = measure_markdown(path, geometry, sizer)
+        if args.reflections_dir:
+            reflection_path = os.path.join(args.reflections_dir, f"{number}_reflection.md")
+            if os.path.exists(reflection_path):
+                features = add_features(features, measure_markdown(reflection_path, geometry, sizer))
+        return features
+
+    index = index_article_files(args.articles_dir)
+    include_set = load_article_numbers(args.include_file) if args.include_file else set()
+    exclude_set = load_article_numbers(args.exclude_file) if args.exclude_file else set()
+    selected = select_article_files(index, include_set, exclude_set)
+
+    if args.calibrate:
+        # 目次は同じ include/exclude で結合した本のものとして、結合順に記事と対応付ける
+        spans = toc_page_spans(args.calibrate, [(number, read_title(path)) for number, path in selected])
+        samples = [(measure(number, index[number]), pages) for number, pages in spans.items() if number in index]
+        if len(samples) < 2:
+            print(f"Warning: {args.calibrate} から校正に使える記事が {len(samples)} 件しかありません。既定の重みを使います。")
+        else:
+            rmse = estimator.calibrate(samples)
+            print(f"{len(samples)} 件の記事で校正しました (誤差 {rmse:.2f} ページ)。")
+            if args.save_model:
+                estimator.save(args.save_model, len(samples), rmse)
+                print(f"Saved: {args.save_model}")
+
+    estimates = []
+    total = 0
+    for number, path in selected:
+        pages = estimator.pages(measure(number, path))
+        estimates.append((number, pages))
+        total += pages
+        print(f"{number}\t{pages}\t{total}\t{read_title(path)}")
+
+    reserved = sum(estimator.pages(measure_markdown(path, geometry, sizer))
+                   for path in (args.introduction, args.conclusion) if path and os.path.exists(path))
+    print(f"合計: {len(estimates)} 記事、約 {total + reserved} ページ (序論・結論 {reserved} ページを含む)")
+
+    if not args.max_pages:
+        return
+
+    if args.output:
+        fitted = []
+        used = reserved
+        for number, pages in estimates:
+            if used + pages > args.max_pages:
+                break
+            fitted.append(number)
+            used += pages
+        write_number_list(fitted, args.output)
+        print(f"{len(fitted)} 記事 (約 {used} ページ) を {args.output} に書き出しました。")
+
+    if args.split:
+        volumes = split_volumes(estimates, args.max_pages, reserved)
+        pages_by_number = dict(estimates)
+        for volume_number, numbers in enumerate(volumes, 1):
+            volume_path = f"{args.split}{volume_number:02d}.txt"
+            write_number_list(numbers, volume_path)
+            pages = reserved + sum(pages_by_number[number] for number in numbers)
+            print(f"第{volume_number}巻: {numbers[0]}〜{numbers[-1]} ({len(numbers)} 記事、約 {pages} ページ) → {volume_path}")
+
+if __name__ == "__main__":
+    main()
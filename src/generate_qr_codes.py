@@ -3,68 +3,74 @@
 
 import os
 import qrcode
-import pandas as pd
 import argparse
 
-def generate_qr_codes(csv_file, output_dir):
-    """ 指定されたCSVファイルからURLを取得し、QRコードを生成 """
+from article_catalog import load_articles
+from progress import Progress, add_progress_arguments, configure as configure_progress
+
+def generate_qr_codes(articles_file, output_dir):
+    """ 指定された記事カタログ (またはCSV) からURLを取得し、QRコードを生成 """
 
     # QRコード保存先フォルダの作成
     os.makedirs(output_dir, exist_ok=True)
 
     # 記事一覧を読み込む
     try:
-        df = pd.read_csv(csv_file, encoding="utf-8")
+        articles = load_articles(articles_file)
     except FileNotFoundError:
-        print(f"Error: ファイル {csv_file} が見つかりません。")
+        print(f"Error: ファイル {articles_file} が見つかりません。")
         return
-
-    # 必要なカラムがあるかチェック
-    if "filename" not in df.columns or "link" not in df.columns:
-        print("Error: CSVファイルに 'filename' または 'link' のカラムがありません。")
+    except ValueError as e:
+        # 必要なカラムがない場合など
+        print(f"Error: {e}")
         return
 
     # 記事ごとのQRコードを生成
-    for index, row in df.iterrows():
-        filename = row["filename"]
-        link = row["link"]
-
-        if pd.isna(link) or link.strip() == "" or link == "No Link":
-            print(f"Skipping {filename} (no valid link)")
-            continue
-
-        # QRコードを作成
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(link)
-        qr.make(fit=True)
-
-        # QRコード画像を生成
-        img = qr.make_image(fill="black", back_color="white")
-
-        # `.md` 拡張子を除去し、安全なファイル名を生成
-        base_filename = os.path.splitext(filename)[0]
-        file_path = os.path.join(output_dir, f"{base_filename}.png")
-
-        # 画像を保存
-        img.save(file_path)
-        print(f"Saved QR Code: {file_path}")
-
-    print("QRコードの生成が完了しました。")
+    with Progress("generate_qr_codes", total=len(articles)) as progress:
+        for article in articles:
+            filename = article.filename
+            link = article.link
+
+            if not link or link.strip() == "" or link == "No Link":
+                # リンクのない記事 (サイト情報など) はスキップ
+                progress.advance(item=filename, skipped=1)
+                continue
+            if not article.converted:
+                # 選択条件で変換しなかった記事は本に入らない
+                progress.advance(skipped=1)
+                continue
+
+            # QRコードを作成
+            qr = qrcode.QRCode(
+                version=1,
+                error_correction=qrcode.constants.ERROR_CORRECT_L,
+                box_size=10,
+                border=4,
+            )
+            qr.add_data(link)
+            qr.make(fit=True)
+
+            # QRコード画像を生成
+            img = qr.make_image(fill="black", back_color="white")
+
+            # `.md` 拡張子を除去し、安全なファイル名を生成
+            base_filename = os.path.splitext(filename)[0]
+            file_path = os.path.join(output_dir, f"{base_filename}.png")
+
+            # 画像を保存
+            img.save(file_path)
+            progress.advance(item=file_path)
 
 def setup_argument_parser():
     """ コマンドライン引数を設定 """
     parser = argparse.ArgumentParser(description="Generate QR codes from a CSV file containing article URLs.")
     
     parser.add_argument(
-        "--csv",
+        "--articles", "--csv",
+        dest="articles",
         type=str,
-        default="articles/articles.csv",
-        help="Path to the CSV file containing article URLs (default: articles/articles.csv)"
+        default="articles/articles.catalog",
+        help="Path to the article catalog or CSV file containing article URLs (default: articles/articles.catalog)"
     )
     parser.add_argument(
         "--output-dir",
@@ -72,14 +78,16 @@ def setup_argument_parser():
         default="qrcodes",
         help="Directory where QR codes will be saved (default: qrcodes)"
     )
+    add_progress_arguments(parser)
 
     return parser
 
-def main():
+def main(argv=None):
     parser = setup_argument_parser()
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    configure_progress(args.quiet, args.progress_events)
 
-    generate_qr_codes(args.csv, args.output_dir)
+    generate_qr_codes(args.articles, args.output_dir)
 
 if __name__ == "__main__":
     main()
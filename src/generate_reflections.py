@@ -1,75 +1,203 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+"""
+記事カタログからリフレクション (振り返り) の雛形を生成する。
+
+既存のファイルは出力ディレクトリを1回走査して確認し、雛形の展開と書き出しはスレッドプールで並行に行う。
+生成した内容のハッシュを出力ディレクトリの .manifest.json に記録しておき、--refresh では
+手で編集されていない (ハッシュが一致する) ファイルだけ、タイトルと公開日を最新のカタログに合わせて更新する。
+"""
+
 import os
-import csv
+import json
+import hashlib
 import argparse
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from string import Template
-from typing import List, Optional, Set
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from article_catalog import Article, load_articles
+from article_dates import format_japanese_date
+from build_cache import get_build_datetime
+from progress import Progress, add_progress_arguments, configure as configure_progress
+from select_articles import load_article_numbers
+
+# 生成したリフレクションのハッシュと展開に使った値を記録するファイル
+MANIFEST_NAME = ".manifest.json"
+
+class CompiledTemplate:
+    """
+    string.Template を一度だけ解析し、リテラルとプレースホルダの並びとして保持する。
 
-def load_article_numbers(file_path: str) -> Set[str]:
-    if not os.path.exists(file_path):
-        return set()
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return {f"{int(line.strip()):04d}" for line in f if line.strip()}
+    展開結果・エラー (KeyError / ValueError) は Template.substitute と同じ。
+    """
 
-def read_template(template_path: str) -> Template:
+    def __init__(self, template: Template):
+        self.parts: List[Tuple[bool, str]] = []
+        text = template.template
+        position = 0
+        for match in template.pattern.finditer(text):
+            self.parts.append((False, text[position:match.start()]))
+            named = match.group("named") or match.group("braced")
+            if named is not None:
+                self.parts.append((True, named))
+            elif match.group("escaped") is not None:
+                self.parts.append((False, template.delimiter))
+            else:
+                # 不正なプレースホルダは Template と同じ ValueError にする
+                lines = text[:match.start("invalid")].splitlines(keepends=True) or [""]
+                raise ValueError(f"Invalid placeholder in string: line {len(lines)}, col {len(lines[-1]) + 1}")
+            position = match.end()
+        self.parts.append((False, text[position:]))
+
+    def render(self, mapping: Mapping[str, str]) -> str:
+        return "".join(mapping[value] if is_placeholder else value for is_placeholder, value in self.parts)
+
+def read_template(template_path: str) -> CompiledTemplate:
     with open(template_path, 'r', encoding='utf-8') as f:
-        return Template(f.read())
+        return CompiledTemplate(Template(f.read()))
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def load_manifest(output_dir: str) -> Dict[str, Dict[str, str]]:
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(output_dir: str, manifest: Dict[str, Dict[str, str]]) -> None:
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def write_reflection(path: str, content: str) -> None:
+    with open(path, 'w', encoding='utf-8') as rf:
+        rf.write(content)
+
+def refresh_reflection(path: str, template: CompiledTemplate, article: Article, entry: Dict[str, str]) -> Tuple[str, Optional[Dict[str, str]]]:
+    """
+    手で編集されていないリフレクションを最新のタイトル・公開日で展開し直す。
+
+    Returns:
+        (結果, 新しいマニフェストのエントリ)。結果は "updated" / "unchanged" / "edited"
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        current = f.read()
+    if content_hash(current) != entry.get("sha256"):
+        return "edited", None
+
+    # 日付 (雛形を作った日) は最初に生成したときの値を使う
+    values = {"date": entry["date"], "title": article.title, "pub_date": article.pub_date_text}
+    content = template.render(values)
+    if content == current:
+        return "unchanged", entry
+    write_reflection(path, content)
+    return "updated", dict(values, sha256=content_hash(content))
 
 def generate_reflection_template(
-    articles_csv: str, 
+    articles_file: str,
     output_dir: str,
     template_path: str,
     include_list: Optional[str] = None,
-    exclude_list: Optional[str] = None
+    exclude_list: Optional[str] = None,
+    refresh: bool = False,
+    jobs: Optional[int] = None
 ) -> None:
     os.makedirs(output_dir, exist_ok=True)
-    
+
     include_numbers = load_article_numbers(include_list) if include_list else set()
     exclude_numbers = load_article_numbers(exclude_list) if exclude_list else set()
-    
+
     template = read_template(template_path)
-    current_date = datetime.now().strftime("%Y年%-m月%-d日")
-    
-    with open(articles_csv, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        
-        for row in reader:
-            number = row['number']
-            title = row['title']
-            pub_date = row['pub_date']
-
-            if include_numbers and number not in include_numbers:
-                continue
-            if number in exclude_numbers:
-                continue
-
-            reflection_path = os.path.join(output_dir, f"{number}_reflection.md")
-            if not os.path.exists(reflection_path):
-                with open(reflection_path, 'w', encoding='utf-8') as rf:
-                    content = template.substitute(
-                        date=current_date,
-                        title=title,
-                        pub_date=pub_date
-                    )
-                    rf.write(content)
+    # 読者に見せる日付はローカルのタイムゾーンで (UTC のままだと日本時間の朝9時前は前日になる)
+    current_date = format_japanese_date(get_build_datetime().astimezone())
+
+    with os.scandir(output_dir) as entries:
+        existing = {entry.name for entry in entries if entry.is_file()}
+    manifest = load_manifest(output_dir)
+
+    new_articles = []
+    existing_articles = []
+    for article in load_articles(articles_file):
+        number = article.number_str
+
+        if not article.converted:
+            continue
+        if include_numbers and number not in include_numbers:
+            continue
+        if number in exclude_numbers:
+            continue
+
+        if f"{number}_reflection.md" in existing:
+            existing_articles.append(article)
+        else:
+            new_articles.append(article)
+
+    def create(article: Article) -> Dict[str, str]:
+        values = {"date": current_date, "title": article.title, "pub_date": article.pub_date_text}
+        content = template.render(values)
+        write_reflection(os.path.join(output_dir, f"{article.number_str}_reflection.md"), content)
+        return dict(values, sha256=content_hash(content))
+
+    def update(article: Article) -> Tuple[str, Optional[Dict[str, str]]]:
+        entry = manifest.get(article.number_str)
+        if entry is None:
+            # マニフェスト導入前のファイルは編集済みかどうか判断できないので変更しない
+            return "unknown", None
+        return refresh_reflection(os.path.join(output_dir, f"{article.number_str}_reflection.md"), template, article, entry)
+
+    counts = {"created": 0, "updated": 0, "unchanged": 0, "edited": 0, "unknown": 0}
+    total = len(new_articles) + (len(existing_articles) if refresh else 0)
+    with ThreadPoolExecutor(max_workers=jobs) as executor, \
+            Progress("generate_reflections", total=total) as progress:
+        for article, entry in zip(new_articles, executor.map(create, new_articles)):
+            manifest[article.number_str] = entry
+            counts["created"] += 1
+            progress.advance(item=article.number_str)
+
+        if refresh:
+            for article, (result, entry) in zip(existing_articles, executor.map(update, existing_articles)):
+                if entry is not None:
+                    manifest[article.number_str] = entry
+                counts[result] += 1
+                progress.advance(item=article.number_str)
+
+    save_manifest(output_dir, manifest)
+
+    if refresh:
+        print(f"リフレクション: 新規 {counts['created']} 件、更新 {counts['updated']} 件、変更なし {counts['unchanged']} 件、"
+              f"編集済みのため保持 {counts['edited']} 件、記録なしのため保持 {counts['unknown']} 件")
+    elif counts["created"]:
+        print(f"リフレクション: 新規 {counts['created']} 件")
 
 def setup_argument_parser():
-    parser = argparse.ArgumentParser(description="Generate reflection markdown templates from articles.csv")
-   
+    parser = argparse.ArgumentParser(description="Generate reflection markdown templates from the article catalog")
+
     # Required arguments
-    parser.add_argument("articles_csv", help="Path to articles.csv")
+    parser.add_argument("articles_file", help="Path to articles.catalog (or articles.csv)")
     parser.add_argument("--template", required=True, help="Path to template file")
-   
-    # Output configuration 
+
+    # Output configuration
     output_group = parser.add_argument_group('output configuration')
     output_group.add_argument(
-        "--output-dir", 
+        "--output-dir",
         default="reflections",
         help="Output directory for reflection files"
     )
+    output_group.add_argument(
+        "--refresh", action="store_true",
+        help="Re-render title and pub_date in existing reflections that have not been edited by hand"
+    )
+    output_group.add_argument(
+        "--jobs", type=int,
+        default=None,
+        help="Number of worker threads (default: Python's ThreadPoolExecutor default)"
+    )
 
     # Article filtering
     filter_group = parser.add_argument_group('article filtering')
@@ -78,24 +206,27 @@ def setup_argument_parser():
         help="Path to file containing article numbers to include"
     )
     filter_group.add_argument(
-        "--exclude-file", 
+        "--exclude-file",
         help="Path to file containing article numbers to exclude"
     )
+    add_progress_arguments(parser)
 
     return parser
 
-def main():
+def main(argv=None):
     parser = setup_argument_parser()
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    configure_progress(args.quiet, args.progress_events)
 
     generate_reflection_template(
-        articles_csv=args.articles_csv,
+        articles_file=args.articles_file,
         output_dir=args.output_dir,
         template_path=args.template,
         include_list=args.include_file,
-        exclude_list=args.exclude_file
+        exclude_list=args.exclude_file,
+        refresh=args.refresh,
+        jobs=args.jobs
     )
 
 if __name__ == "__main__":
     main()
-
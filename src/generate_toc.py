@@ -10,11 +10,13 @@ Includes 'はじめに' and 'あとがき' sections in the TOC.
 import re
 import sys
 import argparse
-from typing import List, Tuple, Union
+from typing import List, Sequence, Tuple, Union
 import unicodedata
 from pathlib import Path
 from PyPDF2 import PdfReader
 
+from progress import Progress, add_progress_arguments, configure as configure_progress
+
 # Constants for Japanese text patterns
 PUBLICATION_DATE = "公開日"
 TITLE_PATTERN = re.compile(r'^\[(\d+)\] (.+)')
@@ -24,6 +26,16 @@ CONCLUSION_PATTERN = re.compile(r'^あとがき$')
 # パターンでページ番号を検出（ページ番号が単独であることを前提）
 PAGE_NUMBER_PATTERN = re.compile(r'^\d+$')
 
+# generate_toc_markdown が出力する目次エントリ
+TOC_ENTRY_PATTERN = re.compile(
+    r'<div class="toc-entry">\s*'
+    r'<span class="toc-(?:number">(?P<number>[^<]*)\.|special">)</span>\s*'
+    r'<span class="toc-text">(?P<title>.*?)</span>\s*'
+    r'<span class="toc-page"><a href="#(?P<anchor>[^"]*)">(?P<page>\d+)</a></span>\s*'
+    r'</div>',
+    re.DOTALL
+)
+
 def extract_toc_from_pdf(pdf_path: Path) -> List[Tuple[Union[str, int], str, int]]:
     """
     Extract article numbers, titles and page numbers from PDF.
@@ -36,55 +48,57 @@ def extract_toc_from_pdf(pdf_path: Path) -> List[Tuple[Union[str, int], str, int
     reader = PdfReader(str(pdf_path))
     toc = []
 
-    for page_num, page in enumerate(reader.pages, start=1):
-        text = page.extract_text()
-        if not text:
-            continue
+    with Progress("generate_toc", total=len(reader.pages), unit="ページ") as progress:
+        for page_num, page in enumerate(reader.pages, start=1):
+            progress.advance()
+            text = page.extract_text()
+            if not text:
+                continue
             
-        # テキストを正規化し、行に分割
-        lines = [
-            unicodedata.normalize("NFKC", line.strip()) 
-            for line in text.splitlines() 
-            if line.strip()
-        ]
-
-        # 前処理: ページ番号のみの行を除去（フッターのページ番号による影響を排除）
-        cleaned_lines = []
-        for line in lines:
-            if not PAGE_NUMBER_PATTERN.match(line):
-                # ページ番号で始まる行の場合、ページ番号を削除
-                if re.match(r'^\d+\s*', line):
-                    line = re.sub(r'^\d+\s*', '', line)
-                cleaned_lines.append(line)
+            # テキストを正規化し、行に分割
+            lines = [
+                unicodedata.normalize("NFKC", line.strip()) 
+                for line in text.splitlines() 
+                if line.strip()
+            ]
+
+            # 前処理: ページ番号のみの行を除去（フッターのページ番号による影響を排除）
+            cleaned_lines = []
+            for line in lines:
+                if not PAGE_NUMBER_PATTERN.match(line):
+                    # ページ番号で始まる行の場合、ページ番号を削除
+                    if re.match(r'^\d+\s*', line):
+                        line = re.sub(r'^\d+\s*', '', line)
+                    cleaned_lines.append(line)
         
-        lines = cleaned_lines
-
-        for idx, line in enumerate(lines):
-            # 通常の記事タイトルを検索
-            match = TITLE_PATTERN.match(line)
-            if match:
-                article_num, title_text = match.groups()
-                title = title_text.strip()
-                found_date = False
+            lines = cleaned_lines
+
+            for idx, line in enumerate(lines):
+                # 通常の記事タイトルを検索
+                match = TITLE_PATTERN.match(line)
+                if match:
+                    article_num, title_text = match.groups()
+                    title = title_text.strip()
+                    found_date = False
                 
-                for j in range(idx + 1, min(idx + 3, len(lines))):
-                    next_line = unicodedata.normalize("NFKC", lines[j])
-                    if PUBLICATION_DATE in next_line:
-                        found_date = True
-                        toc.append((article_num, title, page_num))
-                        break
-                if not found_date and idx < len(lines) - 1:
-                    title += " " + lines[idx + 1]
+                    for j in range(idx + 1, min(idx + 3, len(lines))):
+                        next_line = unicodedata.normalize("NFKC", lines[j])
+                        if PUBLICATION_DATE in next_line:
+                            found_date = True
+                            toc.append((article_num, title, page_num))
+                            break
+                    if not found_date and idx < len(lines) - 1:
+                        title += " " + lines[idx + 1]
             
-            # はじめにを検索
-            elif INTRO_PATTERN.match(line):
-                # 「はじめに」というテキストがある行を検出
-                toc.append(("intro", line, page_num))
+                # はじめにを検索
+                elif INTRO_PATTERN.match(line):
+                    # 「はじめに」というテキストがある行を検出
+                    toc.append(("intro", line, page_num))
             
-            # あとがきを検索
-            elif CONCLUSION_PATTERN.match(line):
-                # 「あとがき」というテキストがある行を検出
-                toc.append(("conclusion", line, page_num))
+                # あとがきを検索
+                elif CONCLUSION_PATTERN.match(line):
+                    # 「あとがき」というテキストがある行を検出
+                    toc.append(("conclusion", line, page_num))
 
     return toc
 
@@ -133,6 +147,75 @@ def generate_toc_markdown(toc: List[Tuple[Union[str, int], str, int]]) -> str:
 
     return "\n".join(toc_lines)
 
+def parse_toc_markdown(toc_path: Path) -> List[Tuple[str, str, int]]:
+    """
+    Read back the TOC markdown written by generate_toc_markdown.
+
+    Returns:
+        List of tuples containing (section_id, title, page_number), in the same
+        form as extract_toc_from_pdf.
+    """
+    toc_md = Path(toc_path).read_text(encoding="utf-8")
+    toc = []
+    for match in TOC_ENTRY_PATTERN.finditer(toc_md):
+        if match.group("number") is not None:
+            section_id = match.group("number")
+        else:
+            section_id = match.group("anchor")
+            if section_id == "introduction":
+                section_id = "intro"
+        toc.append((section_id, match.group("title"), int(match.group("page"))))
+    return toc
+
+def normalize_toc_title(title: str) -> str:
+    """PDFから抽出したタイトルと記事のタイトルを比較できるよう、空白を除いて正規化する"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", title))
+
+def titles_match(toc_title: str, article_title: str) -> bool:
+    """目次のタイトルは1行目だけ、または次の行まで含むことがあるので、前方一致で比べる"""
+    toc_key = normalize_toc_title(toc_title)
+    article_key = normalize_toc_title(article_title)
+    return bool(toc_key) and (article_key.startswith(toc_key) or toc_key.startswith(article_key))
+
+def match_toc_articles(
+    toc: Sequence[Tuple[str, str, int]],
+    articles: Sequence[Tuple[str, str]]
+) -> List[Tuple[str, str, int]]:
+    """
+    目次の記事の項目を、結合順の記事 (記事番号, タイトル) に対応付ける。
+
+    目次の [N] は CSS のカウンタが振った結合順の位置で、記事番号ではない
+    (include/exclude で記事を選んだ場合や 0000 の記事がある場合は一致しない)。
+    そのため項目を先頭から順に記事へ対応付け、タイトルが合わなければ後ろの記事から
+    タイトルの一致するものを探す (PDFからの抽出で漏れた項目があってもずれない)。
+
+    Returns:
+        List of tuples containing (key, title, page_number)。key は記事番号 (4桁) か
+        "intro" / "conclusion"。対応する記事がない項目は含まない。
+    """
+    matched = []
+    position = 0
+    mismatched = 0
+    for section_id, title, page in toc:
+        if section_id in ("intro", "conclusion"):
+            matched.append((section_id, title, page))
+            continue
+        if position >= len(articles):
+            print(f"Warning: 目次の項目 [{section_id}] {title} に対応する記事がありません。スキップします。")
+            continue
+        found = next((index for index in range(position, len(articles))
+                      if titles_match(title, articles[index][1])), None)
+        if found is None:
+            # タイトルが一致しなければ結合順で対応付ける
+            found = position
+            mismatched += 1
+        number = articles[found][0]
+        matched.append((number, title, page))
+        position = found + 1
+    if mismatched:
+        print(f"Warning: 目次の {mismatched} 件の項目が記事のタイトルと一致しませんでした。結合順で対応付けています。")
+    return matched
+
 def setup_argument_parser():
     """Setup argument parser for command-line usage."""
     parser = argparse.ArgumentParser(description="Extract table of contents from PDF and generate styled markdown output.")
@@ -146,12 +229,14 @@ def setup_argument_parser():
         default=None,
         help="Path to the output markdown file."
     )
+    add_progress_arguments(parser)
     return parser
 
-def main():
+def main(argv=None):
     """Process PDF and generate styled TOC markdown file."""
     parser = setup_argument_parser()
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    configure_progress(args.quiet, args.progress_events)
 
     try:
         pdf_path = args.pdf_file
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+結合済みの Markdown (mainmatter.md など) を md-to-pdf に渡す前に検査する。
+
+- リンク・画像のローカルパスが存在するか
+- ページ内リンク (#...) の参照先があるか
+- HTML の id が重複していないか
+- コードフェンスが閉じているか
+
+ファイルを記事の区切り (<div id="article-NNNN">) ごとに分割してプロセスプールで並行に解析し、
+参照されたパスの存在確認はスレッドプールでまとめて行う。問題があれば終了コード 1 で終了する。
+"""
+
+import os
+import re
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Set, Tuple
+from urllib.parse import unquote, urlsplit
+
+# merge_md_files.py が記事の先頭に挿入するアンカー
+ARTICLE_ANCHOR_PATTERN = re.compile(r'^<div id="article-\d{4}"></div>')
+
+FENCE_PATTERN = re.compile(r"^ {0,3}(`{3,}|~{3,})(.*)$")
+INLINE_CODE_PATTERN = re.compile(r"(`+).+?\1")
+HEADING_PATTERN = re.compile(r"^ {0,3}#{1,6}\s+(.*?)\s*#*\s*$")
+
+# [text](target "title") / ![alt](target)
+MD_LINK_PATTERN = re.compile(r"(!?)\[[^\]]*\]\(\s*(<[^>]*>|[^)\s]+)(?:\s+[\"'(][^)]*)?\)")
+HTML_ATTR_PATTERN = re.compile(r"<(img|a|source)\b[^>]*?\b(src|href)\s*=\s*[\"']([^\"']*)[\"']", re.IGNORECASE)
+HTML_ID_PATTERN = re.compile(r"<[A-Za-z][^>]*?\bid\s*=\s*[\"']([^\"']+)[\"']")
+
+# 見出しのアンカー名を作るときに取り除く記号 (marked の slugger と同じ)
+SLUG_STRIP_PATTERN = re.compile(r"[\u2000-\u206F\u2E00-\u2E7F\\'!\"#$%&()*+,./:;<=>?@\[\]^`{|}~]")
+
+class Issue(NamedTuple):
+    line: int
+    message: str
+
+class ChunkResult(NamedTuple):
+    """1チャンク分の解析結果 (行番号はファイル全体での番号)"""
+    issues: List[Issue]
+    ids: List[Tuple[str, int]]
+    headings: List[str]
+    anchor_refs: List[Tuple[str, int]]
+    path_refs: List[Tuple[str, int, str]]
+
+def heading_slug(text: str) -> str:
+    text = re.sub(r"<[^>]+>", "", text).strip().lower()
+    return re.sub(r"\s", "-", SLUG_STRIP_PATTERN.sub("", text))
+
+def split_chunks(lines: List[str]) -> List[Tuple[int, List[str]]]:
+    """記事アンカーの位置で (開始行番号, 行のリスト) に分割する"""
+    chunks = []
+    start = 0
+    for i, line in enumerate(lines):
+        if i > start and ARTICLE_ANCHOR_PATTERN.match(line):
+            chunks.append((start + 1, lines[start:i]))
+            start = i
+    chunks.append((start + 1, lines[start:]))
+    return chunks
+
+def skip_front_matter(lines: List[str]) -> int:
+    """先頭の YAML (pdf_options) の行数を返す"""
+    if not lines or lines[0].rstrip() != "---":
+        return 0
+    for i in range(1, len(lines)):
+        if lines[i].rstrip() == "---":
+            return i + 1
+    return 0
+
+def classify_target(target: str, line_number: int, kind: str, anchor_refs, path_refs) -> None:
+    if target.startswith("<") and target.endswith(">"):
+        target = target[1:-1]
+    if not target:
+        return
+    if target.startswith("#"):
+        anchor_refs.append((unquote(target[1:]), line_number))
+        return
+    parts = urlsplit(target)
+    # http(s)・mailto・data などの外部参照は対象外
+    if parts.scheme or parts.netloc:
+        return
+    if parts.path:
+        path_refs.append((unquote(parts.path), line_number, kind))
+
+def lint_chunk(first_line: int, lines: List[str]) -> ChunkResult:
+    issues = []
+    ids = []
+    headings = []
+    anchor_refs = []
+    path_refs = []
+
+    fence = None
+    fence_line = 0
+    for offset, line in enumerate(lines):
+        line_number = first_line + offset
+        match = FENCE_PATTERN.match(line)
+        if fence:
+            # 閉じフェンスは開きと同じ文字で同じ長さ以上、後ろに情報文字列がないもの
+            if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence) and not match.group(2).strip():
+                fence = None
+            continue
+        if match and not (match.group(1)[0] == "`" and "`" in match.group(2)):
+            fence = match.group(1)
+            fence_line = line_number
+            continue
+
+        text = INLINE_CODE_PATTERN.sub("", line)
+        heading = HEADING_PATTERN.match(text)
+        if heading:
+            headings.append(heading_slug(heading.group(1)))
+        for element_id in HTML_ID_PATTERN.findall(text):
+            ids.append((element_id, line_number))
+        for bang, target in MD_LINK_PATTERN.findall(text):
+            classify_target(target, line_number, "image" if bang else "link", anchor_refs, path_refs)
+        for tag, _, target in HTML_ATTR_PATTERN.findall(text):
+            classify_target(target, line_number, "link" if tag.lower() == "a" else "image", anchor_refs, path_refs)
+
+    if fence:
+        issues.append(Issue(fence_line, f"コードフェンス {fence} が閉じられていません"))
+    return ChunkResult(issues, ids, headings, anchor_refs, path_refs)
+
+def _lint_chunk(chunk: Tuple[int, List[str]]) -> ChunkResult:
+    return lint_chunk(*chunk)
+
+def lint_markdown(md_path: str, base_dir: str = None, jobs: int = None) -> List[Issue]:
+    """
+    Markdown ファイルを検査し、見つかった問題を行番号順に返す。
+
+    Args:
+        md_path (str): 検査するファイル
+        base_dir (str): 相対パスの基準ディレクトリ (既定は md_path のディレクトリ)
+        jobs (int): 並列数 (既定は CPU 数)
+    """
+    with open(md_path, "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    base_dir = base_dir or os.path.dirname(os.path.abspath(md_path))
+
+    front_matter = skip_front_matter(lines)
+    chunks = [(first_line + front_matter, chunk_lines)
+              for first_line, chunk_lines in split_chunks(lines[front_matter:])]
+
+    issues: List[Issue] = []
+    id_lines: Dict[str, List[int]] = {}
+    anchors: Set[str] = set()
+    anchor_refs: List[Tuple[str, int]] = []
+    path_refs: List[Tuple[str, int, str]] = []
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for result in executor.map(_lint_chunk, chunks, chunksize=max(1, len(chunks) // ((jobs or os.cpu_count() or 1) * 4))):
+            issues.extend(result.issues)
+            for element_id, line_number in result.ids:
+                id_lines.setdefault(element_id, []).append(line_number)
+            anchors.update(result.headings)
+            anchor_refs.extend(result.anchor_refs)
+            path_refs.extend(result.path_refs)
+
+    for element_id, line_numbers in id_lines.items():
+        anchors.add(element_id)
+        for line_number in line_numbers[1:]:
+            issues.append(Issue(line_number, f"id \"{element_id}\" が重複しています (最初の定義: {line_numbers[0]} 行目)"))
+
+    for anchor, line_number in anchor_refs:
+        if anchor not in anchors:
+            issues.append(Issue(line_number, f"リンク先のアンカー #{anchor} が見つかりません"))
+
+    # 同じファイルへの参照 (QRコードや共通画像) は1回だけ確認する
+    unique_paths = sorted({os.path.normpath(os.path.join(base_dir, path)) for path, _, _ in path_refs})
+    with ThreadPoolExecutor(max_workers=jobs or min(32, (os.cpu_count() or 1) * 4)) as executor:
+        existing = {path for path, exists in zip(unique_paths, executor.map(os.path.exists, unique_paths)) if exists}
+    for path, line_number, kind in path_refs:
+        if os.path.normpath(os.path.join(base_dir, path)) not in existing:
+            label = "画像" if kind == "image" else "リンク先"
+            issues.append(Issue(line_number, f"{label}のファイル {path} が見つかりません"))
+
+    return sorted(issues)
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Check merged markdown for broken links, missing images, duplicate anchors and unbalanced code fences.")
+
+    parser.add_argument(
+        "files", nargs="+",
+        help="Markdown files to check"
+    )
+    parser.add_argument(
+        "--base-dir", type=str,
+        default=None,
+        help="Directory relative paths are resolved against (default: directory of each file)"
+    )
+    parser.add_argument(
+        "--jobs", type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)"
+    )
+    parser.add_argument(
+        "--max-issues", type=int,
+        default=50,
+        help="Maximum number of issues to print per file (default: 50)"
+    )
+
+    return parser
+
+def main(argv=None):
+    parser = setup_argument_parser()
+    args = parser.parse_args(argv)
+
+    failed = False
+    for md_path in args.files:
+        if not os.path.exists(md_path):
+            print(f"Error: {md_path} が見つかりません。")
+            failed = True
+            continue
+
+        issues = lint_markdown(md_path, base_dir=args.base_dir, jobs=args.jobs)
+        for issue in issues[:args.max_issues]:
+            print(f"{md_path}:{issue.line}: {issue.message}")
+        if len(issues) > args.max_issues:
+            print(f"... 他 {len(issues) - args.max_issues} 件")
+        if issues:
+            print(f"Error: {md_path} に {len(issues)} 件の問題があります。")
+            failed = True
+        else:
+            print(f"{md_path}: OK")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,14 @@
 
 import os
 import re
+import mmap
+import shutil
 import argparse
 import yaml
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple
+
+from article_catalog import load_articles
+from select_articles import load_article_numbers
 
 def get_relative_path(source_path, target_path):
     if os.path.basename(source_path) != '':
@@ -15,6 +20,195 @@ def get_relative_path(source_path, target_path):
     rel_path = os.path.relpath(target_path, source_dir)
     return rel_path
 
+# 記事ファイル名 (4桁の記事番号 + "_" で始まる .md)
+ARTICLE_FILE_PATTERN = re.compile(r"^(\d{4})_.*\.md$")
+
+# wxr_to_md.py が記事ディレクトリに出力する記事一覧 (優先順)
+CATALOG_FILENAMES = ("articles.catalog", "articles.csv")
+
+def catalog_filenames(articles_dir: str) -> Dict[str, str]:
+    """記事ディレクトリの記事一覧から 記事番号 → ファイル名 を読む (記事一覧がなければ空)"""
+    for name in CATALOG_FILENAMES:
+        path = os.path.join(articles_dir, name)
+        if os.path.exists(path):
+            try:
+                return {article.number_str: article.filename for article in load_articles(path) if article.filename}
+            except (OSError, ValueError) as e:
+                print(f"Warning: {path} を読み込めませんでした: {e}")
+    return {}
+
+def index_article_files(articles_dir: str) -> Dict[str, str]:
+    """
+    記事ディレクトリを1回だけ走査し、記事番号 → ファイルパス の索引を作る。
+
+    同じ番号のファイルが複数ある場合 (タイトル変更で古いファイルが残った場合など) は、
+    記事一覧 (articles.catalog) に記録されたファイルを、記録がなければ更新日時が新しいものを使い、
+    使わなかったファイルを警告する。
+    """
+    index = {}
+    # 2つ目以降のファイルがあった番号 → そのファイルパス (重複はまれなので別に持つ)
+    duplicates: Dict[str, List[str]] = {}
+    with os.scandir(articles_dir) as entries:
+        for entry in entries:
+            match = ARTICLE_FILE_PATTERN.match(entry.name)
+            if not match or not entry.is_file():
+                continue
+            article_number = match.group(1)
+            if article_number in index:
+                duplicates.setdefault(article_number, []).append(entry.path)
+            else:
+                index[article_number] = entry.path
+
+    recorded = catalog_filenames(articles_dir) if duplicates else {}
+    for article_number, paths in duplicates.items():
+        paths.append(index[article_number])
+        chosen = next((path for path in paths if os.path.basename(path) == recorded.get(article_number)), None)
+        if chosen is None:
+            chosen = max(paths, key=lambda path: (os.stat(path).st_mtime_ns, path))
+        ignored = ", ".join(sorted(os.path.basename(path) for path in paths if path != chosen))
+        print(f"Warning: 記事番号 {article_number} のファイルが複数あります。"
+              f"{os.path.basename(chosen)} を使い、{ignored} は無視します。")
+        index[article_number] = chosen
+    return index
+
+def select_article_files(
+    index: Dict[str, str],
+    include_set: Set[str],
+    exclude_set: Set[str]
+) -> List[Tuple[str, str]]:
+    """include/exclude を適用し、記事番号順に (記事番号, ファイルパス) を返す"""
+    numbers = index.keys() & include_set if include_set else index.keys()
+    return [(number, index[number]) for number in sorted(numbers - exclude_set)]
+
+def read_title(md_path: str) -> str:
+    """記事の Markdown の最初の見出し (# タイトル)"""
+    with open(md_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("# "):
+                return line[2:].strip()
+    return os.path.basename(md_path)
+
+# 出力ファイルからの相対パスに置き換える画像などのパス (作業ディレクトリ = プロジェクトのルートからのパス)
+RELATIVE_PATH_TARGETS = ("./input/", "./images/", "./qrcodes/")
+
+def relative_path_targets(asset_dirs: Optional[List[str]] = None) -> List[str]:
+    """
+    相対パスに置き換える "./<ディレクトリ>/" の一覧。
+
+    既定の input/・images/・qrcodes/ に加えて、asset_dirs (prefetch_images.py の --cache-dir など、
+    作業ディレクトリからのパス) を置き換え対象にする。
+    """
+    targets = list(RELATIVE_PATH_TARGETS)
+    for asset_dir in asset_dirs or []:
+        if os.path.isabs(asset_dir):
+            asset_dir = os.path.relpath(asset_dir)
+        target = "./" + os.path.normpath(asset_dir).replace(os.sep, "/") + "/"
+        if target not in targets:
+            targets.append(target)
+    return targets
+
+# 置換が必要なファイルを書き出すときの窓の大きさ (行の途中では区切らない)
+REWRITE_WINDOW_SIZE = 1024 * 1024
+
+class MarkdownStreamWriter:
+    """
+    結合結果を出力ファイルへ逐次書き出す。
+
+    入力ファイルは mmap で開き、書き換えが必要な箇所 (相対パス、QRコードの挿入位置) を含む
+    範囲だけを置き換えて、それ以外の範囲は memoryview のスライスとしてそのまま出力する。
+    書き換えが不要なファイルは os.sendfile (使えない環境では shutil.copyfileobj) で直接コピーする。
+    どちらの場合もファイル全体を Python の文字列として読み込まない。
+    """
+
+    def __init__(self, output, output_file: str, asset_dirs: Optional[List[str]] = None):
+        self.output = output
+        self.has_content = False
+        self.rewrites = [
+            (f"({target_path}".encode("utf-8"),
+             f"({get_relative_path(output_file, target_path)}/".encode("utf-8"))
+            for target_path in relative_path_targets(asset_dirs)
+        ]
+
+    def rewrite(self, data: bytes) -> bytes:
+        for old, new in self.rewrites:
+            data = data.replace(old, new)
+        return data
+
+    def needs_rewrite(self, mm, start: int, end: int) -> bool:
+        return any(mm.find(old, start, end) != -1 for old, _ in self.rewrites)
+
+    def write_text(self, text: str) -> None:
+        if text:
+            self.output.write(self.rewrite(text.encode("utf-8")))
+            self.has_content = True
+
+    def _write_windows(self, mm, size: int, insert: Optional[Tuple[bytes, bytes]]) -> None:
+        """
+        mmap を行単位で区切った窓ごとに書き出す。
+
+        置換対象がない窓は memoryview のスライスのまま出力し、置換対象がある窓だけを
+        bytes にコピーして置き換える (コピーは窓の大きさに収まる)。
+        置換対象のパスと目印は改行を含まないので、窓の境界をまたぐことはない。
+        """
+        # memoryview は mmap を閉じる前に解放する必要がある
+        with memoryview(mm) as view:
+            start = 0
+            while start < size:
+                end = min(start + REWRITE_WINDOW_SIZE, size)
+                if end < size:
+                    newline = mm.find(b"\n", end)
+                    end = size if newline == -1 else newline + 1
+
+                has_marker = insert is not None and mm.find(insert[0], start, end) != -1
+                if not has_marker and not self.needs_rewrite(mm, start, end):
+                    self.output.write(view[start:end])
+                else:
+                    data = bytes(view[start:end])
+                    if has_marker:
+                        data = data.replace(insert[0], insert[1] + insert[0], 1)
+                        insert = None
+                    self.output.write(self.rewrite(data))
+                start = end
+
+    def write_file(self, path: str, insert: Optional[Tuple[str, str]] = None) -> None:
+        """
+        ファイルの内容を書き出す (必要な箇所のみ相対パスの置換と insert の挿入を行う)。
+
+        Args:
+            path (str): 入力ファイル
+            insert (Tuple[str, str]): (目印, 挿入する文字列)。最初の目印の直前に挿入する
+        """
+        insert_bytes = (insert[0].encode("utf-8"), insert[1].encode("utf-8")) if insert else None
+
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                # 空ファイルは mmap できない
+                return
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if insert_bytes and mm.find(insert_bytes[0]) == -1:
+                    insert_bytes = None
+                if insert_bytes or self.needs_rewrite(mm, 0, size):
+                    self._write_windows(mm, size, insert_bytes)
+                    self.has_content = True
+                    return
+
+            self.output.flush()
+            try:
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(self.output.fileno(), f.fileno(), offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                # sendfile で進んだファイル位置をバッファ側に反映させる
+                self.output.seek(0, os.SEEK_END)
+            except (AttributeError, OSError):
+                f.seek(0)
+                shutil.copyfileobj(f, self.output)
+        self.has_content = True
+
 def merge_md_files(
     output_file: str,
     qr_dir: Optional[str] = None,
@@ -28,7 +222,8 @@ def merge_md_files(
     articles_dir: Optional[str] = None,
     conclusion: Optional[str] = None,
     reflections_dir: Optional[str] = None,
-    pdf_options: Optional[str] = None
+    pdf_options: Optional[str] = None,
+    asset_dirs: Optional[List[str]] = None
 ) -> None:
     exclude_set = set(f"{int(num):04}" for num in (exclude_numbers or []))
     include_set = set(f"{int(num):04}" for num in (include_numbers or []))
@@ -38,12 +233,13 @@ def merge_md_files(
         with open(separator) as f:
             sep = f"\n\n{f.read().strip()}\n\n"
 
-    with open(output_file, "w", encoding="utf-8") as output:
-        content = ""
+    with open(output_file, "wb") as output:
+        writer = MarkdownStreamWriter(output, output_file, asset_dirs)
+
         if pdf_options:
             with open(pdf_options, 'r', encoding="utf-8") as f:
                 yaml_content = yaml.safe_load(f)
-                content += "---\n"
+                content = "---\n"
                 content += "pdf_options:\n"
                 for key, value in yaml_content.items():
                     if isinstance(value, str) and '\n' in value:
@@ -54,96 +250,76 @@ def merge_md_files(
                     else:
                         content += f'  {key}: {value}\n'
                 content += "---\n\n"
+                writer.write_text(content)
 
         if cover_design:
             if os.path.exists(cover_design):
-                with open(cover_design, "r", encoding="utf-8") as f:
-                    content += f.read()
+                writer.write_file(cover_design)
             else:
                 print(f"Warning: Cover file '{cover_design}' not found. Skipping cover page.\n")
 
         if toc:
             if os.path.exists(toc):
-                with open(toc, "r", encoding="utf-8") as f:
-                    if content:
-                        content += sep 
-                    content += f.read()
+                if writer.has_content:
+                    writer.write_text(sep)
+                writer.write_file(toc)
             else:
                 print(f"Warning: TOC file '{toc}' not found. Skipping TOC.\n")
 
         if introduction:
             if os.path.exists(introduction):
-                with open(introduction, "r", encoding="utf-8") as f:
-                    if content:
-                        content += sep 
-                    content += f.read()
+                if writer.has_content:
+                    writer.write_text(sep)
+                writer.write_file(introduction)
             else:
                 print(f"Warning: Introduction file '{introduction}' not found. Skipping introduction.\n")
 
         if articles_dir:
-            md_files = sorted(
-                [f for f in os.listdir(articles_dir) if f.endswith(".md")],
-                key=lambda x: re.match(r"^\d{4}", x).group() if re.match(r"^\d{4}", x) else ""
-            )
-
-            if content:
-                content += sep 
-
-            for md_file in md_files:
-                match = re.match(r"^(\d{4})_", md_file)
-                if match:
-                    article_number = match.group(1)
-                    should_include = (not include_set or article_number in include_set)
-                    should_exclude = (article_number in exclude_set)
-
-                    if should_include and not should_exclude:
-                        file_path = os.path.join(articles_dir, md_file)
-                        with open(file_path, "r", encoding="utf-8") as input_file:
-                            content += f'<div id="article-{article_number}"></div>\n\n'
-                            content += input_file.read()
-
-                        if qr_dir:
-                            qr_code_path = os.path.join(qr_dir, f"{md_file.replace('.md', '.png')}")
-                            if qr_dir and os.path.exists(qr_code_path):
-                                qr_code_md = f"\n![]({qr_code_path})\n"
-                                content = content.replace("**公開日**:", qr_code_md + "**公開日**:", 1)
-
-                        if reflections_dir:
-                            reflection_path = os.path.join(reflections_dir, f"{article_number}_reflection.md")
-                            if os.path.exists(reflection_path):
-                                with open(reflection_path, "r", encoding="utf-8") as ref_file:
-                                    content += "\n\n"
-                                    content += ref_file.read()
-
-                        if md_file != md_files[-1]:
-                            content += "\n\n"
-                            content += sep
-                            content += "\n\n"
+            # ファイルを開く前に include/exclude で対象記事を確定させる
+            selected = select_article_files(index_article_files(articles_dir), include_set, exclude_set)
+
+            if writer.has_content:
+                writer.write_text(sep)
+
+            for position, (article_number, file_path) in enumerate(selected):
+                if position:
+                    writer.write_text("\n\n")
+                    writer.write_text(sep)
+                    writer.write_text("\n\n")
+
+                writer.write_text(f'<div id="article-{article_number}"></div>\n\n')
+
+                md_file = os.path.basename(file_path)
+                qr_code_path = os.path.join(qr_dir, f"{md_file.replace('.md', '.png')}") if qr_dir else None
+                if qr_code_path and os.path.exists(qr_code_path):
+                    # QRコードは公開日の直前に、出力ファイルからの相対パスで挿入する
+                    qr_link = get_relative_path(output_file, qr_code_path)
+                    writer.write_file(file_path, insert=("**公開日**:", f"\n![]({qr_link})\n"))
+                else:
+                    writer.write_file(file_path)
+
+                if reflections_dir:
+                    reflection_path = os.path.join(reflections_dir, f"{article_number}_reflection.md")
+                    if os.path.exists(reflection_path):
+                        writer.write_text("\n\n")
+                        writer.write_file(reflection_path)
 
         if conclusion:
             if os.path.exists(conclusion):
-                with open(conclusion, "r", encoding="utf-8") as f:
-                    if content:
-                        content += sep 
-                    content += f.read()
+                if writer.has_content:
+                    writer.write_text(sep)
+                writer.write_file(conclusion)
             else:
                 print(f"Warning: Conclusion file '{conclusion}' not found. Skipping conclusion.\n")
 
         if back_cover_design:
             if os.path.exists(back_cover_design):
-                with open(back_cover_design, "r", encoding="utf-8") as f:
-                    if content:
-                        content += sep 
-                    content += f.read()
+                if writer.has_content:
+                    writer.write_text(sep)
+                writer.write_file(back_cover_design)
             else:
                 print(f"Warning: Cover file '{back_cover_design}' not found. Skipping back cover page.\n")
 
-        # Replace relative paths
-        for target_path in "./input/", "./images/", "./qrcodes/":
-            content = content.replace("(" + target_path, "(" + get_relative_path(output_file, target_path) + "/")
-
-        output.write(content)
-
 def setup_argument_parser():
     parser = argparse.ArgumentParser(description="Merge .md files in a directory with optional include/exclude filters.")
     
@@ -220,22 +396,20 @@ def setup_argument_parser():
         default=None,
         help="Directory containing QR code images"
     )
+    structure_group.add_argument(
+        "--asset-dir", type=str, action="append",
+        default=None,
+        help="Extra directory whose ./<dir>/ links are rewritten relative to the output (repeatable)"
+    )
     
     return parser
 
-def main():
+def main(argv=None):
     parser = setup_argument_parser()
-    args = parser.parse_args()
-
-    exclude_numbers = None
-    if args.exclude_file:
-        with open(args.exclude_file) as f:
-            exclude_numbers = [line.strip() for line in f if line.strip()]
+    args = parser.parse_args(argv)
 
-    include_numbers = None
-    if args.include_file:
-        with open(args.include_file) as f:
-            include_numbers = [line.strip() for line in f if line.strip()]
+    exclude_numbers = sorted(load_article_numbers(args.exclude_file)) if args.exclude_file else None
+    include_numbers = sorted(load_article_numbers(args.include_file)) if args.include_file else None
 
     merge_md_files(
         output_file=args.output,
@@ -250,7 +424,8 @@ def main():
         articles_dir=args.articles_dir,
         conclusion=args.conclusion,
         reflections_dir=args.reflections_dir,
-        pdf_options=args.pdf_options
+        pdf_options=args.pdf_options,
+        asset_dirs=args.asset_dir
     )
 
 if __name__ == "__main__":
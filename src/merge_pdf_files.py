@@ -8,6 +8,17 @@ from typing import List, Optional
 import PyPDF2
 from pathlib import Path
 
+from build_cache import get_build_datetime
+
+def pdf_date(dt) -> str:
+    """PDFの日付形式 (D:YYYYMMDDHHmmSS+HH'mm') に変換する"""
+    offset = dt.utcoffset()
+    if offset is None:
+        return dt.strftime("D:%Y%m%d%H%M%S")
+    minutes = int(offset.total_seconds()) // 60
+    sign = "+" if minutes >= 0 else "-"
+    return f"{dt.strftime('D:%Y%m%d%H%M%S')}{sign}{abs(minutes) // 60:02d}'{abs(minutes) % 60:02d}'"
+
 def merge_pdf_files(
     output_file: str,
     cover_design: Optional[str] = None,
@@ -48,6 +59,13 @@ def merge_pdf_files(
         pdf_reader = PyPDF2.PdfReader(str(path))
         for page in pdf_reader.pages:
             pdf_writer.add_page(page)
+
+    # 作成日時は SOURCE_DATE_EPOCH があればその値に固定する (再現可能ビルド)
+    build_date = pdf_date(get_build_datetime())
+    pdf_writer.add_metadata({
+        "/CreationDate": build_date,
+        "/ModDate": build_date,
+    })
     with open(output_file, "wb") as out:
         pdf_writer.write(out)
 
@@ -107,9 +125,9 @@ def setup_argument_parser():
 
     return parser
 
-def main():
+def main(argv=None):
     parser = setup_argument_parser()
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     merge_pdf_files(
         output_file=args.output,
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+merge_pdf_files.py で結合した PDF を後処理してサイズを減らす。
+
+md-to-pdf の各パート (表紙・前付け・本文・裏表紙) はそれぞれ同じ日本語フォントを埋め込むため、
+結合後の PDF には同じフォントが何度も含まれる。ここでは次の処理を行う。
+
+- 内容が同一のフォント (フォントファイル・FontDescriptor・Font 辞書) とストリームを1つにまとめる
+  (バイト列が同一のものだけ。パートごとに使われた文字が違うサブセット (ABCDEF+ の接頭辞が異なる) は
+  まとめられないので、同じフォントのサブセットが複数残った場合はそのバイト数を表示する)
+- 圧縮されていない / 圧縮の弱いストリームを最大圧縮率の Flate で圧縮し直す
+- qpdf があれば、先頭ページを早く表示できるよう線形化 (Web 最適化) する
+"""
+
+import os
+import sys
+import zlib
+import shutil
+import hashlib
+import argparse
+import subprocess
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    StreamObject,
+)
+
+# 重複をまとめてよい辞書の /Type (ページやアノテーションは参照元を持つので対象外)
+DEDUPLICATE_TYPES = ("/Font", "/FontDescriptor", "/ExtGState", "/Encoding")
+
+class Deduplicator:
+    """間接オブジェクトを内容で比較し、同一のものを最小の番号のオブジェクトにまとめる"""
+
+    def __init__(self, reader: PdfReader):
+        self.reader = reader
+        self.objects: Dict[int, object] = {}
+        self.generations: Dict[int, int] = {}
+        for idnum, generation in object_numbers(reader):
+            obj = reader.get_object(IndirectObject(idnum, generation, reader))
+            if obj is not None:
+                self.objects[idnum] = obj
+                self.generations[idnum] = generation
+        # 重複 → 代表のオブジェクト番号
+        self.canonical: Dict[int, int] = {}
+        self._stream_digests: Dict[int, bytes] = {}
+
+    def is_candidate(self, obj) -> bool:
+        if isinstance(obj, (StreamObject, ArrayObject)):
+            return True
+        return isinstance(obj, DictionaryObject) and obj.get("/Type") in DEDUPLICATE_TYPES
+
+    def _key(self, obj) -> bytes:
+        """参照先を代表の番号に置き換えた上での、オブジェクトの内容を表すバイト列"""
+        if isinstance(obj, IndirectObject):
+            return b"R%d" % self.canonical.get(obj.idnum, obj.idnum)
+        if isinstance(obj, DictionaryObject):
+            parts = [b"<<"]
+            for key in sorted(obj.keys()):
+                if key == "/Length":
+                    continue
+                parts.append(key.encode("utf-8"))
+                parts.append(self._key(obj.raw_get(key)))
+            parts.append(b">>")
+            return b" ".join(parts)
+        if isinstance(obj, ArrayObject):
+            return b"[" + b" ".join(self._key(item) for item in obj) + b"]"
+        buffer = BytesIO()
+        obj.write_to_stream(buffer, None)
+        return buffer.getvalue()
+
+    def _candidate_key(self, idnum: int, obj) -> bytes:
+        key = self._key(obj)
+        if isinstance(obj, StreamObject):
+            # フォントファイルは大きいので、データのハッシュは1回だけ計算する
+            if idnum not in self._stream_digests:
+                self._stream_digests[idnum] = hashlib.sha256(obj._data).digest()
+            key += b"stream" + self._stream_digests[idnum]
+        return hashlib.sha256(key).digest()
+
+    def run(self) -> int:
+        """
+        まとめられるものがなくなるまで繰り返す (フォントファイルがまとまると、
+        それを参照する FontDescriptor や Font 辞書も同一になる)。まとめた数を返す。
+        """
+        while True:
+            groups: Dict[bytes, int] = {}
+            merged = 0
+            for idnum, obj in self.objects.items():
+                if idnum in self.canonical or not self.is_candidate(obj):
+                    continue
+                key = self._candidate_key(idnum, obj)
+                if key in groups:
+                    self.canonical[idnum] = groups[key]
+                    merged += 1
+                else:
+                    groups[key] = idnum
+            if not merged:
+                break
+        self._rewrite_references()
+        return len(self.canonical)
+
+    def _replace(self, value):
+        if isinstance(value, IndirectObject) and value.idnum in self.canonical:
+            idnum = self.canonical[value.idnum]
+            return IndirectObject(idnum, self.generations[idnum], self.reader)
+        return value
+
+    def _rewrite_references(self) -> None:
+        containers = list(self.objects.values()) + [self.reader.trailer]
+        stack = [obj for obj in containers if isinstance(obj, (DictionaryObject, ArrayObject))]
+        seen = set()
+        while stack:
+            obj = stack.pop()
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            if isinstance(obj, DictionaryObject):
+                for key in list(obj.keys()):
+                    value = obj.raw_get(key)
+                    obj[key] = self._replace(value)
+                    if isinstance(value, (DictionaryObject, ArrayObject)):
+                        stack.append(value)
+            else:
+                for i, value in enumerate(obj):
+                    obj[i] = self._replace(value)
+                    if isinstance(value, (DictionaryObject, ArrayObject)):
+                        stack.append(value)
+
+SUBSET_PREFIX_LENGTH = 7
+
+def base_font_name(font_name: str) -> str:
+    """サブセットの接頭辞 (ABCDEF+) を除いたフォント名"""
+    name = font_name.lstrip("/")
+    prefix = name[:SUBSET_PREFIX_LENGTH]
+    if len(prefix) == SUBSET_PREFIX_LENGTH and prefix.endswith("+") and prefix[:-1].isalpha() and prefix[:-1].isupper():
+        return name[SUBSET_PREFIX_LENGTH:]
+    return name
+
+def duplicated_font_subsets(deduplicator: Deduplicator) -> Dict[str, Tuple[int, int]]:
+    """
+    まとめた後も同じフォントのフォントファイルが複数残っているものを数える。
+
+    Returns:
+        Dict[str, Tuple[int, int]]: フォント名 (接頭辞なし) → (フォントファイルの数, 合計バイト数)
+    """
+    font_files: Dict[str, Dict[int, int]] = {}
+    for idnum, obj in deduplicator.objects.items():
+        if idnum in deduplicator.canonical or not isinstance(obj, DictionaryObject):
+            continue
+        if obj.get("/Type") != "/FontDescriptor" or "/FontName" not in obj:
+            continue
+        for key in ("/FontFile", "/FontFile2", "/FontFile3"):
+            reference = obj.raw_get(key) if key in obj else None
+            if isinstance(reference, IndirectObject):
+                stream = deduplicator.objects.get(reference.idnum)
+                if isinstance(stream, StreamObject):
+                    files = font_files.setdefault(base_font_name(obj["/FontName"]), {})
+                    files[reference.idnum] = len(stream._data)
+    return {
+        name: (len(files), sum(files.values()))
+        for name, files in sorted(font_files.items())
+        if len(files) > 1
+    }
+
+def object_numbers(reader: PdfReader) -> List[Tuple[int, int]]:
+    """クロスリファレンスに載っている (オブジェクト番号, 世代番号) (オブジェクトストリーム内のものを含む)"""
+    numbers = {}
+    for generation, entries in reader.xref.items():
+        for idnum in entries:
+            numbers[idnum] = generation
+    for idnum in reader.xref_objStm:
+        numbers[idnum] = 0
+    numbers.pop(0, None)
+    return sorted(numbers.items())
+
+def recompress_streams(objects) -> int:
+    """
+    未圧縮、または予測子なしの Flate で圧縮されたストリームを zlib の最大圧縮率で圧縮し直す。
+    小さくなった場合だけ置き換え、置き換えた数を返す。
+    """
+    recompressed = 0
+    for obj in objects:
+        if not isinstance(obj, StreamObject) or "/DecodeParms" in obj:
+            continue
+        filters = obj.get("/Filter")
+        if filters is None:
+            raw = obj._data
+        elif filters == "/FlateDecode":
+            try:
+                raw = zlib.decompress(obj._data)
+            except zlib.error:
+                continue
+        else:
+            # DCTDecode (JPEG) などはそのまま
+            continue
+        compressed = zlib.compress(raw, 9)
+        if len(compressed) < len(obj._data):
+            obj._data = compressed
+            obj[NameObject("/Filter")] = NameObject("/FlateDecode")
+            recompressed += 1
+    return recompressed
+
+def linearize(pdf_path: str) -> bool:
+    """qpdf で線形化する (qpdf がなければ何もしない)"""
+    qpdf = shutil.which("qpdf")
+    if qpdf is None:
+        print("Warning: qpdf が見つからないため、線形化はスキップします。")
+        return False
+    tmp_path = f"{pdf_path}.linearized"
+    # --deterministic-id: 同じ入力から同じ /ID を生成する (再現可能ビルド)
+    result = subprocess.run([qpdf, "--linearize", "--deterministic-id", pdf_path, tmp_path])
+    # 終了コード 3 は警告付きの成功
+    if result.returncode not in (0, 3):
+        print(f"Warning: qpdf による線形化に失敗しました (終了コード {result.returncode})。")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, pdf_path)
+    return True
+
+def optimize_pdf(input_file: str, output_file: Optional[str] = None, linearize_output: bool = True) -> Tuple[int, int]:
+    """
+    PDF を最適化して output_file (省略時は input_file を置き換え) に書き出す。
+
+    Returns:
+        Tuple[int, int]: 最適化前と後のファイルサイズ
+    """
+    output_file = output_file or input_file
+    original_size = os.path.getsize(input_file)
+
+    reader = PdfReader(input_file)
+    deduplicator = Deduplicator(reader)
+    merged = deduplicator.run()
+    recompressed = recompress_streams(deduplicator.objects.values())
+    subsets = duplicated_font_subsets(deduplicator)
+
+    # ページから辿れるオブジェクトだけが書き出されるので、まとめられた重複は出力に含まれない
+    # (merge_pdf_files.py と同じくページ単位で複製する)
+    writer = PdfWriter()
+    for page in reader.pages:
+        writer.add_page(page)
+    if reader.metadata:
+        writer.add_metadata({key: value for key, value in reader.metadata.items()})
+
+    tmp_path = f"{output_file}.tmp"
+    with open(tmp_path, "wb") as f:
+        writer.write(f)
+    os.replace(tmp_path, output_file)
+
+    if linearize_output:
+        linearize(output_file)
+
+    optimized_size = os.path.getsize(output_file)
+    saved = original_size - optimized_size
+    print(f"重複オブジェクト {merged} 件をまとめ、ストリーム {recompressed} 件を再圧縮しました。")
+    for name, (count, size) in subsets.items():
+        print(f"Warning: {name} はサブセットの内容が異なるため {count} 件が残っています (合計 {size:,} バイト)。")
+    print(f"{output_file}: {original_size:,} → {optimized_size:,} バイト "
+          f"({saved:,} バイト削減、{saved / max(original_size, 1):.1%})")
+    return original_size, optimized_size
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Deduplicate fonts, recompress streams and linearize a merged PDF.")
+
+    parser.add_argument(
+        "input", type=str,
+        help="PDF file to optimize"
+    )
+    parser.add_argument(
+        "--output", type=str,
+        default=None,
+        help="Output file (default: overwrite the input)"
+    )
+    parser.add_argument(
+        "--no-linearize", action="store_true",
+        help="Skip linearization with qpdf"
+    )
+
+    return parser
+
+def main(argv=None):
+    parser = setup_argument_parser()
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        print(f"Error: {args.input} が見つかりません。")
+        sys.exit(1)
+
+    optimize_pdf(args.input, args.output, linearize_output=not args.no_linearize)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+完成した書籍 PDF の記事ごとのページ範囲の索引と、記事単位の PDF の切り出し。
+
+build: 本文 (mainmatter.pdf) の各記事の開始ページを求め、表紙・前付けのページ数を足して
+       書籍 PDF のページ範囲に直し、JSON (output/page_index.json) に保存する。
+       開始ページは本文 PDF の名前付き移動先 (article-NNNN のアンカー) を優先し、
+       なければ目次 (toc.md) のページ番号を使う。目次の [N] は結合順の位置なので、
+       記事ディレクトリと include/exclude から結合順の記事を求めて対応付ける。
+       記事は改ページで始まるので、次の項目の開始ページの前までをその記事の範囲とする。
+extract: 索引のページ範囲を書籍 PDF からコピーして、記事ごとの PDF を書き出す
+         (md-to-pdf で描画し直さないので、数百記事でも数秒で終わる)。
+
+使い方:
+    page_index.py build --toc output/md/toc.md --mainmatter output/pdf/mainmatter.pdf \\
+        --articles-dir articles --include-file config/include_articles.txt \\
+        --cover output/pdf/cover.pdf --frontmatter output/pdf/frontmatter.pdf \\
+        --back-cover output/pdf/back_cover.pdf --output output/page_index.json
+    page_index.py extract --book output/note-book.pdf --index output/page_index.json \\
+        --output-dir output/pdf/articles 0001 0005
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from PyPDF2 import PdfReader, PdfWriter
+
+from build_cache import get_build_datetime
+from generate_toc import match_toc_articles, parse_toc_markdown
+from merge_md_files import index_article_files, read_title, select_article_files
+from merge_pdf_files import pdf_date
+from progress import Progress, add_progress_arguments, configure as configure_progress
+from select_articles import load_article_numbers
+
+PAGE_INDEX_VERSION = 1
+
+# merge_md_files.py が記事の先頭に置くアンカー
+ARTICLE_ANCHOR_PATTERN = re.compile(r'^article-(\d+)$')
+
+# 書籍 PDF に結合される順のパート
+PARTS = ("cover", "frontmatter", "mainmatter", "back_cover")
+
+def count_pages(pdf_path: Optional[str]) -> int:
+    if not pdf_path:
+        return 0
+    if not os.path.exists(pdf_path):
+        print(f"Warning: {pdf_path} が見つかりません。0ページとして扱います。")
+        return 0
+    return len(PdfReader(pdf_path).pages)
+
+def anchor_pages(reader: PdfReader) -> Dict[str, int]:
+    """本文 PDF の名前付き移動先から、記事番号 (4桁) → 開始ページ (1始まり) を求める"""
+    pages = {}
+    for name, destination in reader.named_destinations.items():
+        match = ARTICLE_ANCHOR_PATTERN.match(str(name).lstrip("/"))
+        if not match:
+            continue
+        page_number = reader.get_destination_page_number(destination)
+        if page_number is not None and page_number >= 0:
+            pages[f"{int(match.group(1)):04d}"] = page_number + 1
+    return pages
+
+def merged_articles(articles_dir: str, include_numbers: Set[str], exclude_numbers: Set[str]) -> List[Tuple[str, str]]:
+    """merge_md_files.py と同じ選び方で、本文に結合した順の (記事番号, タイトル) を返す"""
+    selected = select_article_files(index_article_files(articles_dir), include_numbers, exclude_numbers)
+    return [(number, read_title(path)) for number, path in selected]
+
+def section_key(section_id: str) -> str:
+    """コマンドラインで指定された記事番号を4桁にそろえる (intro / conclusion はそのまま)"""
+    return f"{int(section_id):04d}" if section_id.isdigit() else section_id
+
+def build_page_index(
+    toc_path: str,
+    mainmatter_pdf: str,
+    cover_pdf: Optional[str] = None,
+    frontmatter_pdf: Optional[str] = None,
+    back_cover_pdf: Optional[str] = None,
+    articles: Optional[Sequence[Tuple[str, str]]] = None,
+) -> Dict:
+    """
+    書籍 PDF のページ番号 (1始まり) で、記事・はじめに・あとがきのページ範囲を求める。
+
+    articles は本文に結合した順の (記事番号, タイトル)。目次の記事の項目はこれと対応付けて
+    記事番号を決める (ない場合は目次の記事の項目を使わず、アンカーだけを使う)。
+    """
+    reader = PdfReader(mainmatter_pdf)
+    part_pages = {
+        "cover": count_pages(cover_pdf),
+        "frontmatter": count_pages(frontmatter_pdf),
+        "mainmatter": len(reader.pages),
+        "back_cover": count_pages(back_cover_pdf),
+    }
+
+    # 目次の開始ページを、アンカーが見つかった記事だけアンカーのページで置き換える
+    # (どちらも記事番号をキーにするので、同じ記事が2つの項目になることはない)
+    toc = parse_toc_markdown(toc_path)
+    if articles is None:
+        skipped = sum(1 for section_id, _, _ in toc if section_id not in ("intro", "conclusion"))
+        if skipped:
+            print(f"Warning: 記事ディレクトリの指定がないため、目次の記事 {skipped} 件はアンカーがある場合だけ索引に入れます。")
+        toc = [entry for entry in toc if entry[0] in ("intro", "conclusion")]
+    else:
+        toc = match_toc_articles(toc, articles)
+
+    titles = dict(articles or [])
+    starts = {}
+    sources = {}
+    for key, title, page in toc:
+        titles.setdefault(key, title)
+        starts[key] = page
+        sources[key] = "toc"
+    for key, page in anchor_pages(reader).items():
+        starts[key] = page
+        sources[key] = "anchor"
+
+    offset = part_pages["cover"] + part_pages["frontmatter"]
+    ordered = sorted(starts, key=lambda key: (starts[key], key))
+    sections = {}
+    for position, key in enumerate(ordered):
+        first = starts[key]
+        if first > part_pages["mainmatter"]:
+            print(f"Warning: {key} の開始ページ {first} が本文のページ数 {part_pages['mainmatter']} を超えています。スキップします。")
+            continue
+        if position + 1 < len(ordered):
+            last = max(first, starts[ordered[position + 1]] - 1)
+        else:
+            last = part_pages["mainmatter"]
+        sections[key] = {
+            "title": titles.get(key, ""),
+            "first_page": offset + first,
+            "last_page": offset + min(last, part_pages["mainmatter"]),
+            "source": sources[key],
+        }
+
+    ranges = {}
+    start = 1
+    for part in PARTS:
+        if part_pages[part]:
+            ranges[part] = [start, start + part_pages[part] - 1]
+        start += part_pages[part]
+
+    return {
+        "version": PAGE_INDEX_VERSION,
+        "book_pages": sum(part_pages.values()),
+        "parts": ranges,
+        "sections": sections,
+    }
+
+def save_page_index(index: Dict, output_path: str) -> None:
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, output_path)
+
+def load_page_index(index_path: str) -> Dict:
+    with open(index_path, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("version") != PAGE_INDEX_VERSION:
+        raise ValueError(f"Unsupported page index version: {index.get('version')}")
+    return index
+
+def select_sections(
+    index: Dict,
+    section_ids: Optional[List[str]] = None,
+    include_numbers: Optional[Set[str]] = None,
+    exclude_numbers: Optional[Set[str]] = None,
+) -> List[str]:
+    """
+    切り出す項目のキー。指定がなければ全記事 (はじめに・あとがきは明示したときだけ)。
+    """
+    sections = index["sections"]
+    if section_ids:
+        keys = []
+        for section_id in section_ids:
+            key = section_key(section_id)
+            if key in sections:
+                keys.append(key)
+            else:
+                print(f"Warning: {section_id} はページ索引にありません。スキップします。")
+    else:
+        keys = [key for key in sections if key.isdigit()]
+    if include_numbers:
+        keys = [key for key in keys if key in include_numbers]
+    if exclude_numbers:
+        keys = [key for key in keys if key not in exclude_numbers]
+    return keys
+
+def extract_sections(book_pdf: str, index: Dict, keys: List[str], output_dir: str) -> List[str]:
+    """書籍 PDF から各項目のページ範囲をコピーし、<output_dir>/<キー>.pdf に書き出す"""
+    reader = PdfReader(book_pdf)
+    if len(reader.pages) != index["book_pages"]:
+        raise ValueError(
+            f"{book_pdf} は {len(reader.pages)} ページですが、ページ索引は {index['book_pages']} ページの書籍のものです。"
+            "索引を作り直してください。"
+        )
+
+    os.makedirs(output_dir, exist_ok=True)
+    build_date = pdf_date(get_build_datetime())
+    written = []
+    with Progress("page_index", total=len(keys)) as progress:
+        for key in keys:
+            section = index["sections"][key]
+            writer = PdfWriter()
+            for page_number in range(section["first_page"], section["last_page"] + 1):
+                writer.add_page(reader.pages[page_number - 1])
+            metadata = {"/CreationDate": build_date, "/ModDate": build_date}
+            if section["title"]:
+                metadata["/Title"] = section["title"]
+            writer.add_metadata(metadata)
+
+            output_path = os.path.join(output_dir, f"{key}.pdf")
+            with open(output_path, "wb") as out:
+                writer.write(out)
+            written.append(output_path)
+            progress.advance(item=output_path)
+    return written
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Build a per-article page-range index of the book PDF and extract articles from it.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Build the page index from the TOC, the mainmatter anchors and the part PDFs")
+    build.add_argument(
+        "--toc", type=str,
+        default="output/md/toc.md",
+        help="TOC markdown generated from the mainmatter PDF (default: output/md/toc.md)"
+    )
+    build.add_argument(
+        "--mainmatter", type=str,
+        default="output/pdf/mainmatter.pdf",
+        help="Mainmatter PDF (default: output/pdf/mainmatter.pdf)"
+    )
+    build.add_argument(
+        "--articles-dir", type=str,
+        default=None,
+        help="Article directory merged into the mainmatter; needed to map TOC entries to article numbers"
+    )
+    build.add_argument(
+        "--include-file", type=str,
+        default=None,
+        help="Include list the mainmatter was merged with"
+    )
+    build.add_argument(
+        "--exclude-file", type=str,
+        default=None,
+        help="Exclude list the mainmatter was merged with"
+    )
+    build.add_argument(
+        "--cover", type=str,
+        default=None,
+        help="Cover PDF merged before the frontmatter"
+    )
+    build.add_argument(
+        "--frontmatter", type=str,
+        default=None,
+        help="Frontmatter PDF merged before the mainmatter"
+    )
+    build.add_argument(
+        "--back-cover", type=str,
+        default=None,
+        help="Back cover PDF merged after the mainmatter"
+    )
+    build.add_argument(
+        "--output", type=str,
+        default="output/page_index.json",
+        help="Output JSON file (default: output/page_index.json)"
+    )
+
+    extract = commands.add_parser("extract", help="Copy the page ranges of articles out of the book PDF")
+    extract.add_argument(
+        "--book", type=str,
+        default="output/note-book.pdf",
+        help="Merged book PDF (default: output/note-book.pdf)"
+    )
+    extract.add_argument(
+        "--index", type=str,
+        default="output/page_index.json",
+        help="Page index written by the build command (default: output/page_index.json)"
+    )
+    extract.add_argument(
+        "--output-dir", type=str,
+        default="output/pdf/articles",
+        help="Directory for the per-article PDFs (default: output/pdf/articles)"
+    )
+    extract.add_argument(
+        "--include-file", type=str,
+        default=None,
+        help="Only extract the article numbers listed in this file"
+    )
+    extract.add_argument(
+        "--exclude-file", type=str,
+        default=None,
+        help="Skip the article numbers listed in this file"
+    )
+    extract.add_argument(
+        "sections", nargs="*",
+        help="Article numbers (or 'intro' / 'conclusion') to extract; all articles if omitted"
+    )
+    add_progress_arguments(extract)
+
+    return parser
+
+def main(argv=None):
+    parser = setup_argument_parser()
+    args = parser.parse_args(argv)
+    configure_progress(getattr(args, "quiet", False), getattr(args, "progress_events", None))
+
+    if args.command == "build":
+        for path in (args.toc, args.mainmatter):
+            if not os.path.exists(path):
+                print(f"Error: {path} が見つかりません。")
+                sys.exit(1)
+        articles = None
+        if args.articles_dir:
+            articles = merged_articles(
+                args.articles_dir,
+                load_article_numbers(args.include_file) if args.include_file else set(),
+                load_article_numbers(args.exclude_file) if args.exclude_file else set(),
+            )
+        index = build_page_index(
+            toc_path=args.toc,
+            mainmatter_pdf=args.mainmatter,
+            cover_pdf=args.cover,
+            frontmatter_pdf=args.frontmatter,
+            back_cover_pdf=args.back_cover,
+            articles=articles,
+        )
+        if not index["sections"]:
+            print(f"Warning: {args.toc} と {args.mainmatter} から記事のページが見つかりませんでした。")
+        save_page_index(index, args.output)
+        anchors = sum(1 for section in index["sections"].values() if section["source"] == "anchor")
+        print(f"Saved: {args.output} ({len(index['sections'])} 項目, アンカー {anchors} 件, {index['book_pages']} ページ)")
+        return
+
+    for path in (args.book, args.index):
+        if not os.path.exists(path):
+            print(f"Error: {path} が見つかりません。")
+            sys.exit(1)
+    index = load_page_index(args.index)
+    keys = select_sections(
+        index,
+        section_ids=args.sections,
+        include_numbers=load_article_numbers(args.include_file) if args.include_file else None,
+        exclude_numbers=load_article_numbers(args.exclude_file) if args.exclude_file else None,
+    )
+    try:
+        written = extract_sections(args.book, index, keys, args.output_dir)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"{len(written)} 件の PDF を {args.output_dir} に書き出しました。")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+記事中のリモート画像 (note.com の CDN など) を事前にダウンロードし、リンクをローカルファイルに書き換える。
+
+md-to-pdf のヘッドレスブラウザが描画中に1枚ずつ取得するのを避けるため、
+ホストごとの接続を再利用しながら並行してダウンロードし、容量上限付きのディスクキャッシュに保存する。
+書き換えたリンクはプロジェクトのルート (--project-root、既定はキャッシュ先の親ディレクトリ) からの
+相対パス (./images/<ハッシュ>.png) で、スクリプトを実行したディレクトリによらない。
+merge_md_files.py / build_html.py がこれを出力先からの相対パスに置き換えるので、キャッシュ先が images/ 以外のときは
+プロジェクトのルートで実行し、--asset-dir <キャッシュ先> を渡す。
+"""
+
+import os
+import re
+import time
+import hashlib
+import argparse
+import threading
+import http.client
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from merge_md_files import index_article_files
+from progress import Progress, add_progress_arguments, configure as configure_progress
+
+# Markdown の画像リンクのうち http(s) のもの
+REMOTE_IMAGE_PATTERN = re.compile(r'(!\[[^\]]*\]\()(https?://[^)\s]+)(\))')
+
+# 書き換え済みの (プロジェクトのルートからの相対パスの) 画像リンク
+LOCAL_IMAGE_PATTERN = re.compile(r'!\[[^\]]*\]\(\./([^)\s]+)\)')
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_REDIRECTS = 5
+
+class ConnectionPool:
+    """スレッドごとに (scheme, host, port) 単位の HTTP 接続を保持して再利用する"""
+
+    def __init__(self, timeout: float = 30.0):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, scheme: str, netloc: str):
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        key = (scheme, netloc)
+        if key not in connections:
+            connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            connections[key] = connection_class(netloc, timeout=self.timeout)
+        return connections[key]
+
+    def _discard(self, scheme: str, netloc: str) -> None:
+        connection = self._local.connections.pop((scheme, netloc), None)
+        if connection is not None:
+            connection.close()
+
+    def get(self, url: str):
+        """GET してレスポンス (status, headers, body) を返す。リダイレクトは追跡する"""
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            path = parts.path or "/"
+            if parts.query:
+                path += f"?{parts.query}"
+
+            connection = self._connection(parts.scheme, parts.netloc)
+            try:
+                connection.request("GET", path, headers={"User-Agent": "note-book-generator"})
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                # 切断された keep-alive 接続は捨てて呼び出し側で再試行させる
+                self._discard(parts.scheme, parts.netloc)
+                raise
+
+            if response.will_close:
+                self._discard(parts.scheme, parts.netloc)
+            if response.status in REDIRECT_STATUSES and response.getheader("Location"):
+                url = urljoin(url, response.getheader("Location"))
+                continue
+            return response.status, response.getheader("Content-Type", ""), body
+        raise http.client.HTTPException(f"Too many redirects: {url}")
+
+class ImageCache:
+    """URL の SHA-256 をファイル名とする、容量上限付きのディスクキャッシュ"""
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # キャッシュキー → ファイルパス (ディレクトリの走査は最初の1回だけ)
+        self._index = {
+            entry.name[:32]: entry.path
+            for entry in os.scandir(cache_dir)
+            if entry.is_file() and not entry.name.endswith(".tmp")
+        }
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+
+    def lookup(self, url: str) -> Optional[str]:
+        """キャッシュ済みならそのパスを返し、最終利用時刻を更新する"""
+        with self._lock:
+            path = self._index.get(self._key(url))
+        if path is None or not os.path.exists(path):
+            return None
+        os.utime(path)
+        return path
+
+    def store(self, url: str, data: bytes, content_type: str) -> str:
+        extension = os.path.splitext(urlsplit(url).path)[1].lower()
+        if not extension:
+            extension = mimetypes.guess_extension(content_type.split(";")[0].strip()) or ".img"
+        path = os.path.join(self.cache_dir, f"{self._key(url)}{extension}")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._index[self._key(url)] = path
+        return path
+
+    def evict(self, keep: Set[str]) -> int:
+        """記事が参照している画像 (keep, 絶対パス) 以外を古い順に削除して容量上限に収め、削除数を返す"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+                    total += stat.st_size
+
+            removed = 0
+            for _, path, size in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if os.path.abspath(path) in keep:
+                    continue
+                os.remove(path)
+                self._index.pop(os.path.basename(path)[:32], None)
+                total -= size
+                removed += 1
+            return removed
+
+def collect_image_urls(article_paths: Iterable[str], project_root: str) -> Tuple[Dict[str, List[str]], Set[str]]:
+    """
+    記事中の画像リンクを集める。
+
+    Returns:
+        Tuple[Dict[str, List[str]], Set[str]]: (リモート画像URL → 記事ファイル,
+            前回までに書き換えたローカル画像の絶対パス)
+    """
+    urls: Dict[str, List[str]] = {}
+    local_images: Set[str] = set()
+    for path in article_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        for match in REMOTE_IMAGE_PATTERN.finditer(content):
+            urls.setdefault(match.group(2), []).append(path)
+        for match in LOCAL_IMAGE_PATTERN.finditer(content):
+            local_images.add(os.path.abspath(os.path.join(project_root, match.group(1))))
+    return urls, local_images
+
+def download_image(url: str, pool: ConnectionPool, cache: ImageCache, retries: int, backoff: float) -> Optional[str]:
+    """キャッシュになければダウンロードしてローカルパスを返す (失敗時は None)"""
+    cached = cache.lookup(url)
+    if cached:
+        return cached
+
+    for attempt in range(retries + 1):
+        try:
+            status, content_type, body = pool.get(url)
+        except (http.client.HTTPException, OSError) as e:
+            error = str(e)
+        else:
+            if status == 200:
+                return cache.store(url, body, content_type)
+            error = f"HTTP {status}"
+            if status not in RETRY_STATUSES:
+                break
+        if attempt < retries:
+            time.sleep(backoff * (2 ** attempt))
+
+    print(f"Warning: {url} を取得できませんでした ({error})。リンクは変更しません。")
+    return None
+
+def rewrite_links(article_path: str, local_paths: Dict[str, str], project_root: str) -> bool:
+    """記事中の画像URLを、プロジェクトのルートからの相対パスのローカルファイルへのリンクに書き換える"""
+    with open(article_path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    def replace(match):
+        local_path = local_paths.get(match.group(2))
+        if local_path is None:
+            return match.group(0)
+        link = os.path.relpath(local_path, project_root).replace(os.sep, '/')
+        return f"{match.group(1)}./{link}{match.group(3)}"
+
+    rewritten = REMOTE_IMAGE_PATTERN.sub(replace, content)
+    if rewritten == content:
+        return False
+    with open(article_path, "w", encoding="utf-8") as f:
+        f.write(rewritten)
+    return True
+
+def prefetch_images(
+    articles_dir: str,
+    cache_dir: str = "images",
+    max_cache_bytes: int = 1024 * 1024 * 1024,
+    jobs: int = 8,
+    retries: int = 3,
+    backoff: float = 0.5,
+    timeout: float = 30.0,
+    project_root: Optional[str] = None,
+) -> Dict[str, str]:
+    """
+    記事中のリモート画像を並行してダウンロードし、リンクをローカルファイルに書き換える。
+
+    Returns:
+        Dict[str, str]: 取得できた URL → ローカルファイル
+    """
+    # 記事のリンクはプロジェクトのルート (既定はキャッシュ先の親ディレクトリ) を基準にする
+    if project_root is None:
+        project_root = os.path.dirname(os.path.abspath(cache_dir))
+    project_root = os.path.abspath(project_root)
+    article_paths = list(index_article_files(articles_dir).values())
+    urls, local_images = collect_image_urls(article_paths, project_root)
+    print(f"{len(urls)} 件のリモート画像が見つかりました。")
+
+    pool = ConnectionPool(timeout=timeout)
+    cache = ImageCache(cache_dir, max_cache_bytes)
+    url_list = sorted(urls)
+    local_paths = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor, \
+            Progress("prefetch_images", total=len(url_list), unit="枚") as progress:
+        results = executor.map(lambda url: download_image(url, pool, cache, retries, backoff), url_list)
+        for url, path in zip(url_list, results):
+            if path:
+                local_paths[url] = path
+                progress.advance(item=url)
+            else:
+                progress.advance(item=url, failed=1)
+
+    rewritten = 0
+    for path in sorted({path for url in local_paths for path in urls[url]}):
+        if rewrite_links(path, local_paths, project_root):
+            rewritten += 1
+
+    # 今回取得した画像に加え、前回までに書き換えたリンクが指す画像も削除しない
+    removed = cache.evict(local_images | {os.path.abspath(path) for path in local_paths.values()})
+    print(f"画像 {len(local_paths)}/{len(urls)} 件を取得し、{rewritten} 件の記事を書き換えました。"
+          f"(キャッシュから {removed} 件を削除)")
+    return local_paths
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Download remote images referenced by articles and rewrite links to local files.")
+
+    parser.add_argument(
+        "--articles-dir", type=str,
+        default="articles",
+        help="Directory containing article markdown files (default: articles)"
+    )
+    parser.add_argument(
+        "--cache-dir", type=str,
+        default="images",
+        help="Directory for downloaded images (default: images)"
+    )
+    parser.add_argument(
+        "--project-root", type=str,
+        default=None,
+        help="Directory the rewritten ./ links are relative to; run merge_md_files.py from here "
+             "(default: parent of --cache-dir)"
+    )
+    parser.add_argument(
+        "--max-cache-mb", type=int,
+        default=1024,
+        help="Size cap of the image cache in MB (default: 1024)"
+    )
+    parser.add_argument(
+        "--jobs", type=int,
+        default=8,
+        help="Number of concurrent downloads (default: 8)"
+    )
+    parser.add_argument(
+        "--retries", type=int,
+        default=3,
+        help="Retries per image for connection errors and 429/5xx responses (default: 3)"
+    )
+    parser.add_argument(
+        "--timeout", type=float,
+        default=30.0,
+        help="Socket timeout in seconds (default: 30)"
+    )
+    add_progress_arguments(parser)
+
+    return parser
+
+def main(argv=None):
+    parser = setup_argument_parser()
+    args = parser.parse_args(argv)
+    configure_progress(args.quiet, args.progress_events)
+
+    prefetch_images(
+        articles_dir=args.articles_dir,
+        cache_dir=args.cache_dir,
+        max_cache_bytes=args.max_cache_mb * 1024 * 1024,
+        jobs=args.jobs,
+        retries=args.retries,
+        timeout=args.timeout,
+        project_root=args.project_root,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+時間のかかるステージ共通の進捗表示とテレメトリ。
+
+記事ごとに1行ずつ出力する代わりに、Progress で処理件数を数え、一定間隔でだけ
+件数・処理速度 (件/秒)・残り時間の見込みを標準エラーに表示する。
+端末では同じ行を書き換え、ログ (パイプやビルドデーモン) では間隔を空けて1行ずつ出す。
+
+- イベントファイル (--progress-events または環境変数 PROGRESS_EVENTS) を指定すると、
+  開始・各項目・途中経過・終了を JSON Lines で追記する (複数のプロセスから同じファイルに追記してよい)
+- --quiet または PROGRESS_QUIET=1 で画面への進捗表示を止める (Warning / Error はそのまま出る)
+
+    progress.configure(args.quiet, args.progress_events)
+    with Progress("wxr_to_md", total=len(items)) as bar:
+        for item in items:
+            ...
+            bar.advance(item=filename)
+"""
+
+import os
+import sys
+import json
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+QUIET_ENV = "PROGRESS_QUIET"
+EVENTS_ENV = "PROGRESS_EVENTS"
+
+# 進捗を表示する間隔 (秒): 端末では同じ行を書き換えるので短く、ログでは行数を抑える
+TTY_INTERVAL = 0.5
+LOG_INTERVAL = 10.0
+
+# configure() で決めた設定 (None なら環境変数を見る)
+_settings: Dict[str, Optional[object]] = {"quiet": None, "events": None}
+
+def configure(quiet: bool = False, events_path: Optional[str] = None) -> None:
+    """スクリプトの main で呼ぶ。指定がなければ環境変数の値を使う"""
+    _settings["quiet"] = quiet or os.environ.get(QUIET_ENV, "") not in ("", "0")
+    _settings["events"] = events_path or os.environ.get(EVENTS_ENV) or None
+
+def is_quiet() -> bool:
+    if _settings["quiet"] is None:
+        return os.environ.get(QUIET_ENV, "") not in ("", "0")
+    return bool(_settings["quiet"])
+
+def events_path() -> Optional[str]:
+    if _settings["events"] is None:
+        return os.environ.get(EVENTS_ENV) or None
+    return _settings["events"]
+
+def add_progress_arguments(parser) -> None:
+    group = parser.add_argument_group('progress')
+    group.add_argument(
+        "--quiet", action="store_true",
+        help=f"Do not show progress lines (same as {QUIET_ENV}=1)"
+    )
+    group.add_argument(
+        "--progress-events", type=str,
+        default=None,
+        help=f"Append JSON-lines progress events to this file (default: ${EVENTS_ENV})"
+    )
+
+def format_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}秒"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}分{seconds:02d}秒"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}時間{minutes:02d}分"
+
+class EventLog:
+    """JSON Lines のイベントファイル。行はためておき、flush でまとめて1回の write で追記する"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.lines: List[str] = []
+
+    def write(self, event: Dict) -> None:
+        self.lines.append(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def flush(self) -> None:
+        if self.lines:
+            # O_APPEND の1回の write なので、他のプロセスの行と混ざらない
+            os.write(self.fd, "".join(self.lines).encode("utf-8"))
+            self.lines = []
+
+    def close(self) -> None:
+        self.flush()
+        os.close(self.fd)
+
+class Progress:
+    """1ステージの進捗。advance() で件数を進め、finish() (または with を抜けたとき) で結果を出す"""
+
+    def __init__(self, stage: str, total: Optional[int] = None, unit: str = "件"):
+        self.stage = stage
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.counts: Counter = Counter()
+        self.quiet = is_quiet()
+        self.stream = sys.stderr
+        self.tty = self.stream.isatty()
+        self.interval = TTY_INTERVAL if self.tty else LOG_INTERVAL
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.finished = False
+        path = events_path()
+        self.events = EventLog(path) if path else None
+        self.emit("start", total=total)
+
+    def __enter__(self) -> "Progress":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.finish(status="failed" if exc_type else "ok")
+
+    def emit(self, event: str, **fields) -> None:
+        if self.events is None:
+            return
+        record = {"time": round(time.time(), 3), "pid": os.getpid(), "stage": self.stage, "event": event}
+        record.update(fields)
+        self.events.write(record)
+
+    def rate(self, now: float) -> float:
+        elapsed = now - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def advance(self, count: int = 1, item: Optional[str] = None, **counts: int) -> None:
+        """
+        count 件進める。item はイベントファイルに残す項目名 (ファイル名など)、
+        counts は「スキップ」などの内訳 (終了時に合計を表示する)。
+        """
+        self.done += count
+        self.counts.update(counts)
+        if item is not None:
+            self.emit("item", item=item, done=self.done, **counts)
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report(now)
+
+    def message(self, text: str, **fields) -> None:
+        """ステージの途中経過のメッセージ (quiet では表示しない)"""
+        self.emit("message", text=text, **fields)
+        if not self.quiet:
+            self.write_line(f"[{self.stage}] {text}", final=True)
+
+    def status_line(self, now: float) -> str:
+        rate = self.rate(now)
+        if self.total:
+            text = f"[{self.stage}] {self.done}/{self.total} {self.unit} ({self.done / self.total:.0%}) {rate:.1f} {self.unit}/秒"
+            if rate > 0 and self.done < self.total:
+                text += f" 残り約{format_duration((self.total - self.done) / rate)}"
+            return text
+        return f"[{self.stage}] {self.done} {self.unit} {rate:.1f} {self.unit}/秒"
+
+    def report(self, now: float) -> None:
+        rate = self.rate(now)
+        eta = (self.total - self.done) / rate if self.total and rate > 0 else None
+        self.emit("progress", done=self.done, total=self.total, rate=round(rate, 2),
+                  eta_seconds=round(eta, 1) if eta is not None else None)
+        if self.events is not None:
+            self.events.flush()
+        if not self.quiet:
+            self.write_line(self.status_line(now), final=False)
+
+    def write_line(self, text: str, final: bool) -> None:
+        if self.tty:
+            # 端末では進捗の行を書き換える (確定した行だけ改行する)
+            self.stream.write(f"\r{text}\x1b[K" + ("\n" if final else ""))
+        else:
+            self.stream.write(text + "\n")
+        self.stream.flush()
+
+    def finish(self, **fields) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        now = time.monotonic()
+        elapsed = now - self.started
+        rate = self.rate(now)
+        self.emit("finish", done=self.done, total=self.total, seconds=round(elapsed, 3),
+                  rate=round(rate, 2), counts=dict(self.counts), **fields)
+        if self.events is not None:
+            self.events.close()
+        if self.quiet:
+            return
+        breakdown = ", ".join(f"{name} {count}" for name, count in sorted(self.counts.items()))
+        self.write_line(f"[{self.stage}] {self.done} {self.unit}{f' ({breakdown})' if breakdown else ''} "
+                        f"{format_duration(elapsed)}、{rate:.1f} {self.unit}/秒", final=True)
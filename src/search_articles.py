@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+from typing import Dict
+
+from search_index import SearchIndex
+from page_index import load_page_index
+
+def load_article_pages(index_path: str) -> Dict[str, int]:
+    """
+    ページ索引 (page_index.json) から 記事番号 → 本文のページ番号 (目次と同じ番号) の対応を作る。
+
+    索引のページは最終PDFの通し番号なので、本文 (mainmatter) の開始ページを引いて本文のページ番号に直す。
+    """
+    if not index_path or not os.path.exists(index_path):
+        return {}
+    index = load_page_index(index_path)
+    mainmatter = index["parts"].get("mainmatter")
+    offset = mainmatter[0] - 1 if mainmatter else 0
+    return {
+        key: section["first_page"] - offset
+        for key, section in index["sections"].items()
+        if key.isdigit()
+    }
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Search articles using the index built by wxr_to_md.py.")
+
+    parser.add_argument("query", nargs="+", help="Search terms (all terms must match)")
+    parser.add_argument(
+        "--index", type=str,
+        default="articles/search_index.bin",
+        help="Path to the search index (default: articles/search_index.bin)"
+    )
+    parser.add_argument(
+        "--page-index", type=str,
+        default="output/page_index.json",
+        help="Page index used to look up page numbers by article number (default: output/page_index.json)"
+    )
+    parser.add_argument(
+        "--limit", type=int,
+        default=0,
+        help="Maximum number of results to show (default: unlimited)"
+    )
+    parser.add_argument(
+        "--no-verify", action="store_true",
+        help="Skip re-reading candidate articles (faster, may include false positives)"
+    )
+
+    return parser
+
+def main(argv=None):
+    parser = setup_argument_parser()
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.index):
+        print(f"Error: 検索インデックス {args.index} が見つかりません。")
+        sys.exit(1)
+
+    with SearchIndex(args.index) as index:
+        hits = index.search(args.query, verify=not args.no_verify)
+    if args.limit:
+        hits = hits[:args.limit]
+
+    article_pages = load_article_pages(args.page_index)
+    for number, title, filename in hits:
+        page = article_pages.get(number)
+        page_text = f"p.{page}" if page is not None else "p.-"
+        print(f"{number}\t{page_text}\t{title}")
+
+    if not hits:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
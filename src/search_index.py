@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+記事Markdownの全文検索用転置インデックス。
+
+形態素解析器を使わず、文字 n-gram (既定は bigram) で日本語を分かち書きする。
+n-gram より短い検索語 (1文字の語など) にも答えられるよう、n 文字以下の部分文字列もすべて索引化する。
+
+インデックスは1ファイルのバイナリで、検索時は mmap して必要な部分だけを読む:
+
+    INDEX_MAGIC | ヘッダ長 (uint32) | JSON ヘッダ (件数と各セクションの位置だけ)
+    記事表   : (記事数 + 1) 個の uint32。記事ブロブ内の各記事の開始位置
+    記事ブロブ: 記事ごとの [number, title, filename] の JSON (UTF-8)
+    語表     : 語ごとに (語の位置, 語の長さ, ポスティングの位置, 件数) の uint32 x 4。語の UTF-8 順
+    語ブロブ : 語の UTF-8 を連結したもの
+    ポスティング: 記事IDの配列 (リトルエンディアン)
+
+語表は固定長・ソート済みなので二分探索でき、検索の手間は語彙の大きさにほぼよらない。
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import struct
+import unicodedata
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from article_catalog import Article
+
+INDEX_MAGIC = b"NBGSIDX2"
+INDEX_VERSION = 2
+NGRAM_SIZE = 2
+
+# 語表の1レコード: 語の位置, 語の長さ (バイト), ポスティングの位置 (要素数), ポスティングの件数
+TERM_RECORD = struct.Struct('<IIII')
+OFFSET_ITEM = struct.Struct('<I')
+
+# 単語構成文字 (かな・漢字・英数字) の連続を1つのランとして扱う
+WORD_RUN_PATTERN = re.compile(r"\w+")
+
+def normalize_text(text: str) -> str:
+    """全角/半角・大文字/小文字の揺れを吸収する"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+def iter_ngrams(text: str, n: int = NGRAM_SIZE) -> Iterator[str]:
+    """正規化済みテキストから文字 n-gram を列挙する (n 文字未満のランはそのまま)"""
+    for run in WORD_RUN_PATTERN.findall(text):
+        if len(run) <= n:
+            yield run
+        else:
+            for i in range(len(run) - n + 1):
+                yield run[i:i + n]
+
+def iter_index_terms(text: str, n: int = NGRAM_SIZE) -> Iterator[str]:
+    """索引化する語 (1〜n 文字の部分文字列すべて) を列挙する"""
+    for run in WORD_RUN_PATTERN.findall(text):
+        for size in range(1, min(n, len(run)) + 1):
+            for i in range(len(run) - size + 1):
+                yield run[i:i + size]
+
+def _postings_typecode(article_count: int) -> str:
+    return "H" if article_count <= 0xFFFF else "I"
+
+def build_search_index(articles_dir: str, articles: List[Article], index_path: str) -> None:
+    """
+    記事一覧の各Markdownから転置インデックスを作成する。
+
+    Args:
+        articles_dir (str): 記事Markdownのディレクトリ
+        articles (List[Article]): 記事一覧
+        index_path (str): 出力するインデックスファイル
+    """
+    postings: Dict[str, List[int]] = {}
+    article_offsets = array('I', [0])
+    article_blob = bytearray()
+
+    for doc_id, article in enumerate(articles):
+        article_blob += json.dumps(
+            [article.number_str, article.title, article.filename],
+            ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+        article_offsets.append(len(article_blob))
+        md_path = os.path.join(articles_dir, article.filename)
+        try:
+            with open(md_path, 'r', encoding='utf-8') as f:
+                text = normalize_text(f.read())
+        except FileNotFoundError:
+            print(f"Warning: {md_path} が見つかりません。検索インデックスから除外します。")
+            continue
+
+        # 記事IDは昇順に追加されるため、ポスティングは常にソート済み
+        for term in set(iter_index_terms(text)):
+            postings.setdefault(term, []).append(doc_id)
+
+    typecode = _postings_typecode(len(articles))
+    term_table = bytearray()
+    term_blob = bytearray()
+    blob = array(typecode)
+    # str の順序はコードポイント順 = UTF-8 のバイト順なので、読み出し側はバイト列で二分探索できる
+    for term in sorted(postings):
+        doc_ids = postings[term]
+        encoded = term.encode('utf-8')
+        term_table += TERM_RECORD.pack(len(term_blob), len(encoded), len(blob), len(doc_ids))
+        term_blob += encoded
+        blob.extend(doc_ids)
+    if sys.byteorder == "big":
+        blob.byteswap()
+        article_offsets.byteswap()
+
+    sections = {}
+    position = 0
+    for name, data in (
+        ('article_table', article_offsets.tobytes()),
+        ('article_blob', bytes(article_blob)),
+        ('term_table', bytes(term_table)),
+        ('term_blob', bytes(term_blob)),
+        ('postings', blob.tobytes()),
+    ):
+        sections[name] = position
+        position += len(data)
+
+    header = json.dumps({
+        'version': INDEX_VERSION,
+        'ngram': NGRAM_SIZE,
+        'typecode': typecode,
+        'article_count': len(articles),
+        'term_count': len(postings),
+        'sections': sections,
+    }, separators=(',', ':')).encode('utf-8')
+
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(INDEX_MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(article_offsets.tobytes())
+        f.write(article_blob)
+        f.write(term_table)
+        f.write(term_blob)
+        f.write(blob.tobytes())
+    os.replace(tmp_path, index_path)
+
+class SearchIndex:
+    """build_search_index で作成したインデックスの読み出し (ファイルを mmap して必要な部分だけ読む)"""
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.articles_dir = os.path.dirname(index_path)
+        with open(index_path, 'rb') as f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError(f"{index_path} は検索インデックスではありません (古い形式なら作り直してください)。")
+            (header_len,) = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(header_len).decode('utf-8'))
+            if header['version'] != INDEX_VERSION:
+                raise ValueError(f"Unsupported search index version: {header['version']}")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.ngram = header['ngram']
+        self.typecode = header['typecode']
+        self.article_count = header['article_count']
+        self.term_count = header['term_count']
+        data_start = len(INDEX_MAGIC) + 4 + header_len
+        self._sections = {name: data_start + offset for name, offset in header['sections'].items()}
+        self._item_size = array(self.typecode).itemsize
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self) -> "SearchIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def article(self, doc_id: int) -> List[str]:
+        """記事IDの [number, title, filename]"""
+        table = self._sections['article_table']
+        (start,) = OFFSET_ITEM.unpack_from(self._map, table + doc_id * OFFSET_ITEM.size)
+        (end,) = OFFSET_ITEM.unpack_from(self._map, table + (doc_id + 1) * OFFSET_ITEM.size)
+        blob = self._sections['article_blob']
+        return json.loads(self._map[blob + start:blob + end].decode('utf-8'))
+
+    def _term_record(self, position: int) -> Tuple[bytes, int, int]:
+        term_offset, term_len, postings_offset, count = TERM_RECORD.unpack_from(
+            self._map, self._sections['term_table'] + position * TERM_RECORD.size
+        )
+        start = self._sections['term_blob'] + term_offset
+        return self._map[start:start + term_len], postings_offset, count
+
+    def _lookup(self, term: str) -> Optional[Tuple[int, int]]:
+        """語表を二分探索し、語のポスティングの (位置, 件数) を返す"""
+        key = term.encode('utf-8')
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term_record(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.term_count:
+            found, offset, count = self._term_record(low)
+            if found == key:
+                return offset, count
+        return None
+
+    def _read_postings(self, entry: Tuple[int, int]) -> Set[int]:
+        offset, count = entry
+        start = self._sections['postings'] + offset * self._item_size
+        doc_ids = array(self.typecode)
+        doc_ids.frombytes(self._map[start:start + count * self._item_size])
+        if sys.byteorder == "big":
+            doc_ids.byteswap()
+        return set(doc_ids)
+
+    def candidates(self, terms: Iterable[str]) -> List[int]:
+        """すべての検索語の n-gram を含む記事IDを返す (誤検出を含みうる)"""
+        entries = []
+        for term in terms:
+            for gram in set(iter_ngrams(normalize_text(term), self.ngram)):
+                entry = self._lookup(gram)
+                if entry is None:
+                    return []
+                entries.append(entry)
+        if not entries:
+            return []
+
+        # 件数の少ないポスティングから絞り込む
+        result: Optional[Set[int]] = None
+        for entry in sorted(entries, key=lambda entry: entry[1]):
+            doc_ids = self._read_postings(entry)
+            result = doc_ids if result is None else result & doc_ids
+            if not result:
+                return []
+        return sorted(result)
+
+    def search(self, terms: List[str], verify: bool = True) -> List[List[str]]:
+        """
+        検索語をすべて含む記事の [number, title, filename] を返す。
+
+        verify=True の場合は候補記事の本文を読み、n-gram の偶然一致を除外する。
+        """
+        normalized_terms = [normalize_text(term) for term in terms if term.strip()]
+        if not normalized_terms:
+            return []
+
+        hits = []
+        for doc_id in self.candidates(normalized_terms):
+            article = self.article(doc_id)
+            if verify:
+                md_path = os.path.join(self.articles_dir, article[2])
+                try:
+                    with open(md_path, 'r', encoding='utf-8') as f:
+                        text = normalize_text(f.read())
+                except FileNotFoundError:
+                    continue
+                if not all(term in text for term in normalized_terms):
+                    continue
+            hits.append(article)
+        return hits
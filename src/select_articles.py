@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+記事カタログの条件 (年・期間・カテゴリ・タグ・投稿タイプ) で記事を選び、
+include_articles.txt と同じ形式 (1行に1つの記事番号) で出力する。
+
+選択条件 (ArticleFilter と add_filter_arguments) は wxr_to_md.py でも使い、
+対象外の記事は HTML を変換する前に除外する。
+
+    python3 src/select_articles.py --year 2024 --tag LLM > config/include_articles.txt
+"""
+
+import os
+import sys
+import argparse
+from datetime import date
+from typing import Iterable, List, Optional, Set
+
+from article_catalog import Article, load_articles
+
+class ArticleFilter:
+    """記事メタデータと記事番号に対する選択条件 (指定された条件はすべて満たす必要がある)"""
+
+    def __init__(
+        self,
+        years: Optional[Iterable[int]] = None,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        categories: Optional[Iterable[str]] = None,
+        tags: Optional[Iterable[str]] = None,
+        post_types: Optional[Iterable[str]] = None,
+        include_numbers: Optional[Iterable[str]] = None,
+        exclude_numbers: Optional[Iterable[str]] = None,
+    ):
+        self.years = set(years or [])
+        self.since = since
+        self.until = until
+        # カテゴリ・タグは大文字小文字を区別しない
+        self.categories = {name.casefold() for name in categories or []}
+        self.tags = {name.casefold() for name in tags or []}
+        self.post_types = set(post_types or [])
+        # include_articles.txt / exclude_articles.txt の4桁の記事番号
+        self.include_numbers = set(include_numbers or [])
+        self.exclude_numbers = set(exclude_numbers or [])
+
+    @property
+    def is_empty(self) -> bool:
+        """条件が1つもない (すべての記事が選ばれる)"""
+        return not (self.years or self.since or self.until or self.categories or self.tags
+                    or self.post_types or self.include_numbers or self.exclude_numbers)
+
+    def matches(self, article: Article) -> bool:
+        if self.include_numbers and article.number_str not in self.include_numbers:
+            return False
+        if article.number_str in self.exclude_numbers:
+            return False
+        if self.post_types and article.post_type not in self.post_types:
+            return False
+
+        if self.years or self.since or self.until:
+            if article.pub_date is None:
+                return False
+            pub_date = article.pub_date.date()
+            if self.years and pub_date.year not in self.years:
+                return False
+            if self.since and pub_date < self.since:
+                return False
+            if self.until and pub_date > self.until:
+                return False
+
+        # カテゴリはいずれか1つ、タグは指定したものすべてを持つ記事
+        if self.categories and not self.categories & {name.casefold() for name in article.categories}:
+            return False
+        if self.tags and not self.tags <= {name.casefold() for name in article.tags}:
+            return False
+        return True
+
+def load_article_numbers(file_path: str) -> Set[str]:
+    """
+    include_articles.txt / exclude_articles.txt (1行に1つの記事番号) を4桁の記事番号の集合として読み込む。
+
+    ファイルがない場合は空集合を返す。
+    """
+    if not os.path.exists(file_path):
+        print(f"Warning: {file_path} が見つかりません。記事番号のリストは空として扱います。")
+        return set()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return {f"{int(line.strip()):04d}" for line in f if line.strip()}
+
+def filter_articles(articles: Iterable[Article], article_filter: ArticleFilter) -> List[Article]:
+    return [article for article in articles if article_filter.matches(article)]
+
+def add_filter_arguments(parser, default_post_type: str = "post") -> None:
+    """選択条件のオプション (select_articles.py と wxr_to_md.py で共通)"""
+    filter_group = parser.add_argument_group('selection rules')
+    filter_group.add_argument(
+        "--year", type=int, action="append",
+        help="Publication year (repeatable)"
+    )
+    filter_group.add_argument(
+        "--since", type=date.fromisoformat,
+        help="Earliest publication date (YYYY-MM-DD)"
+    )
+    filter_group.add_argument(
+        "--until", type=date.fromisoformat,
+        help="Latest publication date (YYYY-MM-DD)"
+    )
+    filter_group.add_argument(
+        "--category", action="append",
+        help="Category name; articles in any of the given categories match (repeatable)"
+    )
+    filter_group.add_argument(
+        "--tag", action="append",
+        help="Tag name; articles must have all of the given tags (repeatable)"
+    )
+    filter_group.add_argument(
+        "--post-type", action="append",
+        help=f"Post type such as 'post' or 'page' (repeatable, default: {default_post_type})"
+    )
+
+def article_filter_from_args(args, default_post_types: Optional[List[str]] = None,
+                             include_numbers: Optional[Set[str]] = None,
+                             exclude_numbers: Optional[Set[str]] = None) -> ArticleFilter:
+    return ArticleFilter(
+        years=args.year,
+        since=args.since,
+        until=args.until,
+        categories=args.category,
+        tags=args.tag,
+        post_types=args.post_type or default_post_types,
+        include_numbers=include_numbers,
+        exclude_numbers=exclude_numbers,
+    )
+
+def setup_argument_parser():
+    parser = argparse.ArgumentParser(description="Select articles from the catalog by date, category or tag.")
+
+    parser.add_argument(
+        "--articles", type=str,
+        default="articles/articles.catalog",
+        help="Path to the article catalog or CSV (default: articles/articles.catalog)"
+    )
+    parser.add_argument(
+        "--output", type=str,
+        default=None,
+        help="Write article numbers to this file instead of stdout"
+    )
+    parser.add_argument(
+        "--list", action="store_true",
+        help="Print number, date, tags and title instead of bare numbers"
+    )
+
+    # Selection rules
+    add_filter_arguments(parser)
+
+    return parser
+
+def main(argv=None):
+    parser = setup_argument_parser()
+    args = parser.parse_args(argv)
+
+    article_filter = article_filter_from_args(args, default_post_types=["post"])
+    selected = filter_articles(load_articles(args.articles), article_filter)
+
+    if args.list:
+        lines = [
+            f"{article.number_str}\t{article.pub_date_text}\t{','.join(article.tags)}\t{article.title}"
+            for article in selected
+        ]
+    else:
+        lines = [article.number_str for article in selected]
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.writelines(f"{line}\n" for line in lines)
+    else:
+        sys.stdout.writelines(f"{line}\n" for line in lines)
+
+if __name__ == "__main__":
+    main()
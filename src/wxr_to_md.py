@@ -2,13 +2,20 @@
 # -*- coding: utf-8 -*-
 
 import os
-import csv
 import re
+import posixpath
+import hashlib
 import argparse
 import xml.etree.ElementTree as ET
-from bs4 import BeautifulSoup
-from datetime import datetime
-from email.utils import parsedate_to_datetime
+from collections import Counter
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+from article_catalog import Article, save_catalog, write_articles_csv
+from article_dates import parse_rfc822_date, parse_rfc822_date_or_none
+from code_blocks import CodeBlockOptions, render_code_block
+from progress import Progress, add_progress_arguments, configure as configure_progress, is_quiet
+from search_index import build_search_index
+from select_articles import add_filter_arguments, article_filter_from_args, load_article_numbers
 
 ################################################################################
 # 1) 既存のコード言語判定・コードブロックエスケープ関数
@@ -49,8 +56,89 @@ def detect_code_language(code_content: str) -> str:
 # 2) Main: WXR解析 → BeautifulSoupでHTML→Markdown変換
 ################################################################################
 
-def parse_wxr_to_markdown(wxr_file, output_dir, allowed_statuses):
-    """WXRファイルを読み込み、各<item>のcontentをMarkdown変換して保存"""
+# WordPressエクスポート (WXR) の名前空間
+WP_NAMESPACE = "{http://wordpress.org/export/1.2/}"
+
+# 記事の Markdown ファイル名 (4桁の記事番号_タイトル.md)
+ARTICLE_FILE_PATTERN = re.compile(r'^(\d{4})_.*\.md$')
+
+# 変換済み Markdown のキャッシュ: (HTML, base_path, code_options) のハッシュ → (Markdown, 未対応タグの出現回数)
+# build_daemon.py で同じプロセスから繰り返し変換するとき、変わっていない記事の変換を省く。
+# 1回で終わるコマンドラインの実行では使わないので、enable_conversion_cache() を呼ぶまでは無効 (None)
+_converted_markdown = None
+
+# 変換方法が定義されていないタグ名 → 出現回数 (変換の最後にまとめて報告する)
+_unknown_tags = Counter()
+
+def enable_conversion_cache() -> None:
+    """変換済み Markdown のキャッシュを有効にする (build_daemon.py から呼ぶ)"""
+    global _converted_markdown
+    if _converted_markdown is None:
+        _converted_markdown = {}
+
+def convert_content(content_html: str, base_path: str, code_options, used_keys=None) -> str:
+    """html_to_markdown_bs の結果を返す (キャッシュが有効ならキャッシュから返し、なければ変換してキャッシュする)"""
+    if _converted_markdown is None:
+        return html_to_markdown_bs(content_html, base_path=base_path, code_options=code_options)
+
+    key = hashlib.sha256(
+        "\0".join((content_html or "", base_path, repr(code_options))).encode("utf-8")
+    ).digest()
+    if used_keys is not None:
+        used_keys.add(key)
+    cached = _converted_markdown.get(key)
+    if cached is None:
+        # この記事で見つかった未対応タグも一緒に覚えておき、キャッシュから返すときにも数える
+        before = Counter(_unknown_tags)
+        content_md = html_to_markdown_bs(content_html, base_path=base_path, code_options=code_options)
+        _converted_markdown[key] = (content_md, _unknown_tags - before)
+        return content_md
+    content_md, unknown_tags = cached
+    _unknown_tags.update(unknown_tags)
+    return content_md
+
+def extract_item_metadata(item) -> dict:
+    """<item> からカテゴリ・タグ・投稿タイプ・GUID・添付URL・カスタムフィールドを取り出す"""
+    categories = []
+    tags = []
+    for category in item.findall("category"):
+        name = (category.text or "").strip()
+        if not name:
+            continue
+        if category.get("domain") == "post_tag":
+            tags.append(name)
+        elif name not in categories:
+            categories.append(name)
+
+    postmeta = {}
+    for meta in item.findall(f"{WP_NAMESPACE}postmeta"):
+        key = (meta.findtext(f"{WP_NAMESPACE}meta_key") or "").strip()
+        if key:
+            postmeta[key] = meta.findtext(f"{WP_NAMESPACE}meta_value") or ""
+
+    attachment_url = (item.findtext(f"{WP_NAMESPACE}attachment_url") or "").strip()
+
+    return {
+        'post_type': (item.findtext(f"{WP_NAMESPACE}post_type") or "post").strip(),
+        'post_id': (item.findtext(f"{WP_NAMESPACE}post_id") or "").strip(),
+        'guid': (item.findtext("guid") or "").strip(),
+        'categories': categories,
+        'tags': tags,
+        'attachment_urls': [attachment_url] if attachment_url else [],
+        'postmeta': postmeta,
+    }
+
+def parse_wxr_to_markdown(wxr_file, output_dir, allowed_statuses, search_index=True, code_options=None,
+                          article_filter=None):
+    """
+    WXRファイルを読み込み、各<item>のcontentをMarkdown変換して保存
+
+    article_filter (ArticleFilter) を渡すと、条件に合わない記事は HTML を変換せず、
+    番号とメタデータだけをカタログに残す (記事番号は条件によらず変わらない)。
+    前回までに変換した同じファイル名 (番号とタイトル) の Markdown があればそのまま残し、カタログにもそのファイル名を記録する
+    (全記事から選び直す make select・make estimate・検索が引き続き使えるように)。
+    ファイル名が違う場合 (タイトルの変更や、記事の追加・削除による番号のずれ) は別の記事の可能性があるので使わない。
+    """
     os.makedirs(output_dir, exist_ok=True)
     tree = ET.parse(wxr_file)
     root = tree.getroot()
@@ -92,80 +180,145 @@ def parse_wxr_to_markdown(wxr_file, output_dir, allowed_statuses):
         md.write(f"**基本サイト URL**: {base_site_url}\n\n")
         md.write(f"**著者**: {author_name}\n\n")
 
-    print(f"Saved: {out_path}")
+    if not is_quiet():
+        print(f"Saved: {out_path}")
 
-    # 記事一覧に追加
-    article_list.append({
-        'number': "0000",
-        'title': "サイト情報",
-        'filename': filename,
-        'pub_date': pub_date,
-        'link': link,
-        'status': "info"
-    })
+    # 記事一覧に追加 (解釈できないエクスポート日時は元の文字列のまま残す)
+    export_date = parse_rfc822_date_or_none(pub_date)
+    article_list.append(Article(
+        number=0,
+        title="サイト情報",
+        filename=filename,
+        pub_date=export_date,
+        link=link,
+        status="info",
+        post_type="info",
+        raw_pub_date=pub_date if export_date is None and pub_date != "No Date" else "",
+    ))
+
+    # 親記事の post_id → 添付ファイルURL (添付は記事の後に現れることもあるため最後に結び付ける)
+    attachments = {}
+
+    # 今回の変換で使ったキャッシュのキー (削除・変更された記事の古い結果は最後に捨てる)
+    used_keys = set()
+
+    # 記事番号 → 前回までに出力した Markdown (選択条件で外れた記事はこれを使い続ける)
+    previous_files = {}
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            match = ARTICLE_FILE_PATTERN.match(entry.name)
+            if match:
+                previous_files.setdefault(match.group(1), []).append(entry.path)
 
     # (2) 各 <item> タグの記事を処理 (channel 内の item も含む)
+    items = channel.findall("item")
+    _unknown_tags.clear()
     counter = 1
-    for item in channel.findall("item"):
-        # 記事の公開ステータスを取得
-        status_elem = item.find('./{http://wordpress.org/export/1.2/}status')
-        status = status_elem.text.strip() if status_elem is not None else "unknown"
-
-        # 指定されたステータスのものだけ処理
-        if status not in allowed_statuses:
-            continue
-
-        title_elem = item.find('title')
-        title = title_elem.text.strip() if title_elem is not None else "No Title"
-
-        content_elem = item.find('content:encoded', namespace)
-        content_html = content_elem.text if content_elem is not None else ""
-
-        pub_date_elem = item.find('pubDate')
-        if pub_date_elem is not None and pub_date_elem.text:
-            dt = parsedate_to_datetime(pub_date_elem.text.strip())
-            pub_date = dt.strftime('%Y年%-m月%-d日 %H:%M')
-        else:
-            pub_date = "No Date"
-
-        link_elem = item.find('link')
-        link = link_elem.text.strip() if link_elem is not None else "No Link"
-
-        # ベースパス: WXRファイルと同じディレクトリを起点に処理(例)
-        base_path = os.path.dirname(wxr_file)
-
-        # HTML→Markdown変換
-        content_md = html_to_markdown_bs(content_html, base_path=base_path)
-
-        # ファイル名に使えない文字を除去
-        safe_title = re.sub(r'[\\/:*?"<>|]', '', title)[:50]
-        filename = f"{counter:04d}_{safe_title}.md"
-        out_path = os.path.join(output_dir, filename)
-
-        with open(out_path, 'w', encoding='utf-8') as md:
-            md.write(f"# {title}\n\n")
-            md.write(f"**公開日**: {pub_date}\n\n")
-            md.write(content_md.strip() + "\n\n")
-
-        print(f"Saved: {out_path}")
-
-        # 記事一覧に追加
-        article_list.append({
-            'number': f"{counter:04d}",
-            'link': link,
-            'pub_date': pub_date,
-            'status': status,
-            'title': title,
-            'filename': filename,
-        })
-        counter += 1
-
-    # 記事一覧を出力
-    list_path = os.path.join(output_dir, "articles.csv")
-    with open(list_path, 'w', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['number', 'link', 'pub_date', 'status', 'title', 'filename'])
-        writer.writeheader()
-        writer.writerows(article_list)
+    with Progress("wxr_to_md", total=len(items)) as progress:
+        for item in items:
+            # 記事の公開ステータスを取得
+            status_elem = item.find('./{http://wordpress.org/export/1.2/}status')
+            status = status_elem.text.strip() if status_elem is not None else "unknown"
+
+            metadata = extract_item_metadata(item)
+            if metadata['post_type'] == "attachment" and metadata['attachment_urls']:
+                parent_id = (item.findtext(f"{WP_NAMESPACE}post_parent") or "").strip()
+                if parent_id and parent_id != "0":
+                    attachments.setdefault(parent_id, []).extend(metadata['attachment_urls'])
+
+            # 指定されたステータスのものだけ処理
+            if status not in allowed_statuses:
+                progress.advance(skipped=1)
+                continue
+
+            title_elem = item.find('title')
+            title = title_elem.text.strip() if title_elem is not None else "No Title"
+
+            pub_date_elem = item.find('pubDate')
+            if pub_date_elem is not None and pub_date_elem.text:
+                pub_date = parse_rfc822_date(pub_date_elem.text.strip())
+            else:
+                pub_date = None
+
+            link_elem = item.find('link')
+            link = link_elem.text.strip() if link_elem is not None else "No Link"
+
+            # ファイル名に使えない文字を除去
+            safe_title = re.sub(r'[\\/:*?"<>|]', '', title)[:50]
+            article = Article(
+                number=counter,
+                title=title,
+                filename=f"{counter:04d}_{safe_title}.md",
+                pub_date=pub_date,
+                link=link,
+                status=status,
+                **metadata
+            )
+            counter += 1
+
+            # 選択条件に合わない記事は変換しない (番号は進めたまま、カタログには残す)。
+            # 同じファイル名の前回の Markdown があれば削除せずに使い、なければ未変換 (filename が空) とする
+            if article_filter is not None and not article_filter.matches(article):
+                previous = previous_files.get(article.number_str, [])
+                if os.path.join(output_dir, article.filename) not in previous:
+                    if previous:
+                        names = ", ".join(sorted(os.path.basename(path) for path in previous))
+                        print(f"Warning: 記事番号 {article.number_str} の前回の Markdown ({names}) は "
+                              f"{article.filename} と名前が異なるため使いません。未変換として記録します。")
+                    article.filename = ""
+                article_list.append(article)
+                progress.advance(filtered=1)
+                continue
+
+            content_elem = item.find('content:encoded', namespace)
+            content_html = content_elem.text if content_elem is not None else ""
+
+            # ベースパス: WXRファイルと同じディレクトリを起点に処理(例)
+            # 画像のリンクはカレントディレクトリ (プロジェクトのルート) からの ./ 相対パスにするので、
+            # 絶対パスで渡された場合も相対パスに直す
+            base_path = os.path.relpath(os.path.dirname(os.path.abspath(wxr_file))).replace(os.sep, "/")
+
+            # HTML→Markdown変換 (折りたたんだコードブロックからは元記事へリンクする)
+            item_code_options = (code_options or CodeBlockOptions())._replace(
+                source_url=link if link != "No Link" else None
+            )
+            content_md = convert_content(content_html, base_path, item_code_options, used_keys)
+
+            out_path = os.path.join(output_dir, article.filename)
+
+            with open(out_path, 'w', encoding='utf-8') as md:
+                md.write(f"# {title}\n\n")
+                md.write(f"**公開日**: {article.pub_date_text}\n\n")
+                md.write(content_md.strip() + "\n\n")
+
+            progress.advance(item=out_path)
+
+            # 記事一覧に追加
+            article_list.append(article)
+
+        if _unknown_tags:
+            progress.message("変換方法が定義されていないタグ: " + ", ".join(
+                f"{name} ({count})" for name, count in _unknown_tags.most_common()
+            ), unknown_tags=dict(_unknown_tags))
+
+    if _converted_markdown is not None:
+        for key in _converted_markdown.keys() - used_keys:
+            del _converted_markdown[key]
+
+    for article in article_list:
+        if article.post_id in attachments:
+            article.attachment_urls.extend(attachments[article.post_id])
+
+    # 記事一覧を出力 (後続ステージ用のカタログと、確認用のCSV)
+    save_catalog(article_list, os.path.join(output_dir, "articles.catalog"))
+    write_articles_csv(article_list, os.path.join(output_dir, "articles.csv"))
+
+    # 全文検索用インデックスを出力
+    if search_index:
+        index_path = os.path.join(output_dir, "search_index.bin")
+        build_search_index(output_dir, [article for article in article_list if article.converted], index_path)
+        if not is_quiet():
+            print(f"Saved: {index_path}")
 
 
 ################################################################################
@@ -205,85 +358,104 @@ def format_linebreaks_with_markdown(inner_md: str, markdown_format: str) -> str:
     # 通常のMarkdownフォーマット（日本語隣接対策の空白を含む）
     return f" {markdown_format}{inner_md}{markdown_format} "
 
-def html_to_markdown_bs(html_text: str, base_path: str = ".") -> str:
+def html_to_markdown_bs(html_text: str, base_path: str = ".", code_options=None) -> str:
     """BeautifulSoupでパース後、ノード単位でMarkdown変換"""
     soup = BeautifulSoup(html_text, "html.parser")
 
     md_fragments = []
     # soup.contents: 最上位のノードを列挙
     for elem in soup.contents:
-        frag = bs_node_to_md(elem, level=0, base_path=base_path)
+        frag = bs_node_to_md(elem, level=0, base_path=base_path, code_options=code_options)
         if frag.strip():
             md_fragments.append(frag)
 
     return "\n".join(md_fragments)
 
-def bs_node_to_md(node, level=0, base_path=".") -> str:
-    """
-    BeautifulSoupのノードを再帰的にMarkdown文字列へ。
-      - level: リストのネスト等でインデントを増やす
-      - base_path: /assets/画像パスの相対変換用
-    """
-    from bs4 import NavigableString, Tag
+# 子ノードを持たず、そのまま Markdown にできるタグ
+LEAF_TAGS = ("br", "hr", "img", "code", "pre")
 
-    # 1) 文字列の場合
-    if isinstance(node, NavigableString):
-        return node.strip()
+# 子ノードの変換結果から組み立てるタグ (これ以外のタグは子を連結するだけで、タグ名を表示する)
+CONTAINER_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6", "p", "div", "b", "strong", "i", "em", "s",
+                  "a", "ul", "ol", "figure", "figcaption", "blockquote")
 
-    # 2) タグの場合
-    if not isinstance(node, Tag):
-        return ""
+def render_leaf_tag(node, tname: str, base_path: str, code_options) -> str:
+    """子ノードを辿らずに変換できるタグ (LEAF_TAGS) の Markdown"""
+    # 改行
+    if tname == "br":
+        # 親タグが <strong>/<b>/<em>/<i>/<s> 等ならスペースにする
+        parent_tag = node.parent.name.lower() if node.parent else ""
+        if parent_tag in ("strong", "b", "em", "i", "s"):
+            return "__BR__"  # インライン要素内の<br>は要チェック
+        else:
+            return "  \n"  # それ以外は通常のMarkdown改行
 
-    tname = node.name.lower()
+    # 水平線
+    elif tname == "hr":
+        return "\n---\n"
+
+    # 画像
+    elif tname == "img":
+        src = node.get("src", "")
+        alt = node.get("alt", "")
+        # /assets/ → 相対パスへ置換
+        if src.startswith("/assets/"):
+            src = f"./{posixpath.normpath(posixpath.join(base_path, src.lstrip('/')))}"
+        return f"![{alt}]({src})"
+
+    # コード(インライン/ブロック)
+    elif tname == "code":
+        # もし親が<pre>なら、<pre>側でまとめて処理する
+        # ここでは「インラインcode」として扱う
+        code_text = node.get_text()
+        return f"`{code_text.strip()}`"
 
+    # <pre>
+    else:
+        # <pre> の中に <code> がある場合はコードブロック
+        code_tag = node.find("code")
+        if code_tag:
+            raw_code = code_tag.get_text()
+            # 言語判定
+            lang = detect_code_language(raw_code)
+            # 行番号を追加 (長い場合は折りたたみ・分割)
+            return render_code_block(raw_code, lang, code_options)
+        else:
+            # <pre> だけの場合もコードブロック
+            raw_code = node.get_text()
+            lang = detect_code_language(raw_code)
+            return render_code_block(raw_code, lang, code_options, numbered=False)
+
+def close_container_tag(node, tname: str, children) -> str:
+    """子ノードの変換結果 (子1つにつき1要素) から、タグ全体の Markdown を組み立てる"""
     # 見出し
     if tname in ("h1", "h2", "h3", "h4", "h5", "h6"):
         depth = int(tname[-1])  # h1->1, h2->2, ...
-        inner_md = "".join(bs_node_to_md(c, level, base_path) for c in node.children)
+        inner_md = "".join(children)
         return f"\n{'#'*depth} {inner_md.strip()}\n"
 
     # 段落/汎用ブロック
     elif tname in ("p", "div"):
-        inner_md = "".join(bs_node_to_md(c, level, base_path) for c in node.children)
+        inner_md = "".join(children)
         if inner_md.strip():
             return f"\n{inner_md.strip()}\n"
         return ""
 
-    # 改行
-    elif tname == "br":
-        # 親タグが <strong>/<b>/<em>/<i>/<s> 等ならスペースにする
-        parent_tag = node.parent.name.lower() if node.parent else ""
-        if parent_tag in ("strong", "b", "em", "i", "s"):
-            return "__BR__"  # インライン要素内の<br>は要チェック
-        else:
-            return "  \n"  # それ以外は通常のMarkdown改行
-
-    # 水平線
-    elif tname == "hr":
-        return "\n---\n"
-
     # 太字
     elif tname in ("b", "strong"):
-        inner_md = "".join(bs_node_to_md(c, level, base_path) for c in node.children)
-        inner_md = inner_md.strip()
-        return format_linebreaks_with_markdown(inner_md, "**")
+        return format_linebreaks_with_markdown("".join(children).strip(), "**")
 
     # イタリック
     elif tname in ("i", "em"):
-        inner_md = "".join(bs_node_to_md(c, level, base_path) for c in node.children)
-        inner_md = inner_md.strip()
-        return format_linebreaks_with_markdown(inner_md, "*")
+        return format_linebreaks_with_markdown("".join(children).strip(), "*")
 
     # 取り消し線
     elif tname == "s":
-        inner_md = "".join(bs_node_to_md(c, level, base_path) for c in node.children)
-        inner_md = inner_md.strip()
-        return format_linebreaks_with_markdown(inner_md, "~~")
+        return format_linebreaks_with_markdown("".join(children).strip(), "~~")
 
     # リンク
     elif tname == "a":
         href = node.get("href", "")
-        text_md = "".join(bs_node_to_md(c, level, base_path) for c in node.children).strip()
+        text_md = "".join(children).strip()
 
         if node.parent:
             parent_tag = node.parent.parent.name.lower() if node.parent.parent else ""
@@ -301,44 +473,18 @@ def bs_node_to_md(node, level=0, base_path=".") -> str:
         else:
             return text_md
 
-    # リスト (ul/ol)
+    # リスト (ul/ol): 子は直下の<li>ごとに整形済み
     elif tname in ("ul", "ol"):
-        is_ordered = (tname == "ol")
-        md_list = []
-        idx = 1
-        # 直下の<li>のみ
-        for li in node.find_all("li", recursive=False):
-            li_md = "".join(bs_node_to_md(c, level+1, base_path) for c in li.children).strip()
-            indent = "    " * level
-            if is_ordered:
-                md_list.append(f"{indent}{idx}. {li_md}")
-                idx += 1
-            else:
-                md_list.append(f"{indent}- {li_md}")
-        return "\n".join(md_list)
-
-    # 画像
-    elif tname == "img":
-        src = node.get("src", "")
-        alt = node.get("alt", "")
-        width = node.get("width", "")
-        height = node.get("height", "")
-        # /assets/ → 相対パスへ置換
-        if src.startswith("/assets/"):
-            src = f"./{os.path.join(base_path, src.lstrip('/'))}"
-        return f"![{alt}]({src})"
+        return "\n".join(children)
 
     # figure
     elif tname == "figure":
-        sub_md = []
-        for c in node.children:
-            sub_md.append(bs_node_to_md(c, level, base_path))
-        content = "\n".join(sub_md).strip()
+        content = "\n".join(children).strip()
         return f"\n{content}\n" if content else ""
 
     # figcaption
     elif tname == "figcaption":
-        cap_text = "".join(bs_node_to_md(c, level, base_path) for c in node.children)
+        cap_text = "".join(children)
         if cap_text:
             previous_tag = node.previous_sibling.name.lower() if node.previous_sibling else ""
             if previous_tag in ("img"):
@@ -351,55 +497,89 @@ def bs_node_to_md(node, level=0, base_path=".") -> str:
     # blockquote
     elif tname == "blockquote":
         block_lines = []
-        for c in node.children:
-            child_md = bs_node_to_md(c, level, base_path)
+        for child_md in children:
             for ln in child_md.split("\n"):
-                #if ln:
-                #    ln = ln.replace("<", "&lt;")
-                #    ln = ln.replace(">", "&gt;")
-                #    ln = f"\\{ln}" if re.match(r'^#+ ', ln) else ln
-                #    ln = f"\\{ln}" if re.match(r'^---', ln) else ln
-                #    ln = ln.replace("`", "\\`")
-                #    ln = ln.replace("[", "\\[")
-                #    ln = ln.replace("]", "\\]")
-                #    block_lines.append(f"> {ln}")
-                #else:
-                #    block_lines.append(">")
                 block_lines.append(f"> `{ln}`")
         return "\n".join(block_lines)
 
-    # コード(インライン/ブロック)
-    elif tname == "code":
-        # もし親が<pre>なら、<pre>側でまとめて処理する
-        # ここでは「インラインcode」として扱う
-        code_text = node.get_text()
-        return f"`{code_text.strip()}`"
+    # それ以外のタグは子ノードを連結して返す
+    else:
+        return "".join(children)
 
-    elif tname == "pre":
-        # <pre> の中に <code> がある場合はコードブロック
-        code_tag = node.find("code")
-        if code_tag:
-            raw_code = code_tag.get_text()
-            # 言語判定
-            lang = detect_code_language(raw_code)
-            #return f"\n````{lang}\n{raw_code}\n````\n"
-            # 行番号を追加
-            numbered_lines = []
-            for i, line in enumerate(raw_code.split('\n'), 1):
-               numbered_lines.append(f"{i:03d} {line}")
-            numbered_code = '\n'.join(numbered_lines)
-            return f"\n````{lang}\n{numbered_code}\n````\n"
+def bs_node_to_md(node, level=0, base_path=".", code_options=None) -> str:
+    """
+    BeautifulSoupのノードをMarkdown文字列へ。
+      - level: リストのネスト等でインデントを増やす
+      - base_path: /assets/画像パスの相対変換用
+      - code_options: コードブロックの折りたたみ・分割の設定 (CodeBlockOptions)
+
+    再帰の代わりに明示的なスタックで木を1回だけ辿る。開いているタグごとに子ノードの変換結果のリストを
+    results に積み、タグを閉じるときはそのリストを取り出して1つの文字列にまとめ、親のリストに追加する。
+    深いネストでも再帰上限に達しない。
+    """
+    if isinstance(node, NavigableString):
+        return node.strip()
+
+    # 開いているタグごとの子ノードの変換結果 (先頭は node 自身の結果を受け取る)
+    results = [[]]
+    # (ノード, level, list_item, closing)
+    #   list_item: リスト直下の<li>として整形する場合の (番号付きか, 番号)
+    #   closing: True ならタグを閉じる処理 (子の結果は results[-1])
+    stack = [(node, level, None, False)]
+    while stack:
+        current, current_level, list_item, closing = stack.pop()
+
+        # タグを閉じる: 子ノードの結果を1つにまとめる
+        if closing:
+            children = results.pop()
+            if list_item is not None:
+                is_ordered, idx = list_item
+                li_md = "".join(children).strip()
+                indent = "    " * current_level
+                results[-1].append(f"{indent}{idx}. {li_md}" if is_ordered else f"{indent}- {li_md}")
+            else:
+                results[-1].append(close_container_tag(current, current.name.lower(), children))
+            continue
+
+        # 1) 文字列の場合
+        if isinstance(current, NavigableString):
+            results[-1].append(current.strip())
+            continue
+
+        # 2) タグの場合
+        if not isinstance(current, Tag):
+            results[-1].append("")
+            continue
+
+        if list_item is not None:
+            # <li> の中身はリストより1段深いインデントで変換する
+            results.append([])
+            stack.append((current, current_level, list_item, True))
+            child_level = current_level + 1
+            stack.extend((c, child_level, None, False) for c in reversed(current.contents))
+            continue
+
+        tname = current.name.lower()
+        if tname in LEAF_TAGS:
+            results[-1].append(render_leaf_tag(current, tname, base_path, code_options))
+            continue
+
+        results.append([])
+        stack.append((current, current_level, None, True))
+        if tname in ("ul", "ol"):
+            # 直下の<li>のみ
+            items = current.find_all("li", recursive=False)
+            is_ordered = tname == "ol"
+            stack.extend(
+                (li, current_level, (is_ordered, idx), False)
+                for idx, li in reversed(list(enumerate(items, 1)))
+            )
         else:
-            # <pre> だけの場合もコードブロック
-            raw_code = node.get_text()
-            lang = detect_code_language(raw_code)
-            return f"\n````{lang}\n{raw_code}\n````\n"
+            if tname not in CONTAINER_TAGS:
+                _unknown_tags[tname] += 1
+            stack.extend((c, current_level, None, False) for c in reversed(current.contents))
 
-    # それ以外のタグは子ノードを連結して返す
-    else:
-        print(tname)
-        inner_md = "".join(bs_node_to_md(c, level, base_path) for c in node.children)
-        return inner_md
+    return results[0][0]
 
 def setup_argument_parser():
     parser = argparse.ArgumentParser(description="Convert WXR file to Markdown with code detection & image path fix.")
@@ -414,17 +594,58 @@ def setup_argument_parser():
         default="publish",
         help="Comma-separated list of post statuses to include (default: publish)"
     )
+    parser.add_argument(
+        "--code-max-lines",
+        type=int,
+        default=0,
+        help="Fold code blocks longer than this many lines, linking to the original post (default: 0 = never)"
+    )
+    parser.add_argument(
+        "--code-page-lines",
+        type=int,
+        default=0,
+        help="Split code blocks into separate fences of at most this many lines (default: 0 = never)"
+    )
+    parser.add_argument(
+        "--no-search-index",
+        action="store_true",
+        help="Do not build the full-text search index (search_index.bin)"
+    )
+    parser.add_argument(
+        "--include-file", type=str,
+        default=None,
+        help="Only convert the article numbers listed in this file"
+    )
+    parser.add_argument(
+        "--exclude-file", type=str,
+        default=None,
+        help="Do not convert the article numbers listed in this file"
+    )
+    add_filter_arguments(parser, default_post_type="all")
+    add_progress_arguments(parser)
 
     return parser
 
-def main():
+def main(argv=None):
     parser = setup_argument_parser()
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    configure_progress(args.quiet, args.progress_events)
 
     # ステータスをカンマ区切りでリスト化
     allowed_statuses = {status.strip() for status in args.status.split(",")}
 
-    parse_wxr_to_markdown(args.wxr_file, args.output_dir, allowed_statuses)
+    code_options = CodeBlockOptions(max_lines=args.code_max_lines, page_lines=args.code_page_lines)
+
+    # 選択条件 (merge_md_files.py などと同じ include/exclude と、select_articles.py と同じ条件)
+    article_filter = article_filter_from_args(
+        args,
+        include_numbers=load_article_numbers(args.include_file) if args.include_file else None,
+        exclude_numbers=load_article_numbers(args.exclude_file) if args.exclude_file else None,
+    )
+
+    parse_wxr_to_markdown(args.wxr_file, args.output_dir, allowed_statuses,
+                          search_index=not args.no_search_index, code_options=code_options,
+                          article_filter=None if article_filter.is_empty else article_filter)
 
 if __name__ == "__main__":
     main()